@@ -7,44 +7,100 @@
 
 import re
 import json
-from typing import Dict, List, Optional, Tuple
+import time
+from typing import BinaryIO, Dict, Iterator, List, Optional, Pattern, Tuple, Union
 from datetime import datetime
-import pdfplumber
+from pdf_document import ParsedDocument, StoredDocument
+from page_index import PageKeywordIndex
+from patterns import ADVANCED_PATTERNS, MetricPatterns
+from timings import StageTimer, source_size
 
+# Версии логики анализа: при изменении экстракторов увеличьте ANALYZER_VERSION,
+# версия паттернов вычисляется из реестра автоматически
+ANALYZER_VERSION = "3.0"
+PATTERNS_VERSION = ADVANCED_PATTERNS.version
+
+# Заголовок таблицы месячных поступлений ДДУ и числовая ячейка таблицы
+DDU_TABLE_HEADING = re.compile(r'приложени[ея]\s*2\s*к\s*таблиц[еаы]\s*7', re.IGNORECASE)
+NUMERIC_CELL = re.compile(r'-?\d+(?:\.\d+)?')
+
+# Подписи для поиска значений по координатам слов, когда регулярные выражения не сработали
+SMR_LABELS = ["Фактическое выполнение СМР", "Выполнение СМР"]
+DELAY_LABELS = ["Отставание"]
+DAYS_UNIT = re.compile(r'дн(?:ей|я|и)?')  # «дн.», «дней», «дня» после числа отставания
+DDU_PAID_HEADER = "Оплачено"
 
 class AdvancedReportAnalyzer:
     """Продвинутый анализатор с контекстом и обоснованием"""
     
-    def __init__(self, pdf_path: str = None, text: str = None):
+    def __init__(self, pdf_path: str = None, text: str = None, pdf_data: Union[bytes, BinaryIO] = None,
+                 text_backend: str = None):
+        """pdf_path — путь к PDF, pdf_data — содержимое PDF (bytes или поток), text — готовый текст
+
+        text_backend — движок текста страниц (layout или fast, см. text_backends.py)
+        """
         self.pdf_path = pdf_path
         self.text = text
         self.pages = []  # Список страниц с текстом
         self.project_info = {}
         self.evidence = {}  # Доказательства для каждой метрики
-        
-        if pdf_path:
+        self.document = None  # Разобранный PDF, общий для всех экстракторов
+        self._page_index = None  # Ключевой индекс страниц (строится при первом поиске)
+        self.regex_seconds = 0.0  # Суммарное время поиска паттернов метрик
+        self.timings = StageTimer()  # Время этапов анализа (возвращается в analyze())
+        
+        if pdf_path or pdf_data is not None:
+            self.document = ParsedDocument(pdf_path or pdf_data, text_backend=text_backend)
+            size = source_size(pdf_path or pdf_data)
+            if size is not None:
+                self.timings.count("bytes", size)
             self._extract_from_pdf()
         elif text:
             self.pages = [{"page_num": 1, "text": text}]
     
+    @classmethod
+    def from_artifact(cls, artifact: Dict) -> 'AdvancedReportAnalyzer':
+        """Анализатор по сохранённым постраничным данным (см. ParsedDocument.snapshot), без разбора PDF"""
+        analyzer = cls()
+        analyzer.document = StoredDocument(artifact)
+        analyzer._extract_from_pdf()
+        return analyzer
+    
     def _extract_from_pdf(self):
         """Извлекает текст по страницам из PDF"""
         try:
-            with pdfplumber.open(self.pdf_path) as pdf:
-                for i, page in enumerate(pdf.pages, 1):
-                    page_text = page.extract_text()
+            with self.timings.stage("pdf_open"):
+                self.timings.count("pages", self.document.page_count)
+            with self.timings.stage("extract_text"):
+                # Большие документы разбираются параллельно, небольшие — в текущем процессе
+                self.document.prefetch(('text',))
+                for i in self.document.page_numbers():
+                    page_text = self.document.text(i)
                     if page_text:
                         self.pages.append({
                             "page_num": i,
                             "text": page_text
                         })
                         
-            # Объединяем весь текст
-            self.text = "\n".join([p["text"] for p in self.pages])
+                # Объединяем весь текст
+                self.text = "\n".join([p["text"] for p in self.pages])
+            self.timings.count("text_pages", len(self.pages))
+            self.timings.count("text_chars", len(self.text))
         except Exception as e:
             print(f"Ошибка чтения PDF: {e}")
             self.pages = [{"page_num": 1, "text": ""}]
     
+    def close(self):
+        """Закрывает PDF документ"""
+        if self.document is not None:
+            self.document.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
     def extract_project_info(self) -> Dict:
         """Извлекает информацию о проекте с первой страницы"""
         if not self.pages:
@@ -52,7 +108,8 @@ class AdvancedReportAnalyzer:
 
         first_page = self.pages[0]["text"]
 
-        project_name = self._extract_project_name(first_page)
+        with self.timings.stage("project_info.name"):
+            project_name = self._extract_project_name(first_page)
         require_manual_name = False
         # Если не удалось извлечь название, выставляем флаг для ручного ввода
         if not project_name or project_name == "Не удалось извлечь название проекта":
@@ -229,13 +286,24 @@ class AdvancedReportAnalyzer:
         
         return None
     
-    def find_in_pages(self, pattern: str, metric_name: str) -> Optional[Dict]:
-        """Находит паттерн по всем страницам и возвращает контекст"""
-        for page in self.pages:
+    @property
+    def page_index(self) -> PageKeywordIndex:
+        if self._page_index is None:
+            self._page_index = PageKeywordIndex(self.pages, ADVANCED_PATTERNS.keywords)
+        return self._page_index
+    
+    def find_in_pages(self, pattern: str, metric_name: str, keywords: List[str] = None) -> Optional[Dict]:
+        """Находит паттерн по страницам и возвращает контекст
+        
+        keywords — основы слов, обязательные для совпадения паттерна:
+        поиск идёт только по страницам, где индекс нашёл хотя бы одну из них.
+        """
+        pages = self.page_index.pages_for(keywords) if keywords else self.pages
+        for page in pages:
             match = re.search(pattern, page["text"], re.IGNORECASE | re.DOTALL)
             if match:
                 # Извлекаем контекст (предложение целиком)
-                context = self._extract_sentence_context(page["text"], match)
+                context = self._extract_sentence_context(page["text"], match.start(), match.end())
                 
                 return {
                     "value": match.group(1) if match.groups() else match.group(0),
@@ -247,11 +315,59 @@ class AdvancedReportAnalyzer:
         
         return None
     
-    def _extract_sentence_context(self, text: str, match) -> str:
+    def find_metric_in_pages(self, patterns: MetricPatterns, metric_name: str) -> Iterator[Dict]:
+        """Находит паттерны метрики по страницам в порядке приоритета и возвращает контекст
+        
+        Первое значение — совпадение альтернативы с наивысшим приоритетом (как при переборе
+        паттернов по очереди). Если экстрактор продолжает итерацию (значение не разобралось),
+        выдаются совпадения следующих альтернатив.
+        """
+        pages = self.page_index.pages_for(patterns.keywords) if patterns.keywords else self.pages
+        texts = [page["text"] for page in pages]
+        matches = patterns.iter_search(texts)
+        while True:
+            started = time.perf_counter()
+            match = next(matches, None)
+            self.regex_seconds += time.perf_counter() - started
+            if match is None:
+                return
+            page = pages[match.text_index]
+            yield {
+                "value": match.value,
+                "page": page["page_num"],
+                "context": self._extract_sentence_context(page["text"], match.start, match.end),
+                "metric": metric_name,
+                "pattern_used": match.pattern
+            }
+    
+    def find_layout_value(self, labels: List[str], metric_name: str, keywords: List[str] = None,
+                          percent: bool = False, unit: Pattern = None) -> Optional[Dict]:
+        """Находит число справа от подписи (или под ней) по координатам слов
+
+        unit — единица, которая должна идти сразу за числом (например, DAYS_UNIT)
+        """
+        if self.document is None:
+            return None
+        pages = self.page_index.pages_for(keywords) if keywords else self.pages
+        for page in pages:
+            index = self.document.word_index(page["page_num"])
+            for label in labels:
+                found = (index.number_right_of(label, percent, unit=unit)
+                         or index.number_below(label, percent, unit=unit))
+                if found:
+                    token, box = found
+                    value = token["value"]
+                    return {
+                        "value": str(int(value)) if value.is_integer() else str(value),
+                        "page": page["page_num"],
+                        "context": index.line_text(box),
+                        "metric": metric_name,
+                        "pattern_used": f"layout: {label}"
+                    }
+        return None
+    
+    def _extract_sentence_context(self, text: str, start: int, end: int) -> str:
         """Извлекает полное предложение с найденным текстом"""
-        start = match.start()
-        end = match.end()
-        
         # Ищем начало предложения (идем назад до точки или начала)
         sentence_start = start
         for i in range(start - 1, max(0, start - 200), -1):
@@ -280,67 +396,57 @@ class AdvancedReportAnalyzer:
     
     def extract_smr_with_evidence(self) -> Tuple[Optional[float], Optional[Dict]]:
         """Извлекает СМР с доказательствами"""
-        patterns = [
-            r'Фактическое выполнение СМР.*?составляет\s*[–-]?\s*(\d+[.,]\d+)\s*%',
-            r'СМР\s*выполнен[оа]?\s*:?\s*(\d+[.,]?\d*)\s*%',
-            r'СМР\s*освоен[оа]?\s*(?:на)?\s*(\d+[.,]?\d*)\s*(?:процент|%)',
-            r'[Вв]ыполнение\s*(?:строительно[- ]?монтажных\s*работ|СМР)\s*:?\s*(\d+[.,]?\d*)\s*%',
-        ]
-        
-        for pattern in patterns:
-            evidence = self.find_in_pages(pattern, "СМР")
-            if evidence:
-                try:
-                    value = float(evidence["value"].replace(',', '.'))
-                    evidence["extracted_value"] = value
-                    return value, evidence
-                except:
-                    continue
+        for evidence in self.find_metric_in_pages(ADVANCED_PATTERNS["smr"], "СМР"):
+            try:
+                value = float(evidence["value"].replace(',', '.'))
+                evidence["extracted_value"] = value
+                return value, evidence
+            except:
+                continue
+        
+        # Текст страницы мог склеиться не в том порядке (таблицы, колонки) — ищем число по координатам
+        evidence = self.find_layout_value(SMR_LABELS, "СМР", ADVANCED_PATTERNS["smr"].keywords, percent=True)
+        if evidence:
+            value = float(evidence["value"])
+            evidence["extracted_value"] = value
+            return value, evidence
         
         return None, None
     
     def extract_gpr_with_evidence(self) -> Tuple[Optional[float], Optional[int], Optional[Dict]]:
         """Извлекает отставание от ГПР с доказательствами"""
-        patterns = [
-            r'[Оо]тставание.*?(\d+)\s*дн',
-            r'[Оо]тставани[яе]\s+от\s+[Гг][Пп][Рр]\s*[–-]?\s*(\d+)\s*дн',
-            r'[Оо]тставание\s+от\s+графика.*?(\d+)\s*дн',
-            r'[Зз]адержка\s*(?:работ)?\s*[–-]?\s*(\d+)\s*дн',
-        ]
-        
         delay_evidence = None
         delay_days = None
         
-        for pattern in patterns:
-            evidence = self.find_in_pages(pattern, "Отставание")
-            if evidence:
-                try:
-                    delay_days = int(evidence["value"])
-                    delay_evidence = evidence
-                    delay_evidence["extracted_value"] = delay_days
-                    break
-                except:
-                    continue
+        for evidence in self.find_metric_in_pages(ADVANCED_PATTERNS["gpr_delay"], "Отставание"):
+            try:
+                delay_days = int(evidence["value"])
+                delay_evidence = evidence
+                delay_evidence["extracted_value"] = delay_days
+                break
+            except:
+                continue
+        
+        if delay_days is None:
+            evidence = self.find_layout_value(DELAY_LABELS, "Отставание", ADVANCED_PATTERNS["gpr_delay"].keywords,
+                                              unit=DAYS_UNIT)
+            if evidence and float(evidence["value"]) > 0 and float(evidence["value"]).is_integer():
+                delay_days = int(float(evidence["value"]))
+                delay_evidence = evidence
+                delay_evidence["extracted_value"] = delay_days
         
         if delay_days is None:
             return None, None, None
         
         # Ищем нормативный срок
-        norm_patterns = [
-            r'[Нн]ормативный\s*срок.*?(\d+)\s*месяц',
-            r'[Сс]рок\s*строительства\s*:?\s*(\d+)\s*(?:мес|месяц)',
-        ]
-        
         norm_months = None
-        for pattern in norm_patterns:
-            norm_evidence = self.find_in_pages(pattern, "Нормативный срок")
-            if norm_evidence:
-                try:
-                    norm_months = int(norm_evidence["value"])
-                    delay_evidence["norm_period"] = norm_evidence
-                    break
-                except:
-                    continue
+        for norm_evidence in self.find_metric_in_pages(ADVANCED_PATTERNS["norm_period"], "Нормативный срок"):
+            try:
+                norm_months = int(norm_evidence["value"])
+                delay_evidence["norm_period"] = norm_evidence
+                break
+            except:
+                continue
         
         if norm_months:
             norm_days = norm_months * 30
@@ -354,95 +460,121 @@ class AdvancedReportAnalyzer:
     
     def extract_ddu_monthly_from_table(self) -> Tuple[List[float], Optional[Dict]]:
         """Извлекает месячные поступления из таблицы 'Приложение 2 к Таблице 7'"""
+        if self.document is None:
+            return [], None
+        heading_pages = []
         try:
-            with pdfplumber.open(self.pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages, 1):
-                    page_text = page.extract_text().lower()
-                    # Ищем текст "Приложение 2 к Таблице 7" или похожий
-                    if ("приложение" in page_text and "таблица 7" in page_text) or \
-                       ("приложение 2" in page_text) or \
-                       ("таблица" in page_text and "дду" in page_text):
-                        
-                        page_tables = page.extract_tables()
-                        if page_tables:
-                            # Ищем таблицу с подходящим размером (6x7 или близко к этому)
-                            for table_idx, table in enumerate(page_tables):
-                                if not table or len(table) < 5:
-                                    continue
-                                    
-                                rows = len(table)
-                                cols = len(table[0]) if table[0] else 0
-                                
-                                # Таблица должна быть примерно 6 на 7 (или близко)
-                                if 5 <= rows <= 10 and 5 <= cols <= 8:
-                                    monthly_values = []
-                                    
-                                    # Стратегия 1: Ищем числовые значения в последней колонке (обычно 6-я или 7-я)
-                                    # Берем последние 3 числовых значения из этого столбца
-                                    numeric_values = []
-                                    
-                                    # Проходим по всем ячейкам таблицы и ищем числовые значения
-                                    for row_idx, row in enumerate(table):
-                                        for col_idx, cell in enumerate(row):
-                                            if cell is None:
-                                                continue
-                                            cell_str = str(cell).strip()
-                                            # Нормализуем число (удаляем пробелы, запятые, тыс разделители)
-                                            normalized = cell_str.replace(' ', '').replace(',', '.')
-                                            try:
-                                                # Пробуем преобразовать в число
-                                                # Ищем числа > 100000 (поступления в тысячах или миллионах)
-                                                value = float(normalized)
-                                                if value > 100000:  # Фильтруем маленькие числа
-                                                    numeric_values.append({
-                                                        'value': value,
-                                                        'row': row_idx,
-                                                        'col': col_idx,
-                                                        'original': cell_str
-                                                    })
-                                            except:
-                                                pass
-                                    
-                                    # Берем последние 3 значения (предполагаем, что это последние 3 месяца)
-                                    if numeric_values:
-                                        numeric_values.sort(key=lambda x: (x['row'], x['col']), reverse=True)
-                                        monthly_values = [v['value'] for v in numeric_values[:3]]
-                                        monthly_values.reverse()  # Восстанавливаем порядок
-                                        
-                                        if len(monthly_values) >= 3:
-                                            return monthly_values[:3], {
-                                                "page": page_num,
-                                                "table_index": table_idx,
-                                                "source": "Приложение 2 к Таблице 7",
-                                                "values": monthly_values[:3],
-                                                "note": "Месячные поступления по ДДУ из таблицы (в тыс.тг или млн.тг)"
-                                            }
+            # Сначала ищем заголовок по координатам слов и таблицу только под ним
+            heading_pages = [page_num for page_num in self.document.page_numbers()
+                             if DDU_TABLE_HEADING.search(self.document.text(page_num))]
+            for page_num in heading_pages:
+                top = self._ddu_heading_bottom(page_num) or 0
+                shaped_table = False
+                for table_idx, table in enumerate(self.document.tables_below(page_num, top)):
+                    if not self._is_ddu_table_shape(table):
+                        continue
+                    # Первая подходящая по размеру таблица под заголовком — та самая
+                    shaped_table = True
+                    monthly_values = self._last_numeric_cells(table)
+                    if len(monthly_values) >= 3:
+                        return monthly_values, self._ddu_table_evidence(page_num, table_idx, monthly_values)
+                    break
+                if not shaped_table:
+                    # Таблица без линий разметки не распознаётся — берём колонку по координатам слов
+                    monthly_values = self.document.word_index(page_num).column_numbers(
+                        DDU_PAID_HEADER, count=3, minimum=100000, top=top)
+                    if len(monthly_values) >= 3:
+                        evidence = self._ddu_table_evidence(page_num, None, monthly_values)
+                        evidence["column"] = DDU_PAID_HEADER
+                        return monthly_values, evidence
+        except Exception as e:
+            # Ошибка поиска под заголовком не отменяет прежний поиск по страницам
+            print(f"Ошибка поиска таблицы ДДУ под заголовком: {e}")
+        
+        try:
+            # Прежний поиск по всем таблицам страницы: при найденном заголовке — только на его страницах,
+            # без заголовка — на всех похожих страницах
+            for page_num in heading_pages or self.document.page_numbers():
+                page_text = self.document.text(page_num).lower()
+                # Ищем текст "Приложение 2 к Таблице 7" или похожий
+                if heading_pages or ("приложение" in page_text and "таблица 7" in page_text) or \
+                   ("приложение 2" in page_text) or \
+                   ("таблица" in page_text and "дду" in page_text):
+                    
+                    # Ищем таблицу с подходящим размером (6x7 или близко к этому)
+                    for table_idx, table in enumerate(self.document.tables(page_num)):
+                        if not self._is_ddu_table_shape(table):
+                            continue
+                        monthly_values = self._last_numeric_cells(table)
+                        if len(monthly_values) >= 3:
+                            return monthly_values, self._ddu_table_evidence(page_num, table_idx, monthly_values)
         except Exception as e:
             print(f"Ошибка извлечения таблицы ДДУ: {e}")
         
         return [], None
+    
+    def _ddu_heading_bottom(self, page_num: int) -> Optional[float]:
+        """Нижняя граница заголовка 'Приложение 2 к Таблице 7' по координатам слов"""
+        # Слова сравниваются по началу, поэтому основы покрывают «Таблице»/«Таблица»
+        boxes = self.document.word_index(page_num).find_phrase("Приложени 2 к Таблиц 7")
+        return boxes[0][3] if boxes else None
+    
+    @staticmethod
+    def _is_ddu_table_shape(table: List) -> bool:
+        """Таблица должна быть примерно 6 на 7 (или близко)"""
+        if not table or len(table) < 5:
+            return False
+        rows = len(table)
+        cols = len(table[0]) if table[0] else 0
+        return 5 <= rows <= 10 and 5 <= cols <= 8
+    
+    @staticmethod
+    def _last_numeric_cells(table: List, count: int = 3, minimum: float = 100000) -> List[float]:
+        """Последние count числовых ячеек больше minimum (поступления в тысячах или миллионах)
+
+        Ячейки просматриваются с конца таблицы, поэтому сортировать все числа не нужно.
+        Результат — в порядке следования в таблице (предполагаем, что это последние 3 месяца).
+        """
+        values = []
+        for row in reversed(table):
+            for cell in reversed(row):
+                if cell is None:
+                    continue
+                # Нормализуем число (удаляем пробелы, запятые, тыс разделители)
+                normalized = str(cell).strip().replace(' ', '').replace(',', '.')
+                if not NUMERIC_CELL.fullmatch(normalized):
+                    continue
+                value = float(normalized)
+                if value > minimum:
+                    values.append(value)
+                    if len(values) == count:
+                        return values[::-1]
+        return values[::-1]
+    
+    @staticmethod
+    def _ddu_table_evidence(page_num: int, table_idx: int, monthly_values: List[float]) -> Dict:
+        return {
+            "page": page_num,
+            "table_index": table_idx,
+            "source": "Приложение 2 к Таблице 7",
+            "values": monthly_values,
+            "note": "Месячные поступления по ДДУ из таблицы (в тыс.тг или млн.тг)"
+        }
 
     def extract_ddu_with_evidence(self) -> Tuple[List[float], Optional[Dict], Optional[List[float]]]:
         """Извлекает ДДУ с доказательствами. Возвращает (проценты, доказательства, месячные_значения)"""
         
         # Вариант 1: Пробуем извлечь месячные значения из таблицы
-        monthly_values, table_evidence = self.extract_ddu_monthly_from_table()
+        with self.timings.stage("ddu.table"):
+            monthly_values, table_evidence = self.extract_ddu_monthly_from_table()
         if monthly_values and len(monthly_values) >= 3:
             # Возвращаем месячные значения И пустой список процентов
             # (так как месячные значения будут пересчитаны в статус-калькуляторе)
             return [], table_evidence, monthly_values
         
         # Вариант 2: Ищем процент поступлений ДДУ в тексте
-        patterns = [
-            r'([0-9]+[.,][0-9]+)\s*%\s*от\s*общего\s*поступления.*?средства\s*дольщиков',
-            r'[Сс]редства\s*дольщиков.*?(\d+[.,]?\d*)\s*%',
-            r'[Пп]оступления\s*(?:от|по)?\s*дольщиков.*?(\d+[.,]?\d*)\s*%',
-            r'ДДУ\s*поступления\s*:?\s*(\d+[.,]?\d*)\s*%',
-        ]
-        
-        for pattern in patterns:
-            evidence = self.find_in_pages(pattern, "ДДУ")
-            if evidence:
+        with self.timings.stage("ddu.text"):
+            for evidence in self.find_metric_in_pages(ADVANCED_PATTERNS["ddu"], "ДДУ"):
                 try:
                     percent = float(evidence["value"].replace(',', '.'))
                     evidence["extracted_value"] = percent
@@ -455,30 +587,27 @@ class AdvancedReportAnalyzer:
     
     def check_guarantee_with_evidence(self) -> Tuple[bool, Optional[Dict]]:
         """Проверяет гарантийный случай с доказательствами"""
-        patterns = [
-            r'гарантийного\s*случа[яй]',
-            r'[Гг]арантийный\s*случай',
-            r'наступлени[еи]\s*гарантийного\s*случая',
-        ]
-        
-        for pattern in patterns:
-            evidence = self.find_in_pages(pattern, "Гарантийный случай")
-            if evidence:
-                evidence["extracted_value"] = True
-                return True, evidence
+        for evidence in self.find_metric_in_pages(ADVANCED_PATTERNS["guarantee"], "Гарантийный случай"):
+            evidence["extracted_value"] = True
+            return True, evidence
         
         return False, None
     
     def analyze(self) -> Dict:
         """Полный анализ с доказательствами"""
         # Извлекаем информацию о проекте
-        project_info = self.extract_project_info()
+        with self.timings.stage("project_info"):
+            project_info = self.extract_project_info()
         
         # Извлекаем метрики с доказательствами
-        smr, smr_evidence = self.extract_smr_with_evidence()
-        gpr_percent, gpr_days, gpr_evidence = self.extract_gpr_with_evidence()
-        ddu_percent, ddu_evidence, ddu_monthly = self.extract_ddu_with_evidence()
-        guarantee, guarantee_evidence = self.check_guarantee_with_evidence()
+        with self.timings.stage("smr"):
+            smr, smr_evidence = self.extract_smr_with_evidence()
+        with self.timings.stage("gpr_delay"):
+            gpr_percent, gpr_days, gpr_evidence = self.extract_gpr_with_evidence()
+        with self.timings.stage("ddu"):
+            ddu_percent, ddu_evidence, ddu_monthly = self.extract_ddu_with_evidence()
+        with self.timings.stage("guarantee"):
+            guarantee, guarantee_evidence = self.check_guarantee_with_evidence()
         
         # Собираем все доказательства
         self.evidence = {
@@ -505,7 +634,9 @@ class AdvancedReportAnalyzer:
             metrics['DDU_monthly_values'] = ddu_monthly
         
         # Классифицируем
-        status, conditions, reasoning = self.classify_with_reasoning(metrics)
+        with self.timings.stage("classify"):
+            status, conditions, reasoning = self.classify_with_reasoning(metrics)
+        self.timings.count("regex_ms", round(self.regex_seconds * 1000, 2))
         
         return {
             'project_info': project_info,
@@ -513,7 +644,8 @@ class AdvancedReportAnalyzer:
             'metrics': metrics,
             'evidence': self.evidence,
             'triggered_conditions': conditions,
-            'reasoning': reasoning
+            'reasoning': reasoning,
+            'timings': self.timings.as_dict()
         }
     
     def classify_with_reasoning(self, metrics: Dict) -> Tuple[str, List[str], List[str]]:
@@ -719,43 +851,55 @@ class AdvancedReportAnalyzer:
     def extract_tables(self) -> List[Dict]:
         """Извлекает таблицы из PDF"""
         tables = []
+        if self.document is None:
+            return tables
         try:
-            with pdfplumber.open(self.pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages, 1):
-                    page_tables = page.extract_tables()
-                    if page_tables:
-                        for table_idx, table in enumerate(page_tables):
-                            tables.append({
-                                'page': page_num,
-                                'table_index': table_idx,
-                                'headers': table[0] if table else [],
-                                'rows': table[1:] if len(table) > 1 else [],
-                                'content': table
-                            })
+            for page_num in self.document.page_numbers():
+                page_tables = self.document.tables(page_num)
+                if page_tables:
+                    for table_idx, table in enumerate(page_tables):
+                        tables.append({
+                            'page': page_num,
+                            'table_index': table_idx,
+                            'headers': table[0] if table else [],
+                            'rows': table[1:] if len(table) > 1 else [],
+                            'content': table
+                        })
         except Exception as e:
             print(f"Ошибка извлечения таблиц: {e}")
         
         return tables
     
-    def extract_images_metadata(self) -> List[Dict]:
-        """Извлекает метаданные о изображениях (страницы, размеры)"""
+    def extract_images_metadata(self, inventory: bool = True) -> List[Dict]:
+        """Извлекает метаданные о изображениях (страницы, размеры)
+
+        inventory=True — опись по ресурсам и операторам Do страницы (page_scan.page_images):
+        без анализа раскладки и без распаковки изображений, с размером в пикселях.
+        inventory=False — объекты image pdfplumber (полный разбор страниц с изображениями).
+        """
         images = []
+        if self.document is None:
+            return images
         try:
-            with pdfplumber.open(self.pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages, 1):
-                    if hasattr(page, 'chars'):
-                        # Получаем информацию об объектах на странице
-                        page_images = page.objects.get('image', [])
-                        if page_images:
-                            for img_idx, img in enumerate(page_images):
-                                images.append({
-                                    'page': page_num,
-                                    'x0': img.get('x0'),
-                                    'top': img.get('top'),
-                                    'width': img.get('width'),
-                                    'height': img.get('height'),
-                                    'description': f'Изображение на странице {page_num}'
-                                })
+            for page_num in self.document.page_numbers():
+                # Получаем информацию об объектах на странице
+                if inventory:
+                    page_images = self.document.image_inventory(page_num)
+                else:
+                    page_images = self.document.images(page_num)
+                if page_images:
+                    for img_idx, img in enumerate(page_images):
+                        item = {
+                            'page': page_num,
+                            'x0': img.get('x0'),
+                            'top': img.get('top'),
+                            'width': img.get('width'),
+                            'height': img.get('height'),
+                            'description': f'Изображение на странице {page_num}'
+                        }
+                        if inventory:
+                            item['pixel_width'], item['pixel_height'] = img['srcsize']
+                        images.append(item)
         except Exception as e:
             print(f"Ошибка извлечения изображений: {e}")
         
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ПУЛ ПРОЦЕССОВ ДЛЯ АНАЛИЗА PDF
+Ограниченный пул воркеров с таймаутом на задачу и перезапуском воркера после N задач
+"""
+
+import os
+import queue
+import threading
+import multiprocessing
+from typing import Any, Callable, Optional
+
+
+class JobTimeoutError(Exception):
+    """Задача не уложилась в отведённое время, воркер остановлен"""
+    pass
+
+
+class JobFailedError(Exception):
+    """Задача завершилась исключением или воркер упал"""
+    pass
+
+
+def _worker_main(conn, max_jobs: int):
+    """Цикл воркера: получает (функция, аргументы), отправляет (успех, результат)"""
+    jobs = 0
+    conn.send('ready')
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        func, args = job
+        try:
+            conn.send((True, func(*args)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+        jobs += 1
+        if max_jobs and jobs >= max_jobs:
+            break
+    conn.close()
+
+
+class _Worker:
+    # Время на запуск интерпретатора и импорт модулей (не входит в таймаут задачи)
+    START_TIMEOUT = 60
+
+    def __init__(self, ctx, max_jobs: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, max_jobs), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        try:
+            ready = self.conn.poll(self.START_TIMEOUT) and self.conn.recv() == 'ready'
+        except (EOFError, OSError):
+            ready = False
+        if not ready:
+            self.stop(kill=True)
+            raise JobFailedError("analysis worker failed to start")
+
+    def stop(self, kill: bool = False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class AnalysisPool:
+    """Пул из size процессов; каждая задача выполняется в отдельном воркере
+
+    run() блокирует вызывающий поток до результата. Если задача не уложилась в timeout,
+    воркер принудительно завершается (SIGKILL) и заменяется новым. После max_jobs_per_worker
+    задач воркер завершается сам и тоже заменяется — это ограничивает рост памяти pdfminer.
+    Воркеры создаются лениво, при первой задаче.
+    """
+
+    def __init__(self, size: int = None, timeout: float = 60.0, max_jobs_per_worker: int = 50,
+                 start_method: str = 'spawn'):
+        self.size = size or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.pid = os.getpid()
+        self._ctx = multiprocessing.get_context(start_method)
+        self._slots: "queue.Queue[Optional[_Worker]]" = queue.Queue()
+        for _ in range(self.size):
+            self._slots.put(None)
+        self._closed = False
+
+    def _acquire(self) -> _Worker:
+        worker = self._slots.get()
+        if worker is None or not worker.process.is_alive():
+            if worker is not None:
+                worker.stop(kill=True)
+            try:
+                worker = _Worker(self._ctx, self.max_jobs_per_worker)
+            except BaseException:
+                self._slots.put(None)
+                raise
+        return worker
+
+    def _release(self, worker: Optional[_Worker]):
+        if worker is not None and self.max_jobs_per_worker and worker.jobs >= self.max_jobs_per_worker:
+            # Воркер уже вышел из цикла сам — дожидаемся его и освобождаем слот
+            worker.stop()
+            worker = None
+        self._slots.put(worker)
+
+    def run(self, func: Callable, *args, timeout: float = None) -> Any:
+        """Выполняет func(*args) в воркере и возвращает результат"""
+        if self._closed:
+            raise RuntimeError("AnalysisPool is shut down")
+        timeout = self.timeout if timeout is None else timeout
+        worker = self._acquire()
+        completed = False
+        try:
+            worker.conn.send((func, args))
+            if not worker.conn.poll(timeout):
+                raise JobTimeoutError(f"PDF analysis timeout ({timeout} s)")
+            try:
+                ok, payload = worker.conn.recv()
+            except (EOFError, OSError):
+                raise JobFailedError("analysis worker died")
+            completed = True
+            worker.jobs += 1
+            if not ok:
+                raise JobFailedError(payload)
+            return payload
+        finally:
+            if not completed:
+                # Воркер мог остаться с незавершённой задачей — его ответ нельзя отдать следующему
+                worker.stop(kill=True)
+                worker = None
+            self._release(worker)
+
+    def shutdown(self):
+        """Останавливает свободных воркеров (занятые завершатся вместе с процессом)"""
+        self._closed = True
+        while True:
+            try:
+                worker = self._slots.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.stop()
+
+
+_pool: Optional[AnalysisPool] = None
+_pool_lock = threading.Lock()
+
+
+def pool_from_env() -> AnalysisPool:
+    """Пул текущего процесса, настроенный переменными окружения (создаётся после fork)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = AnalysisPool(
+                size=int(os.environ.get('ANALYSIS_POOL_SIZE', 0)) or None,
+                timeout=float(os.environ.get('ANALYSIS_TIMEOUT', 60)),
+                max_jobs_per_worker=int(os.environ.get('ANALYSIS_MAX_JOBS_PER_WORKER', 50)),
+                start_method=os.environ.get('ANALYSIS_START_METHOD', 'spawn'),
+            )
+        return _pool
@@ -4,14 +4,25 @@
 API Server для анализа PDF отчётов
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import os
 import tempfile
+import time
 import hashlib
-import signal
 from werkzeug.utils import secure_filename
-from advanced_analyzer import AdvancedReportAnalyzer
+from advanced_analyzer import AdvancedReportAnalyzer, ANALYZER_VERSION, PATTERNS_VERSION
+from result_cache import cache_from_env
+from project_store import store_from_env
+from page_artifacts import artifacts_from_env, source_digest
+from analysis_pool import pool_from_env, JobTimeoutError
+from job_queue import job_store_from_env, jobs_from_env, QueueFullError, STATUS_QUEUED, STATUS_DONE
+from uploads import SpooledUpload
+from timings import log_timings, timings_requested
+from text_backends import TEXT_BACKEND_LAYOUT, backend_version, requested_text_backend
+from telemetry import (
+    in_flight, record_analysis, record_cache, record_fallback, record_rss, render_metrics, timed_request
+)
 
 app = Flask(__name__)
 CORS(app)
@@ -24,13 +35,15 @@ MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
+# Кэш результатов по хешу содержимого (общий для всех воркеров)
+CACHE_VERSION = f"advanced-{ANALYZER_VERSION}-p{PATTERNS_VERSION}"
+result_cache = cache_from_env()
 
-class TimeoutException(Exception):
-    pass
+# История анализов по проектам и периодам
+project_store = store_from_env()
 
-
-def timeout_handler(signum, frame):
-    raise TimeoutException("PDF analysis timeout")
+# Постраничные данные для повторного анализа без разбора PDF (пишутся в процессах пула)
+page_artifacts = artifacts_from_env()
 
 
 def allowed_file(filename):
@@ -76,6 +89,7 @@ def generate_fallback_code(name: str, period: str) -> str:
 
 def create_fallback_response(filename: str):
     """Создаёт fallback ответ когда анализ PDF не сработал"""
+    record_fallback('api')
     return {
         'projectId': generate_project_id(filename),
         'project_info': {
@@ -102,6 +116,123 @@ def create_fallback_response(filename: str):
     }
 
 
+def analyze_file(source, filename: str, digest: str = None, text_backend: str = None) -> tuple:
+    """Анализирует PDF (bytes или путь) в процессе пула. Возвращает (ответ API, замеры этапов)
+
+    text_backend — движок текста страниц (layout или fast, см. text_backends.py).
+    """
+    if isinstance(source, str):
+        analyzer = AdvancedReportAnalyzer(pdf_path=source, text_backend=text_backend)
+    else:
+        analyzer = AdvancedReportAnalyzer(pdf_data=source, text_backend=text_backend)
+    with analyzer:
+        result = analyzer.analyze()
+        if page_artifacts is not None:
+            page_artifacts.put(digest or source_digest(source), filename, analyzer.document.snapshot())
+    
+    record_rss('api')
+    return build_response(result), result['timings']
+
+
+def build_response(result: dict) -> dict:
+    """Ответ API по результату AdvancedReportAnalyzer.analyze()"""
+    # Преобразуем результат в JSON-совместимый формат
+    project_code = result['project_info'].get('code', '')
+    project_name = result['project_info'].get('full_name', '')
+    report_period = result['project_info'].get('report_period', '')
+    project_customer = result['project_info'].get('customer', '')
+    
+    # Если код не извлечен, используем fallback
+    if not project_code:
+        fallback_code = generate_fallback_code(project_name, report_period)
+        print(f"Code extraction failed, using fallback: '{fallback_code}'")
+        project_code = fallback_code
+    
+    project_id = generate_project_id(project_code, project_customer)
+    
+    response = {
+        'projectId': project_id,  # Уникальный ID для дедублирования
+        'project_info': {
+            'full_name': result['project_info'].get('full_name', 'Unknown'),
+            'code': result['project_info'].get('code', '') or project_code,  # Используем fallback код если original пустой
+            'customer': result['project_info'].get('customer', ''),
+            'report_period': result['project_info'].get('report_period', 'Unknown'),
+            'location': result['project_info'].get('location', ''),
+        },
+        'project_status': result['project_status'],
+        'metrics': {
+            'SMR_completion': result['metrics'].get('SMR_completion'),
+            'GPR_delay_percent': result['metrics'].get('GPR_delay_percent'),
+            'GPR_delay_days': result['metrics'].get('GPR_delay_days'),
+            'DDU_payments_percent': result['metrics'].get('DDU_payments_percent', []),
+            'DDU_monthly_values': result['metrics'].get('DDU_monthly_values'),
+            'guarantee_extension': result['metrics'].get('guarantee_extension', False)
+        },
+        'reasoning': result['reasoning'],
+        'triggered_conditions': result['triggered_conditions']
+    }
+    # Если требуется ручной ввод названия, добавляем флаг во внешний объект
+    if result['project_info'].get('require_manual_name'):
+        response['require_manual_name'] = True
+    return response
+
+
+def run_analysis(source, filename: str, digest: str, include_timings: bool = False,
+                 text_backend: str = TEXT_BACKEND_LAYOUT) -> dict:
+    """Анализирует PDF (bytes или путь) в пуле процессов и кэширует ответ; при ошибке — fallback"""
+    started = time.perf_counter()
+    try:
+        # Анализ выполняется в пуле процессов с таймаутом
+        with in_flight('api'):
+            response, timings = pool_from_env().run(analyze_file, source, filename, digest, text_backend)
+        record_analysis('api', time.perf_counter() - started, timings.get('pages'))
+        
+        if result_cache is not None:
+            result_cache.put(digest, backend_version(CACHE_VERSION, text_backend), response)
+        if project_store is not None:
+            project_store.save(response, 'api', digest, filename)
+        
+        log_timings('api', filename, timings, outcome='success', text_backend=text_backend,
+                    request_ms=round((time.perf_counter() - started) * 1000, 2))
+        if include_timings:
+            response = {**response, 'timings': timings}
+        return response
+        
+    except JobTimeoutError as e:
+        # Анализ не уложился в таймаут — воркер остановлен, используем fallback
+        print(f"PDF analysis timeout (using fallback): {str(e)}")
+        log_timings('api', filename, None, outcome='timeout',
+                    request_ms=round((time.perf_counter() - started) * 1000, 2))
+        return create_fallback_response(filename)
+    
+    except Exception as e:
+        # При ошибке анализа используем fallback
+        print(f"PDF analysis error (using fallback): {str(e)}")
+        log_timings('api', filename, None, outcome='error',
+                    request_ms=round((time.perf_counter() - started) * 1000, 2))
+        return create_fallback_response(filename)
+
+
+def read_upload():
+    """Проверяет загруженный файл; возвращает (имя, SpooledUpload, None) или (None, None, ответ с ошибкой)"""
+    # Проверяем, есть ли файл в запросе
+    if 'file' not in request.files:
+        return None, None, (jsonify({'error': 'No file provided'}), 400)
+    
+    file = request.files['file']
+    
+    # Проверяем имя файла
+    if file.filename == '':
+        return None, None, (jsonify({'error': 'No file selected'}), 400)
+    
+    # Проверяем расширение файла
+    if not allowed_file(file.filename):
+        return None, None, (jsonify({'error': 'Only PDF files are allowed'}), 400)
+    
+    # Небольшие файлы остаются в памяти, крупные — в уникальном временном файле
+    upload = SpooledUpload.from_stream(file.stream, directory=app.config['UPLOAD_FOLDER'])
+    return secure_filename(file.filename), upload, None
+
 
 @app.route('/api/analyze-report', methods=['POST'])
 def analyze_report():
@@ -111,96 +242,142 @@ def analyze_report():
     Returns:
         JSON с результатами анализа
     """
-    try:
-        # Проверяем, есть ли файл в запросе
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-        
-        file = request.files['file']
+    with timed_request('api') as outcome:
+        try:
+            filename, upload, error = read_upload()
+            if error is not None:
+                outcome['value'] = 'rejected'
+                return error
+            try:
+                text_backend = requested_text_backend(request)
+            except ValueError as e:
+                upload.close()
+                outcome['value'] = 'rejected'
+                return jsonify({'error': str(e)}), 400
+            
+            with upload:
+                # Тот же файл уже анализировался (возможно, под другим именем)
+                include_timings = timings_requested(request)
+                if result_cache is not None:
+                    cached = result_cache.get(upload.digest, backend_version(CACHE_VERSION, text_backend))
+                    record_cache('api', cached is not None)
+                    if cached is not None:
+                        if project_store is not None:
+                            project_store.save(cached, 'api', upload.digest, filename)
+                        log_timings('api', filename, None, outcome='cache_hit', bytes=upload.size)
+                        if include_timings:
+                            cached['timings'] = {'cache_hit': True}
+                        outcome['value'] = 'cache_hit'
+                        return jsonify(cached), 200
+                
+                response = run_analysis(upload.source(), filename, upload.digest, include_timings, text_backend)
+                fallback = 'fallback_mode' in response.get('triggered_conditions', [])
+                outcome['value'] = 'fallback' if fallback else 'success'
+                return jsonify(response), 200
         
-        # Проверяем имя файла
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
+        except Exception as e:
+            return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Принимает PDF отчёта и сразу возвращает ID задачи анализа
+    
+    Returns:
+        JSON с jobId, статусом и глубиной очереди (202), 503 если очередь заполнена
+    """
+    try:
+        filename, upload, error = read_upload()
+        if error is not None:
+            return error
+        try:
+            text_backend = requested_text_backend(request)
+        except ValueError as e:
+            upload.close()
+            return jsonify({'error': str(e)}), 400
         
-        # Проверяем расширение файла
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Only PDF files are allowed'}), 400
+        jobs = jobs_from_env(run_analysis)
+        job_id = jobs.new_id()
+        digest = upload.digest
         
-        # Сохраняем файл во временную папку
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        with upload:
+            # Результат уже в кэше — задача сразу завершена
+            cached = None
+            if result_cache is not None:
+                cached = result_cache.get(digest, backend_version(CACHE_VERSION, text_backend))
+                record_cache('api', cached is not None)
+            if cached is not None:
+                if project_store is not None:
+                    project_store.save(cached, 'api', digest, filename)
+                jobs.store.create(job_id, filename, STATUS_DONE, cached)
+                return jsonify({'jobId': job_id, 'status': STATUS_DONE, 'queue_depth': jobs.store.depth()}), 202
+            
+            # Задача ждёт в очереди дольше запроса, поэтому файл сохраняется на диск под уникальным именем
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{filename}")
+            upload.save(filepath)
         
         try:
-            # Пытаемся анализировать PDF
-            analyzer = AdvancedReportAnalyzer(pdf_path=filepath)
-            result = analyzer.analyze()
-            
-            # Преобразуем результат в JSON-совместимый формат
-            project_code = result['project_info'].get('code', '')
-            project_name = result['project_info'].get('full_name', '')
-            report_period = result['project_info'].get('report_period', '')
-            project_customer = result['project_info'].get('customer', '')
-            
-            # Если код не извлечен, используем fallback
-            if not project_code:
-                fallback_code = generate_fallback_code(project_name, report_period)
-                print(f"Code extraction failed, using fallback: '{fallback_code}'")
-                project_code = fallback_code
-            
-            project_id = generate_project_id(project_code, project_customer)
-            
-            response = {
-                'projectId': project_id,  # Уникальный ID для дедублирования
-                'project_info': {
-                    'full_name': result['project_info'].get('full_name', 'Unknown'),
-                    'code': result['project_info'].get('code', '') or project_code,  # Используем fallback код если original пустой
-                    'customer': result['project_info'].get('customer', ''),
-                    'report_period': result['project_info'].get('report_period', 'Unknown'),
-                    'location': result['project_info'].get('location', ''),
-                },
-                'project_status': result['project_status'],
-                'metrics': {
-                    'SMR_completion': result['metrics'].get('SMR_completion'),
-                    'GPR_delay_percent': result['metrics'].get('GPR_delay_percent'),
-                    'GPR_delay_days': result['metrics'].get('GPR_delay_days'),
-                    'DDU_payments_percent': result['metrics'].get('DDU_payments_percent', []),
-                    'DDU_monthly_values': result['metrics'].get('DDU_monthly_values'),
-                    'guarantee_extension': result['metrics'].get('guarantee_extension', False)
-                },
-                'reasoning': result['reasoning'],
-                'triggered_conditions': result['triggered_conditions']
-            }
-            # Если требуется ручной ввод названия, добавляем флаг во внешний объект
-            if result['project_info'].get('require_manual_name'):
-                response['require_manual_name'] = True
-            
-            return jsonify(response), 200
-            
-        except Exception as e:
-            # При ошибке анализа используем fallback
-            print(f"PDF analysis error (using fallback): {str(e)}")
-            fallback = create_fallback_response(filename)
-            return jsonify(fallback), 200
+            jobs.submit(job_id, filepath, filename, digest, text_backend=text_backend)
+        except QueueFullError:
+            os.remove(filepath)
+            return jsonify({'error': 'Analysis queue is full, retry later',
+                            'queue_depth': jobs.store.depth()}), 503
         
-        finally:
-            # Удаляем временный файл
-            if os.path.exists(filepath):
-                try:
-                    os.remove(filepath)
-                except:
-                    pass
+        return jsonify({'jobId': job_id, 'status': STATUS_QUEUED, 'queue_depth': jobs.store.depth()}), 202
     
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Статус задачи анализа; для завершённой задачи result совпадает с ответом /api/analyze-report
+    """
+    jobs = jobs_from_env(run_analysis)
+    job = jobs.store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    job['queue_depth'] = jobs.store.depth()
+    return jsonify(job), 200
+
+
+@app.route('/api/projects', methods=['GET'])
+def projects_by_status():
+    """Проекты с заданным статусом (?status=...) по последнему сохранённому периоду"""
+    if project_store is None:
+        return jsonify({'error': 'Project store is disabled'}), 404
+    status = request.args.get('status')
+    if not status:
+        return jsonify({'error': 'status is required'}), 400
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({'projects': project_store.projects_by_status(status, limit)}), 200
+
+
+@app.route('/api/projects/<project_id>/history', methods=['GET'])
+def project_history(project_id):
+    """Последние N (?limit=..., по умолчанию 3) сохранённых периодов проекта, от нового к старому"""
+    if project_store is None:
+        return jsonify({'error': 'Project store is disabled'}), 404
+    limit = request.args.get('limit', 3, type=int)
+    return jsonify({'projectId': project_id, 'periods': project_store.latest(project_id, limit)}), 200
+
+
 @app.route('/api/health', methods=['GET'])
 def health():
     """Проверка здоровья сервера"""
     return jsonify({'status': 'ok'}), 200
 
 
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Метрики всех воркеров в формате Prometheus"""
+    # Только хранилище задач: очередь и её потоки для счётчика не запускаются
+    queued = job_store_from_env().count(STATUS_QUEUED)
+    return Response(render_metrics({'analysis_jobs_queued': queued}), mimetype='text/plain; version=0.0.4')
+
+
 if __name__ == '__main__':
     # Для разработки
     port = int(os.environ.get('PORT', 5002))
@@ -5,13 +5,23 @@ API Server для анализа PDF отчётов
 Оптимизированная версия с быстрым анализатором
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import os
 import tempfile
 import hashlib
-import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
+from result_cache import cache_from_env
+from page_artifacts import artifacts_from_env, source_digest
+from project_store import WINDOW_MONTHS, period_label, report_ddu_value, report_period_key, store_from_env
+from uploads import SpooledUpload
+from patterns import FAST_PATTERNS
+from analysis_pool import JobFailedError, JobTimeoutError, pool_from_env
+from timings import StageTimer, log_timings, source_size, timings_requested
+from text_backends import backend_version, requested_text_backend
+from telemetry import in_flight, record_analysis, record_cache, record_rss, render_metrics, timed_request
 
 app = Flask(__name__)
 CORS(app)
@@ -20,10 +30,26 @@ CORS(app)
 UPLOAD_FOLDER = tempfile.gettempdir()
 ALLOWED_EXTENSIONS = {'pdf'}
 MAX_FILE_SIZE = 50 * 1024 * 1024
+MAX_BATCH_FILES = 12
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
+# Версии логики анализа: при изменении экстракторов увеличьте ANALYZER_VERSION,
+# версия паттернов вычисляется из реестра автоматически
+ANALYZER_VERSION = "fast-1"
+PATTERNS_VERSION = FAST_PATTERNS.version
+CACHE_VERSION = f"{ANALYZER_VERSION}-p{PATTERNS_VERSION}"
+
+# Кэш результатов по хешу содержимого (общий для всех воркеров)
+result_cache = cache_from_env()
+
+# История анализов по проектам и периодам
+project_store = store_from_env()
+
+# Постраничные данные для повторного анализа без разбора PDF
+page_artifacts = artifacts_from_env()
+
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -38,25 +64,35 @@ def generate_project_id(code: str, customer: str = None) -> str:
     return f"{clean_code}-{hash_suffix}"
 
 
-def extract_text_from_pdf(filepath: str) -> dict:
-    """Быстрое извлечение текста из PDF. Возвращает full и first page text."""
+def extract_text_from_pdf(source, timer: StageTimer = None, text_backend: str = None) -> dict:
+    """Быстрое извлечение текста из PDF (путь или bytes). Возвращает full и first page text
+    и снимок постраничных данных (snapshot) для повторного анализа.
+    text_backend — движок текста (layout или fast, см. text_backends.py)."""
+    timer = timer or StageTimer()
     try:
-        import pdfplumber
-        with pdfplumber.open(filepath) as pdf:
-            text = ""
-            first = ""
-            for i, page in enumerate(pdf.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    if i == 0:
-                        first = page_text
-                    text += page_text + "\n"
-            return {'full': text, 'first': first}
+        from pdf_document import ParsedDocument
+        with ParsedDocument(source, text_backend=text_backend) as document:
+            with timer.stage('pdf_open'):
+                timer.count('pages', document.page_count)
+            with timer.stage('extract_text'):
+                # Большие документы разбираются параллельно по диапазонам страниц
+                document.prefetch(('text',))
+                texts = document_texts(document)
+            texts['snapshot'] = document.snapshot()
+        return texts
     except:
         # Fallback если pdfplumber не работает
         return {'full': '', 'first': ''}
 
 
+def document_texts(document) -> dict:
+    """Полный текст и текст первой страницы документа (ParsedDocument или StoredDocument)"""
+    page_texts = [document.text(i) for i in document.page_numbers()]
+    text = "".join(page_text + "\n" for page_text in page_texts if page_text)
+    first = page_texts[0] if page_texts else ""
+    return {'full': text, 'first': first}
+
+
 def extract_metrics(text: str) -> dict:
     """Извлекает метрики из текста PDF"""
     metrics = {
@@ -72,110 +108,59 @@ def extract_metrics(text: str) -> dict:
     }
     
     # СМР - Строительно-монтажные работы
-    smr_patterns = [
-        r'СМР.*?(\d+[.,]\d+)\s*%',
-        r'выполнение\s+СМР.*?(\d+[.,]\d+)',
-        r'строительно\D+монтажные.*?(\d+[.,]\d+)',
-    ]
-    for pattern in smr_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            metrics['SMR_completion'] = float(match.group(1).replace(',', '.'))
-            break
+    match = FAST_PATTERNS['smr'].search([text])
+    if match:
+        metrics['SMR_completion'] = float(match.value.replace(',', '.'))
     
     # ГПР - График-Процент-Резерв (отставание)
-    gpr_patterns = [
-        r'отставани[еюя].*?(\d+[.,]\d+)\s*%',
-        r'ГПР.*?(\d+[.,]\d+)',
-        r'от графика.*?(\d+[.,]\d+)',
-    ]
-    for pattern in gpr_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            metrics['GPR_delay_percent'] = float(match.group(1).replace(',', '.'))
-            break
+    match = FAST_PATTERNS['gpr'].search([text])
+    if match:
+        metrics['GPR_delay_percent'] = float(match.value.replace(',', '.'))
     
     # ГПР дни
-    gpr_days_patterns = [
-        r'отставани[еюя]\s+(\d+)\s+д[нн]',
-        r'(\d+)\s+д[нн].*?отставани',
-        r'дней.*?отставани|отставани.*?(\d+)\s+дней',
-    ]
-    for pattern in gpr_days_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            metrics['GPR_delay_days'] = int(match.group(1))
-            break
+    match = FAST_PATTERNS['gpr_days'].search([text])
+    if match:
+        metrics['GPR_delay_days'] = int(match.value)
     
     # ДДУ - Договор Долевого Участия (платежи)
     # Ищем несколько значений (за последние месяцы)
     ddu_values = []
-    ddu_patterns = [
-        r'ДДУ.*?(\d+[.,]\d+)\s*%',
-        r'платежи.*?(\d+[.,]\d+)',
-        r'поступлени[еяю].*?денежных.*?(\d+[.,]\d+)',
-    ]
-    
-    # Берём все совпадения для ДДУ
-    for pattern in ddu_patterns:
-        for match in re.finditer(pattern, text, re.IGNORECASE):
-            value = float(match.group(1).replace(',', '.'))
+    
+    # Берём все совпадения первого по приоритету паттерна ДДУ, который нашёлся
+    match = FAST_PATTERNS['ddu'].search([text])
+    if match:
+        for ddu_match in FAST_PATTERNS['ddu'].compiled[match.alternative].finditer(text):
+            value = float(ddu_match.group(1).replace(',', '.'))
             if value not in ddu_values:
                 ddu_values.append(value)
-        if ddu_values:
-            break
     
     # Если нашли несколько значений - используем их как история
     if ddu_values:
         metrics['DDU_payments_percent'] = ddu_values[:3]  # максимум 3 месяца
     
     # Гарантийный случай (d1)
-    if re.search(r'гарантийн\w+\s+случа\w*', text, re.IGNORECASE):
+    if FAST_PATTERNS['guarantee'].search([text]):
         metrics['guarantee_extension'] = True
     
     # Просрочка по займам (b2, d4)
-    delay_patterns = [
-        r'просрочк[аи].*?(\d+)\s+д[нн]',
-        r'(\d+)\s+д[нн].*?просрочк',
-    ]
-    for pattern in delay_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            metrics['builder_delay_days'] = int(match.group(1))
-            break
+    match = FAST_PATTERNS['builder_delay'].search([text])
+    if match:
+        metrics['builder_delay_days'] = int(match.value)
     
     # Жалобы дольщиков (b3, d2)
-    complaint_patterns = [
-        r'обращени[еям].*?(\d+)',
-        r'жалоб.*?(\d+)',
-    ]
-    for pattern in complaint_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            metrics['complaints_count'] = int(match.group(1))
-            break
+    match = FAST_PATTERNS['complaints'].search([text])
+    if match:
+        metrics['complaints_count'] = int(match.value)
     
     # Снижение рейтинга (b4, d3)
-    rating_patterns = [
-        r'рейтинг.*?(?:на|снижение).*?(\d+)',
-        r'снижение.*?рейтинг.*?(\d+)',
-    ]
-    for pattern in rating_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            metrics['builder_rating_drop'] = int(match.group(1))
-            break
+    match = FAST_PATTERNS['rating'].search([text])
+    if match:
+        metrics['builder_rating_drop'] = int(match.value)
     
     # Соотношение долга к капиталу (b5)
-    debt_patterns = [
-        r'(?:долг|заемн\w+).*?(?:капитал|собственн\w+).*?(\d+[.,]\d+)',
-        r'соотношени[еям].*?(?:долг|заемн\w+).*?(\d+[.,]\d+)',
-    ]
-    for pattern in debt_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            metrics['debt_to_equity'] = float(match.group(1).replace(',', '.'))
-            break
+    match = FAST_PATTERNS['debt'].search([text])
+    if match:
+        metrics['debt_to_equity'] = float(match.value.replace(',', '.'))
     
     return metrics
 
@@ -192,15 +177,11 @@ def extract_project_info(full_text: str, first_page_text: str = None) -> dict:
     }
     
     # Код проекта
-    code_patterns = [
-        r'ДПГ[\s-]?\d+[\s-]?\d+[\s-]?\d+',
-        r'Код[:\s]+([А-Яа-я\d\s-]+)',
-    ]
     # Сначала ищем код на первой странице
     search_targets = [first_page_text or '', full_text]
     for idx, target in enumerate(search_targets):
-        for pattern in code_patterns:
-            match = re.search(pattern, target)
+        for pattern in FAST_PATTERNS['code'].compiled:
+            match = pattern.search(target)
         if match:
                 info['code'] = match.group(0) if 'ДПГ' in match.group(0) else (match.group(1) if match.lastindex else match.group(0))
                 break
@@ -209,66 +190,36 @@ def extract_project_info(full_text: str, first_page_text: str = None) -> dict:
     
     # Название проекта - ищем после "Отчет инжиниринговой компании..."
     # Это название идёт после длинной строки с описанием отчёта
-    name_patterns = [
-        # Попытка найти название в кавычках после "Отчет инжиниринговой..."
-        r'Отчет\s+инжиниринговой.*?\n\s*([^\n]+)',
-        # Или название в кавычках как ЖК "..."
-        r'ЖК\s+"([^"]+)"',
-        # Или после слова "объект"
-        r'объект[:\s]+([^\n]+)',
-        # Или в строке "Наименование"
-        r'Наименовани[еюя][:\s]+([^\n]+)',
-    ]
     # Название — сначала проверяем первую страницу на явное указание ЖК
     found_name = False
     for idx, target in enumerate([first_page_text or '', full_text]):
-        for pattern in name_patterns:
-            match = re.search(pattern, target, re.IGNORECASE | re.DOTALL)
-            if match:
-                full_text_name = match.group(1).strip() if match.lastindex >= 1 else match.group(0).strip()
-                name = ' '.join(full_text_name.split())[:200]
-                if name and len(name) > 3:
-                    info['full_name'] = name
-                    found_name = True
-                    # если нашли на первой странице — отмечаем
-                    if idx == 0:
-                        info['name_from_first_page'] = True
-                    break
+        for match in FAST_PATTERNS['name'].iter_search([target]):
+            full_text_name = match.value.strip()
+            name = ' '.join(full_text_name.split())[:200]
+            if name and len(name) > 3:
+                info['full_name'] = name
+                found_name = True
+                # если нашли на первой странице — отмечаем
+                if idx == 0:
+                    info['name_from_first_page'] = True
+                break
         if found_name:
             break
     
     # Период отчета
-    period_patterns = [
-        r'(\d{4})\s+(января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)',
-        r'период[:\s]+([^\n]+)',
-    ]
-    for pattern in period_patterns:
-        match = re.search(pattern, full_text, re.IGNORECASE)
-        if match:
-            info['report_period'] = match.group(0)
-            break
+    match = FAST_PATTERNS['period'].search([full_text])
+    if match:
+        info['report_period'] = match.matched
     
     # Местоположение
-    location_patterns = [
-        r'город\s+([^\n,]+)',
-        r'расположен[иия][:\s]+([^\n]+)',
-    ]
-    for pattern in location_patterns:
-        match = re.search(pattern, full_text, re.IGNORECASE)
-        if match:
-            info['location'] = match.group(1).strip()
-            break
+    match = FAST_PATTERNS['location'].search([full_text])
+    if match:
+        info['location'] = match.value.strip()
     
     # Заказчик
-    customer_patterns = [
-        r'Заказчик[:\s]+([^\n]+)',
-        r'(ООО|АО|ИП)[^:\n]*',
-    ]
-    for pattern in customer_patterns:
-        match = re.search(pattern, full_text, re.IGNORECASE)
-        if match:
-            info['customer'] = match.group(1).strip()
-            break
+    match = FAST_PATTERNS['customer'].search([full_text])
+    if match:
+        info['customer'] = match.value.strip()
     
     return info
 
@@ -384,94 +335,393 @@ def generate_reasoning(metrics: dict, status: str) -> list:
     return reasoning
 
 
+def analyze_document(source, filename: str, digest: str = None, text_backend: str = None) -> tuple:
+    """Анализирует PDF (bytes или путь). Возвращает (ответ API, можно ли кэшировать ответ, замеры этапов)"""
+    timer = StageTimer()
+    size = source_size(source)
+    if size is not None:
+        timer.count('bytes', size)
+    
+    # Извлекаем текст из PDF (полный текст и первая страница)
+    texts = extract_text_from_pdf(source, timer, text_backend)
+    if page_artifacts is not None and texts.get('snapshot'):
+        page_artifacts.put(digest or source_digest(source), filename, texts['snapshot'])
+    response, cacheable = analyze_texts(texts, filename, timer)
+    record_rss('api_fast')
+    return response, cacheable, timer.as_dict()
+
+
+def analyze_texts(texts: dict, filename: str, timer: StageTimer = None) -> tuple:
+    """Метрики и статус по уже извлечённому тексту. Возвращает (ответ API, можно ли кэшировать ответ)"""
+    timer = timer or StageTimer()
+    text_full = texts.get('full', '')
+    first_page = texts.get('first', '')
+    timer.count('text_chars', len(text_full))
+
+    text_from_filename = False
+    if not text_full or len(text_full.strip()) < 50:
+        # Если текст не извлечен - используем имя файла
+        text_full = filename
+        text_from_filename = True
+
+    # Извлекаем информацию
+    with timer.stage('project_info'):
+        project_info = extract_project_info(text_full, first_page)
+    # Если имя ЖК не найдено явно на первой странице — используем код как имя и помечаем для ручного ввода
+    requires_name_entry = False
+    if not project_info.get('name_from_first_page', False):
+        # если на первой странице не было имени, подставим код как отображаемое имя
+        project_info['full_name'] = project_info.get('code') or project_info.get('full_name')
+        requires_name_entry = True
+
+    with timer.stage('metrics'):
+        metrics = extract_metrics(text_full)
+
+    # Определяем, хватает ли DDU-данных для b6
+    has3ddu = isinstance(metrics.get('DDU_payments_percent'), list) and len(metrics.get('DDU_payments_percent')) >= 3
+
+    with timer.stage('classify'):
+        status = calculate_project_status(metrics)
+        reasoning = generate_reasoning(metrics, status)
+    
+    # Генерируем ID проекта
+    project_id = generate_project_id(project_info['code'], project_info['customer'])
+    
+    response = {
+        'projectId': project_id,
+        'project_info': project_info,
+        'project_status': status,
+        'metrics': {
+            'SMR_completion': metrics['SMR_completion'],
+            'GPR_delay_percent': metrics['GPR_delay_percent'],
+            'GPR_delay_days': metrics['GPR_delay_days'],
+            'DDU_payments_percent': metrics['DDU_payments_percent'],
+            'guarantee_extension': metrics['guarantee_extension'],
+            'builder_delay_days': metrics.get('builder_delay_days', 0),
+            'builder_rating_drop': metrics.get('builder_rating_drop', 0),
+            'complaints_count': metrics.get('complaints_count', 0),
+            'debt_to_equity': metrics.get('debt_to_equity', 0)
+        },
+        'reasoning': reasoning,
+        'triggered_conditions': [],
+        'requires_name_entry': requires_name_entry,
+        'needs3Reports': not has3ddu and (metrics.get('SMR_completion', 0) < 80)
+    }
+    return response, not text_from_filename
+
+
+def with_project_history(response: dict) -> dict:
+    """Статус с учётом ДДУ прошлых месяцев проекта из хранилища
+
+    Если в отчёте меньше трёх значений ДДУ, его значение дополняется сохранёнными ДДУ двух
+    предыдущих месяцев проекта, и условие b6 проверяется без повторного разбора прошлых PDF.
+    Месяцы ищутся по периоду отчёта, поэтому повторная загрузка старого отчёта тоже учитывает историю.
+    Ответ из кэша тоже проходит через эту функцию: история могла пополниться.
+    """
+    metrics = response['metrics']
+    ddu_list = metrics.get('DDU_payments_percent')
+    if project_store is None or (isinstance(ddu_list, list) and len(ddu_list) >= WINDOW_MONTHS):
+        return response
+    project_id = response.get('projectId')
+    period_key = report_period_key(response['project_info'].get('report_period'))
+    if not project_id or period_key is None:
+        return response
+    
+    value = report_ddu_value(metrics)
+    if value is None:
+        return response
+    # Отчёт должен быть последним из трёх подряд идущих месяцев
+    first_key = period_key - WINDOW_MONTHS + 1
+    stored = project_store.ddu_values(project_id, first_key, period_key - 1)
+    if len(stored) < WINDOW_MONTHS - 1:
+        return response
+    last = sorted(stored.items()) + [(period_key, value)]
+    
+    combined = {**metrics, 'DDU_payments_percent': [value for _, value in last]}
+    status = calculate_project_status(combined)
+    return {
+        **response,
+        'project_status': status,
+        'reasoning': generate_reasoning(combined, status),
+        'needs3Reports': False,
+        'ddu_series': [{'period': period_label(key), 'value': value} for key, value in last],
+    }
+
+
 @app.route('/api/health', methods=['GET'])
 def health():
     return jsonify({'status': 'ok'}), 200
 
 
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Метрики всех воркеров в формате Prometheus"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/projects', methods=['GET'])
+def projects_by_status():
+    """Проекты с заданным статусом (?status=...) по последнему сохранённому периоду"""
+    if project_store is None:
+        return jsonify({'error': 'Project store is disabled'}), 404
+    status = request.args.get('status')
+    if not status:
+        return jsonify({'error': 'status is required'}), 400
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({'projects': project_store.projects_by_status(status, limit)}), 200
+
+
+@app.route('/api/projects/<project_id>/history', methods=['GET'])
+def project_history(project_id):
+    """Последние N (?limit=..., по умолчанию 3) сохранённых периодов проекта, от нового к старому"""
+    if project_store is None:
+        return jsonify({'error': 'Project store is disabled'}), 404
+    limit = request.args.get('limit', 3, type=int)
+    return jsonify({'projectId': project_id, 'periods': project_store.latest(project_id, limit)}), 200
+
+
 @app.route('/api/analyze-report', methods=['POST'])
 def analyze_report():
-    try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-        
-        file = request.files['file']
-        
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-        
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Only PDF files are allowed'}), 400
-        
-        # Сохраняем файл
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
+    with timed_request('api_fast') as outcome:
         try:
-            # Извлекаем текст из PDF (полный текст и первая страница)
-            texts = extract_text_from_pdf(filepath)
-            text_full = texts.get('full', '')
-            first_page = texts.get('first', '')
-
-            if not text_full or len(text_full.strip()) < 50:
-                # Если текст не извлечен - используем имя файла
-                text_full = filename
-
-            # Извлекаем информацию
-            project_info = extract_project_info(text_full, first_page)
-            # Если имя ЖК не найдено явно на первой странице — используем код как имя и помечаем для ручного ввода
-            requires_name_entry = False
-            if not project_info.get('name_from_first_page', False):
-                # если на первой странице не было имени, подставим код как отображаемое имя
-                project_info['full_name'] = project_info.get('code') or project_info.get('full_name')
-                requires_name_entry = True
-
-            metrics = extract_metrics(text_full)
-
-            # Определяем, хватает ли DDU-данных для b6
-            has3ddu = isinstance(metrics.get('DDU_payments_percent'), list) and len(metrics.get('DDU_payments_percent')) >= 3
-
-            status = calculate_project_status(metrics)
-            reasoning = generate_reasoning(metrics, status)
+            if 'file' not in request.files:
+                outcome['value'] = 'rejected'
+                return jsonify({'error': 'No file provided'}), 400
+            
+            file = request.files['file']
+            
+            if file.filename == '':
+                outcome['value'] = 'rejected'
+                return jsonify({'error': 'No file selected'}), 400
+            
+            if not allowed_file(file.filename):
+                outcome['value'] = 'rejected'
+                return jsonify({'error': 'Only PDF files are allowed'}), 400
             
-            # Генерируем ID проекта
-            project_id = generate_project_id(project_info['code'], project_info['customer'])
+            filename = secure_filename(file.filename)
+            try:
+                text_backend = requested_text_backend(request)
+            except ValueError as e:
+                outcome['value'] = 'rejected'
+                return jsonify({'error': str(e)}), 400
+            cache_version = backend_version(CACHE_VERSION, text_backend)
             
-            response = {
-                'projectId': project_id,
-                'project_info': project_info,
-                'project_status': status,
-                'metrics': {
-                    'SMR_completion': metrics['SMR_completion'],
-                    'GPR_delay_percent': metrics['GPR_delay_percent'],
-                    'GPR_delay_days': metrics['GPR_delay_days'],
-                    'DDU_payments_percent': metrics['DDU_payments_percent'],
-                    'guarantee_extension': metrics['guarantee_extension'],
-                    'builder_delay_days': metrics.get('builder_delay_days', 0),
-                    'builder_rating_drop': metrics.get('builder_rating_drop', 0),
-                    'complaints_count': metrics.get('complaints_count', 0),
-                    'debt_to_equity': metrics.get('debt_to_equity', 0)
-                },
-                'reasoning': reasoning,
-                'triggered_conditions': [],
-                'requires_name_entry': requires_name_entry,
-                'needs3Reports': not has3ddu and (metrics.get('SMR_completion', 0) < 80)
+            # Небольшие файлы остаются в памяти, крупные — в уникальном временном файле
+            with SpooledUpload.from_stream(file.stream, directory=app.config['UPLOAD_FOLDER']) as upload:
+                # Тот же файл уже анализировался (возможно, под другим именем)
+                include_timings = timings_requested(request)
+                if result_cache is not None:
+                    cached = result_cache.get(upload.digest, cache_version)
+                    record_cache('api_fast', cached is not None)
+                    if cached is not None:
+                        cached = with_project_history(cached)
+                        if project_store is not None:
+                            project_store.save(cached, 'api_fast', upload.digest, filename)
+                        log_timings('api_fast', filename, None, outcome='cache_hit', bytes=upload.size)
+                        if include_timings:
+                            cached['timings'] = {'cache_hit': True}
+                        outcome['value'] = 'cache_hit'
+                        return jsonify(cached), 200
+                
+                started = time.perf_counter()
+                with in_flight('api_fast'):
+                    response, cacheable, timings = analyze_document(upload.source(), filename, upload.digest,
+                                                                    text_backend)
+                record_analysis('api_fast', time.perf_counter() - started, timings.get('pages'))
+                
+                # Ответ, построенный по имени файла, не зависит только от содержимого
+                if result_cache is not None and cacheable:
+                    result_cache.put(upload.digest, cache_version, response)
+                if project_store is not None and cacheable:
+                    response = with_project_history(response)
+                    project_store.save(response, 'api_fast', upload.digest, filename)
+                
+                log_timings('api_fast', filename, timings, outcome='success', text_backend=text_backend)
+                if include_timings:
+                    response['timings'] = timings
+                outcome['value'] = 'success'
+                return jsonify(response), 200
+        
+        except Exception as e:
+            print(f"Error: {e}")
+            return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+
+def analyze_batch_item(upload: SpooledUpload, filename: str, text_backend: str) -> dict:
+    """Анализ одного файла пакета: кэш, затем процесс из пула
+
+    Таймаут или ошибка процесса возвращаются как {'filename', 'error'}, не прерывая пакет.
+    """
+    cache_version = backend_version(CACHE_VERSION, text_backend)
+    if result_cache is not None:
+        cached = result_cache.get(upload.digest, cache_version)
+        record_cache('api_fast', cached is not None)
+        if cached is not None:
+            cached = with_project_history(cached)
+            if project_store is not None:
+                project_store.save(cached, 'api_fast', upload.digest, filename)
+            log_timings('api_fast', filename, None, outcome='cache_hit', batch=True, bytes=upload.size)
+            return cached
+    
+    started = time.perf_counter()
+    try:
+        with in_flight('api_fast'):
+            response, cacheable, timings = pool_from_env().run(analyze_document, upload.source(), filename,
+                                                               upload.digest, text_backend)
+    except (JobTimeoutError, JobFailedError) as e:
+        outcome = 'timeout' if isinstance(e, JobTimeoutError) else 'error'
+        log_timings('api_fast', filename, None, outcome=outcome, batch=True,
+                    request_ms=round((time.perf_counter() - started) * 1000, 2))
+        return {'filename': filename, 'error': str(e)}
+    record_analysis('api_fast', time.perf_counter() - started, timings.get('pages'))
+    if result_cache is not None and cacheable:
+        result_cache.put(upload.digest, cache_version, response)
+    if project_store is not None and cacheable:
+        response = with_project_history(response)
+        project_store.save(response, 'api_fast', upload.digest, filename)
+    log_timings('api_fast', filename, timings, outcome='success', batch=True, text_backend=text_backend)
+    return response
+
+
+def merge_reports(reports: list) -> dict:
+    """Объединяет отчёты одного проекта за несколько месяцев в один ответ
+
+    Отчёты упорядочиваются по периоду; ДДУ каждого отчёта (текущее значение — первое найденное)
+    образует временной ряд. Для условия b6 берутся три последних последовательных месяца,
+    остальные метрики — из самого свежего отчёта. Файлы, которые не удалось проанализировать
+    (запись с 'error'), пропускаются с предупреждением.
+    """
+    failed = [report for report in reports if 'error' in report]
+    reports = sorted((report for report in reports if 'error' not in report),
+                     key=lambda r: (r['period_key'] is None, r['period_key'] or 0))
+    latest = reports[-1]['response']
+    warnings = [f"Не удалось проанализировать {report['filename']}: {report['error']}" for report in failed]
+    
+    # Временной ряд ДДУ: по одному значению на месяц, от старого к новому
+    series = []
+    for report in reports:
+        ddu_list = report['response']['metrics'].get('DDU_payments_percent') or []
+        if report['period_key'] is None:
+            warnings.append(f"Не удалось определить период отчёта {report['filename']}")
+            continue
+        if not ddu_list or ddu_list == [0]:
+            # [0] — значение extract_metrics по умолчанию: ДДУ в отчёте не найден
+            continue
+        if series and series[-1]['period_key'] == report['period_key']:
+            warnings.append(f"Несколько отчётов за период {report['period']}, используется {report['filename']}")
+            series.pop()
+        series.append({'period': report['period'], 'period_key': report['period_key'], 'value': ddu_list[0]})
+    
+    last3 = series[-3:]
+    consecutive = len(last3) == 3 and all(
+        last3[i + 1]['period_key'] - last3[i]['period_key'] == 1 for i in range(2)
+    )
+    if len(last3) == 3 and not consecutive:
+        warnings.append('Последние три отчёта с ДДУ не идут подряд по месяцам')
+    
+    project_ids = {r['response'].get('projectId') for r in reports}
+    if len(project_ids) > 1:
+        warnings.append('Отчёты относятся к разным проектам (разные projectId)')
+    
+    metrics = dict(latest['metrics'])
+    if consecutive:
+        metrics['DDU_payments_percent'] = [point['value'] for point in last3]
+    
+    status = calculate_project_status(metrics)
+    reasoning = generate_reasoning(metrics, status)
+    
+    return {
+        'projectId': latest['projectId'],
+        'project_info': latest['project_info'],
+        'project_status': status,
+        'metrics': metrics,
+        'reasoning': reasoning,
+        'triggered_conditions': [],
+        'requires_name_entry': latest.get('requires_name_entry', False),
+        'needs3Reports': not consecutive and (metrics.get('SMR_completion', 0) < 80),
+        'ddu_series': [{'period': p['period'], 'value': p['value']} for p in series],
+        'reports': [
+            {
+                'filename': r['filename'],
+                'report_period': r['period'],
+                'projectId': r['response'].get('projectId'),
+                'project_status': r['response'].get('project_status'),
+                'DDU_payments_percent': r['response']['metrics'].get('DDU_payments_percent'),
             }
+            for r in reports
+        ] + [{'filename': r['filename'], 'error': r['error']} for r in failed],
+        'warnings': warnings,
+    }
+
+
+@app.route('/api/analyze-batch', methods=['POST'])
+def analyze_batch():
+    """Несколько месячных отчётов одного проекта: параллельный анализ и общий статус"""
+    with timed_request('api_fast') as outcome:
+        try:
+            files = request.files.getlist('files') or request.files.getlist('file')
+            if not files:
+                outcome['value'] = 'rejected'
+                return jsonify({'error': 'No files provided'}), 400
+            if len(files) > MAX_BATCH_FILES:
+                outcome['value'] = 'rejected'
+                return jsonify({'error': f'Too many files (max {MAX_BATCH_FILES})'}), 400
+            try:
+                text_backend = requested_text_backend(request)
+            except ValueError as e:
+                outcome['value'] = 'rejected'
+                return jsonify({'error': str(e)}), 400
             
-            return jsonify(response), 200
+            timer = StageTimer()
+            uploads = []
+            try:
+                for file in files:
+                    if file.filename == '' or not allowed_file(file.filename):
+                        outcome['value'] = 'rejected'
+                        return jsonify({'error': f'Only PDF files are allowed: {file.filename}'}), 400
+                    upload = SpooledUpload.from_stream(file.stream, directory=app.config['UPLOAD_FOLDER'])
+                    uploads.append((secure_filename(file.filename), upload))
+                
+                # Потоки только ждут процессы пула, поэтому общее время близко к самому долгому файлу
+                with timer.stage('analyze'):
+                    with ThreadPoolExecutor(max_workers=len(uploads)) as executor:
+                        responses = list(executor.map(lambda item: analyze_batch_item(item[1], item[0], text_backend),
+                                                      uploads))
+                timer.count('files', len(uploads))
+                timer.count('bytes', sum(upload.size for _, upload in uploads))
+            finally:
+                for _, upload in uploads:
+                    upload.close()
+            
+            reports = []
+            for (filename, _), response in zip(uploads, responses):
+                if 'error' in response:
+                    reports.append(response)
+                    continue
+                period = response['project_info'].get('report_period', 'Unknown')
+                reports.append({
+                    'filename': filename,
+                    'period': period,
+                    'period_key': report_period_key(period),
+                    'response': response,
+                })
             
-        finally:
-            # Удаляем временный файл
-            if os.path.exists(filepath):
-                try:
-                    os.remove(filepath)
-                except:
-                    pass
-    
-    except Exception as e:
-        print(f"Error: {e}")
-        return jsonify({'error': f'Server error: {str(e)}'}), 500
+            filenames = ', '.join(filename for filename, _ in uploads)
+            if all('error' in report for report in reports):
+                log_timings('api_fast', filenames, timer.as_dict(), outcome='error', batch=True)
+                return jsonify({'error': 'No file could be analyzed', 'files': reports}), 500
+            with timer.stage('merge'):
+                response = merge_reports(reports)
+            timings = timer.as_dict()
+            log_timings('api_fast', filenames, timings, outcome='success', batch=True, text_backend=text_backend)
+            if timings_requested(request):
+                response['timings'] = timings
+            outcome['value'] = 'success'
+            return jsonify(response), 200
+        
+        except Exception as e:
+            print(f"Error: {e}")
+            return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 
 if __name__ == '__main__':
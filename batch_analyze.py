@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ПАКЕТНЫЙ АНАЛИЗ АРХИВА ОТЧЁТОВ
+Папка или ZIP с PDF → JSONL (одна запись на отчёт) через пул процессов, с продолжением после прерывания
+
+Выходной JSONL одновременно служит контрольной точкой: при повторном запуске уже
+записанные файлы пропускаются. Побайтно одинаковые файлы анализируются один раз.
+
+Примеры:
+    python batch_analyze.py archive/ --output history.jsonl --workers 4
+    python batch_analyze.py reports_2024.zip --output history.jsonl --timeout 120
+    python batch_analyze.py archive/ --output history.jsonl --retry-failed   # повторить ошибки и таймауты
+    python batch_analyze.py archive/ --output history.jsonl --text-backend fast   # быстрый текст pdfium
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import zipfile
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+from text_backends import TEXT_BACKENDS, text_backend_name
+
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+STATUS_TIMEOUT = 'timeout'
+STATUS_DUPLICATE = 'duplicate'
+
+
+class ReportItem(NamedTuple):
+    """Отчёт для анализа: путь к файлу или участник ZIP-архива"""
+    key: str        # уникальный ключ записи: путь или «архив.zip!участник»
+    filename: str
+    path: Optional[str] = None
+    archive: Optional[str] = None
+    member: Optional[str] = None
+
+    def read(self) -> bytes:
+        if self.archive is not None:
+            with zipfile.ZipFile(self.archive) as zf:
+                return zf.read(self.member)
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+
+def iter_reports(source: str) -> Iterator[ReportItem]:
+    """PDF из папки (рекурсивно, по алфавиту) или из ZIP-архива"""
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            names = sorted(name for name in zf.namelist() if name.lower().endswith('.pdf'))
+        for name in names:
+            yield ReportItem(f'{source}!{name}', os.path.basename(name), archive=source, member=name)
+    elif os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith('.pdf'):
+                    path = os.path.join(root, name)
+                    yield ReportItem(path, name, path=path)
+    elif source.lower().endswith('.pdf') and os.path.isfile(source):
+        yield ReportItem(source, os.path.basename(source), path=source)
+    else:
+        raise ValueError(f'not a directory, ZIP archive or PDF: {source}')
+
+
+def load_checkpoint(output: str, retry_failed: bool) -> Tuple[Set[str], Dict[str, str]]:
+    """Ключи уже записанных отчётов и хеши проанализированных файлов из существующего JSONL
+
+    Недописанная последняя строка (процесс прервали во время записи) обрезается.
+    С retry_failed ошибки и таймауты не считаются выполненными.
+    """
+    done: Set[str] = set()
+    digests: Dict[str, str] = {}
+    if not os.path.exists(output):
+        return done, digests
+    good_end = 0
+    with open(output, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            good_end += len(line)
+            if retry_failed and record.get('status') in (STATUS_ERROR, STATUS_TIMEOUT):
+                continue
+            done.add(record['key'])
+            if record.get('status') == STATUS_OK:
+                digests.setdefault(record['sha256'], record['key'])
+    if good_end < os.path.getsize(output):
+        with open(output, 'r+b') as f:
+            f.truncate(good_end)
+    return done, digests
+
+
+def analyze_report(data: bytes, filename: str, digest: str, text_backend: str = None) -> tuple:
+    """Анализ в процессе пула: тот же ответ и замеры, что у /api/analyze-report в api.py"""
+    from api import analyze_file
+    return analyze_file(data, filename, digest, text_backend)
+
+
+def run_batch(sources: List[str], output: str, workers: int, timeout: float,
+              max_jobs_per_worker: int, retry_failed: bool, store=None, text_backend: str = None) -> Dict[str, int]:
+    from analysis_pool import AnalysisPool, JobTimeoutError
+
+    items = [item for source in sources for item in iter_reports(source)]
+    done, digests = load_checkpoint(output, retry_failed)
+    pending = [item for item in items if item.key not in done]
+    print(f"Отчётов: {len(items)}, уже обработано: {len(items) - len(pending)}, осталось: {len(pending)}", flush=True)
+
+    counts = {STATUS_OK: 0, STATUS_ERROR: 0, STATUS_TIMEOUT: 0, STATUS_DUPLICATE: 0}
+    pool = AnalysisPool(size=workers, timeout=timeout, max_jobs_per_worker=max_jobs_per_worker)
+
+    def analyze(item: ReportItem, data: bytes, digest: str) -> Dict:
+        started = time.perf_counter()
+        record = {'status': STATUS_OK, 'result': None, 'timings': None, 'error': None}
+        try:
+            record['result'], record['timings'] = pool.run(analyze_report, data, item.filename, digest, text_backend)
+        except JobTimeoutError as e:
+            record.update(status=STATUS_TIMEOUT, error=str(e))
+        except Exception as e:
+            record.update(status=STATUS_ERROR, error=f'{type(e).__name__}: {e}')
+        record['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return record
+
+    processed = 0
+    with open(output, 'a', encoding='utf-8') as out, ThreadPoolExecutor(max_workers=workers) as executor:
+        def write(item: ReportItem, digest: str, size: int, record: Dict):
+            nonlocal processed
+            processed += 1
+            counts[record['status']] += 1
+            line = {'key': item.key, 'filename': item.filename, 'sha256': digest, 'bytes': size,
+                    'analyzed_at': datetime.now().isoformat(timespec='seconds'), **record}
+            # Запись сразу сбрасывается на диск: это и есть контрольная точка
+            out.write(json.dumps(line, ensure_ascii=False) + '\n')
+            out.flush()
+            if store is not None and record['status'] == STATUS_OK:
+                store.save(record['result'], 'api', digest, item.filename)
+            print(f"[{processed}/{len(pending)}] {record['status']:<9} {item.key}"
+                  + (f"  {record['elapsed_ms']:.0f} ms" if record.get('elapsed_ms') else '')
+                  + (f"  ({record['error']})" if record.get('error') else ''), flush=True)
+
+        running = {}
+        queue = iter(pending)
+        exhausted = False
+        while running or not exhausted:
+            # В работе не больше двух файлов на процесс: архив не читается в память целиком
+            while not exhausted and len(running) < workers * 2:
+                item = next(queue, None)
+                if item is None:
+                    exhausted = True
+                    break
+                try:
+                    data = item.read()
+                except (OSError, zipfile.BadZipFile, KeyError) as e:
+                    write(item, None, None, {'status': STATUS_ERROR, 'result': None, 'timings': None,
+                                             'error': f'{type(e).__name__}: {e}'})
+                    continue
+                digest = hashlib.sha256(data).hexdigest()
+                if digest in digests:
+                    write(item, digest, len(data), {'status': STATUS_DUPLICATE, 'duplicate_of': digests[digest],
+                                                    'result': None, 'timings': None, 'error': None})
+                    continue
+                digests[digest] = item.key
+                running[executor.submit(analyze, item, data, digest)] = (item, digest, len(data))
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                item, digest, size = running.pop(future)
+                record = future.result()
+                if record['status'] != STATUS_OK:
+                    # Дубликат неудачного файла при продолжении тоже повторится
+                    digests.pop(digest, None)
+                write(item, digest, size, record)
+    pool.shutdown()
+    return counts
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Пакетный анализ PDF отчётов в JSONL')
+    parser.add_argument('sources', nargs='+', help='папки, ZIP-архивы или PDF файлы')
+    parser.add_argument('--output', '-o', required=True, help='JSONL с результатами (дописывается, служит контрольной точкой)')
+    parser.add_argument('--workers', '-w', type=int, default=os.cpu_count() or 1, help='число процессов (по умолчанию число CPU)')
+    parser.add_argument('--timeout', type=float, default=120, help='таймаут анализа одного файла, с (по умолчанию 120)')
+    parser.add_argument('--max-jobs-per-worker', type=int, default=50, help='перезапуск процесса после стольких файлов')
+    parser.add_argument('--retry-failed', action='store_true', help='повторить файлы, завершившиеся ошибкой или таймаутом')
+    parser.add_argument('--no-store', action='store_true', help='не записывать результаты в хранилище проектов (ANALYSIS_STORE_PATH)')
+    parser.add_argument('--text-backend', choices=sorted(TEXT_BACKENDS),
+                        help='движок текста страниц: layout (pdfplumber) или fast (pdfium); по умолчанию ANALYSIS_TEXT_BACKEND или layout')
+    args = parser.parse_args(argv)
+
+    # Пакетный прогон не должен попадать в метрики работающих серверов
+    os.environ.setdefault('ANALYSIS_METRICS_PATH', '')
+
+    store = None
+    if not args.no_store:
+        from project_store import store_from_env
+        store = store_from_env()
+
+    started = time.perf_counter()
+    try:
+        counts = run_batch(args.sources, args.output, args.workers, args.timeout,
+                           args.max_jobs_per_worker, args.retry_failed, store, text_backend_name(args.text_backend))
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        return 2
+    except KeyboardInterrupt:
+        print("\nПрервано; повторный запуск продолжит с места остановки")
+        return 130
+    print(f"Готово за {time.perf_counter() - started:.1f} с: " + ', '.join(f'{k} {v}' for k, v in counts.items()))
+    return 1 if counts[STATUS_ERROR] or counts[STATUS_TIMEOUT] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+БЕНЧМАРК АНАЛИЗА ОТЧЁТОВ
+Перцентили времени и пиковая память этапов на образцах отчётов, сохранение в JSON и проверка бюджетов
+
+Примеры:
+    python benchmark.py                                   # все образцы, 3 повтора
+    python benchmark.py --repeat 5 --output bench.json
+    python benchmark.py --compare bench.json              # разница с прошлым запуском
+    python benchmark.py --budgets benchmark_budgets.json --margin 0.25   # код 1 при превышении
+    python benchmark.py --save-budgets benchmark_budgets.json            # записать бюджеты по этому запуску
+    python benchmark.py --text-backends --output backends.json           # движки текста: скорость и совпадение метрик
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import subprocess
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+SAMPLE_REPORTS = ['3.pdf', 'алия 1.pdf', 'алия 2.pdf', 'алия 3.pdf', 'тас 1.pdf', 'тас 2.pdf', 'тас 3.pdf']
+BUDGET_KEYS = ('p50_ms', 'p95_ms', 'peak_mb')
+MIN_PEAK_DELTA_MB = 1.0  # меньшие колебания памяти не считаются превышением
+# Поля project_info, от которых зависят projectId и период в хранилище проектов
+COMPARED_PROJECT_INFO = ('code', 'full_name', 'customer', 'report_period')
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль с линейной интерполяцией (q от 0 до 100)"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(samples: List[float]) -> Dict:
+    return {
+        'samples': len(samples),
+        'p50_ms': round(percentile(samples, 50), 2),
+        'p90_ms': round(percentile(samples, 90), 2),
+        'p95_ms': round(percentile(samples, 95), 2),
+        'max_ms': round(max(samples), 2) if samples else 0.0,
+        'mean_ms': round(sum(samples) / len(samples), 2) if samples else 0.0,
+    }
+
+
+def measure_peak(func: Callable[[], object]) -> float:
+    """Пиковый объём памяти Python-аллокаций за вызов, МБ (tracemalloc замедляет код, поэтому отдельный прогон)"""
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    if isinstance(result, dict) and 'peak_mb' in result:
+        return result['peak_mb']
+    return peak / (1024 * 1024)
+
+
+def stage_calls(path: str) -> Dict[str, Callable[[], object]]:
+    """Замеряемые этапы для одного файла: имя -> вызов без аргументов
+
+    Подготовка (извлечение текста для функций api_fast, разбор PDF для таблицы ДДУ)
+    выполняется заранее и в замер не входит.
+    """
+    from advanced_analyzer import AdvancedReportAnalyzer
+    import api_fast
+
+    texts = api_fast.extract_text_from_pdf(path)
+
+    def analyze():
+        with AdvancedReportAnalyzer(pdf_path=path) as analyzer:
+            return analyzer.analyze()
+
+    def ddu_table():
+        # Новый анализатор на каждый вызов: таблицы кэшируются в ParsedDocument
+        # Время и память считаются только для поиска таблицы, без разбора PDF
+        analyzer = AdvancedReportAnalyzer(pdf_path=path)
+        try:
+            baseline = 0
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            analyzer.extract_ddu_monthly_from_table()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            peak = tracemalloc.get_traced_memory()[1] - baseline if tracemalloc.is_tracing() else 0
+            return {'elapsed_ms': elapsed_ms, 'peak_mb': peak / (1024 * 1024)}
+        finally:
+            analyzer.close()
+
+    return {
+        'analyze': analyze,
+        'fast.extract_text_from_pdf': lambda: api_fast.extract_text_from_pdf(path),
+        'fast.extract_metrics': lambda: api_fast.extract_metrics(texts['full']),
+        'fast.extract_project_info': lambda: api_fast.extract_project_info(texts['full'], texts['first']),
+        'advanced.extract_ddu_monthly_from_table': ddu_table,
+    }
+
+
+def run_benchmark(files: List[str], repeat: int, warmup: int, memory: bool) -> Dict:
+    from pdf_document import ParsedDocument
+
+    samples: Dict[str, List[float]] = {}
+    per_file: Dict[str, Dict[str, List[float]]] = {}
+    file_peaks: Dict[str, Dict[str, float]] = {}
+    file_pages: Dict[str, int] = {}
+    peaks: Dict[str, float] = {}
+
+    for path in files:
+        name = os.path.basename(path)
+        with ParsedDocument(path) as document:
+            file_pages[name] = document.page_count
+        print(f"→ {name} ({file_pages[name]} стр.)", flush=True)
+        calls = stage_calls(path)
+        file_samples = per_file.setdefault(name, {})
+
+        for _ in range(warmup):
+            for call in calls.values():
+                call()
+
+        for _ in range(repeat):
+            for stage, call in calls.items():
+                started = time.perf_counter()
+                result = call()
+                elapsed = (time.perf_counter() - started) * 1000
+                if isinstance(result, dict) and 'elapsed_ms' in result:
+                    # Вызов сам замерил свою часть (поиск таблицы без разбора PDF)
+                    elapsed = result['elapsed_ms']
+                samples.setdefault(stage, []).append(elapsed)
+                file_samples.setdefault(stage, []).append(elapsed)
+                if stage == 'analyze':
+                    # Внутренние этапы анализатора из его StageTimer
+                    for sub, timing in result.get('timings', {}).get('stages', {}).items():
+                        samples.setdefault(f'analyze.{sub}', []).append(timing['wall_ms'])
+
+        if memory:
+            for stage, call in calls.items():
+                peak = measure_peak(call)
+                file_peaks.setdefault(name, {})[stage] = round(peak, 2)
+                peaks[stage] = max(peaks.get(stage, 0.0), peak)
+
+    stages = {}
+    for stage, values in samples.items():
+        stages[stage] = summarize(values)
+        if stage in peaks:
+            stages[stage]['peak_mb'] = round(peaks[stage], 2)
+
+    return {
+        'meta': run_metadata(files, repeat, warmup),
+        'stages': stages,
+        # По файлам видно, как время и память растут с числом страниц (см. synthetic_reports.py)
+        'files': {
+            name: {
+                'pages': file_pages[name],
+                'p50_ms': {stage: round(percentile(values, 50), 2) for stage, values in file_stages.items()},
+                'peak_mb': file_peaks.get(name, {}),
+            }
+            for name, file_stages in per_file.items()
+        },
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def compared_fields(result: Dict) -> Dict:
+    info = result['project_info']
+    return {'project_status': result['project_status'], **result['metrics'],
+            **{f'project_info.{key}': info.get(key) for key in COMPARED_PROJECT_INFO}}
+
+
+def backend_analyzers() -> Dict[str, Callable[[str, str], Dict]]:
+    """Анализаторы для сравнения движков текста: (путь, движок) -> статус, метрики и реквизиты проекта"""
+    from advanced_analyzer import AdvancedReportAnalyzer
+    import api_fast
+
+    def advanced(path: str, text_backend: str) -> Dict:
+        with AdvancedReportAnalyzer(pdf_path=path, text_backend=text_backend) as analyzer:
+            result = analyzer.analyze()
+        return compared_fields(result)
+
+    def fast(path: str, text_backend: str) -> Dict:
+        texts = api_fast.extract_text_from_pdf(path, text_backend=text_backend)
+        response, _ = api_fast.analyze_texts(texts, os.path.basename(path))
+        return compared_fields(response)
+
+    return {'advanced': advanced, 'fast': fast}
+
+
+def run_backend_comparison(files: List[str], repeat: int) -> Dict:
+    """Время анализа с каждым движком текста и совпадение статуса и метрик с layout"""
+    from text_backends import TEXT_BACKEND_LAYOUT, TEXT_BACKENDS
+
+    backends = [TEXT_BACKEND_LAYOUT] + sorted(name for name in TEXT_BACKENDS if name != TEXT_BACKEND_LAYOUT)
+    analyzers = {}
+    for analyzer_name, analyze in backend_analyzers().items():
+        samples: Dict[str, List[float]] = {}
+        outputs: Dict[str, Dict[str, Dict]] = {}
+        for path in files:
+            name = os.path.basename(path)
+            print(f"→ {analyzer_name}: {name}", flush=True)
+            for backend in backends:
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    outputs.setdefault(backend, {})[name] = analyze(path, backend)
+                    samples.setdefault(backend, []).append((time.perf_counter() - started) * 1000)
+
+        reference = outputs[TEXT_BACKEND_LAYOUT]
+        entry = {'layout': summarize(samples[TEXT_BACKEND_LAYOUT])}
+        for backend in backends[1:]:
+            mismatches = []
+            compared = 0
+            for name, expected in reference.items():
+                actual = outputs[backend][name]
+                for field in sorted(set(expected) | set(actual)):
+                    compared += 1
+                    if expected.get(field) != actual.get(field):
+                        mismatches.append({'file': name, 'field': field, TEXT_BACKEND_LAYOUT: expected.get(field),
+                                           backend: actual.get(field)})
+            stats = summarize(samples[backend])
+            entry[backend] = {
+                **stats,
+                'speedup': round(entry['layout']['p50_ms'] / stats['p50_ms'], 2) if stats['p50_ms'] else None,
+                'status_agreement': sum(reference[name]['project_status'] == outputs[backend][name]['project_status']
+                                        for name in reference) / len(reference),
+                'field_agreement': round(1 - len(mismatches) / compared, 4) if compared else 1.0,
+                'mismatches': mismatches,
+            }
+        analyzers[analyzer_name] = entry
+
+    return {'meta': run_metadata(files, repeat, 0), 'backends': backends, 'analyzers': analyzers}
+
+
+def print_backend_report(results: Dict):
+    header = f"{'анализатор':<12}{'движок':<10}{'p50':>10}{'p95':>10}{'ускорение':>12}{'статус':>10}{'поля':>10}"
+    print(header)
+    print('-' * len(header))
+    for analyzer_name, entry in results['analyzers'].items():
+        for backend in results['backends']:
+            stats = entry[backend]
+            line = f"{analyzer_name:<12}{backend:<10}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+            if 'speedup' in stats:
+                line += f"{stats['speedup']:>11.1f}×{stats['status_agreement']:>10.0%}{stats['field_agreement']:>10.1%}"
+            print(line)
+        for backend in results['backends'][1:]:
+            for mismatch in entry[backend]['mismatches']:
+                print(f"  ≠ {analyzer_name}/{backend} {mismatch['file']}: {mismatch['field']} = "
+                      f"{mismatch[backend]!r} (layout: {mismatch[results['backends'][0]]!r})")
+
+
+def run_metadata(files: List[str], repeat: int, warmup: int) -> Dict:
+    from advanced_analyzer import ANALYZER_VERSION, PATTERNS_VERSION
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'analyzer_version': ANALYZER_VERSION,
+        'patterns_version': PATTERNS_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'repeat': repeat,
+        'warmup': warmup,
+        'files': [os.path.basename(path) for path in files],
+        'env': {key: os.environ[key] for key in ('PDF_PARALLEL_WORKERS', 'PDF_PAGES_PER_WORKER', 'REGEX_CPU_BUDGET')
+                if key in os.environ},
+    }
+
+
+def print_report(results: Dict, previous: Optional[Dict] = None):
+    header = f"{'этап':<44}{'p50':>10}{'p90':>10}{'p95':>10}{'max':>10}{'peak MB':>10}"
+    if previous:
+        header += f"{'Δp50':>10}"
+    print(header)
+    print('-' * len(header))
+    for stage, stats in results['stages'].items():
+        peak = stats.get('peak_mb')
+        line = (f"{stage:<44}{stats['p50_ms']:>10.1f}{stats['p90_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+                f"{stats['max_ms']:>10.1f}{(f'{peak:.1f}' if peak is not None else '-'):>10}")
+        if previous:
+            old = previous.get('stages', {}).get(stage)
+            if old and old['p50_ms']:
+                line += f"{(stats['p50_ms'] / old['p50_ms'] - 1) * 100:>+9.1f}%"
+        print(line)
+    print(f"max RSS: {results['max_rss_mb']} MB")
+
+
+def check_budgets(results: Dict, budgets: Dict, margin: float, min_delta_ms: float = 5.0) -> List[str]:
+    """Этапы, превысившие бюджет больше чем на margin (0.25 = +25%)
+
+    Превышение меньше min_delta_ms (для памяти — MIN_PEAK_DELTA_MB) не учитывается:
+    у этапов короче миллисекунды относительный разброс между запусками слишком велик.
+    """
+    violations = []
+    for stage, limits in budgets.get('stages', {}).items():
+        stats = results['stages'].get(stage)
+        if stats is None:
+            continue
+        for key in BUDGET_KEYS:
+            if key not in limits or key not in stats:
+                continue
+            floor = MIN_PEAK_DELTA_MB if key == 'peak_mb' else min_delta_ms
+            if stats[key] > limits[key] * (1 + margin) and stats[key] - limits[key] > floor:
+                violations.append(f"{stage}: {key} = {stats[key]} > {limits[key]} × {1 + margin:.2f}")
+    return violations
+
+
+def budgets_from(results: Dict) -> Dict:
+    return {
+        'recorded': results['meta'],
+        'stages': {
+            stage: {key: stats[key] for key in BUDGET_KEYS if key in stats}
+            for stage, stats in results['stages'].items()
+        },
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Бенчмарк этапов анализа PDF отчётов')
+    parser.add_argument('files', nargs='*', help='PDF файлы (по умолчанию образцы из корня репозитория)')
+    parser.add_argument('--repeat', type=int, default=3, help='повторов каждого этапа на файл (по умолчанию 3)')
+    parser.add_argument('--warmup', type=int, default=0, help='прогревочных прогонов на файл, не входят в замеры')
+    parser.add_argument('--no-memory', action='store_true', help='не замерять пиковую память (без прогона с tracemalloc)')
+    parser.add_argument('--output', help='сохранить результаты в JSON')
+    parser.add_argument('--compare', help='JSON прошлого запуска для сравнения p50')
+    parser.add_argument('--budgets', help='JSON с бюджетами этапов; превышение даёт код возврата 1')
+    parser.add_argument('--margin', type=float, default=0.25, help='допустимое превышение бюджета (по умолчанию 0.25 = 25%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                        help='превышение бюджета меньше стольких мс не считается (по умолчанию 5)')
+    parser.add_argument('--save-budgets', help='записать бюджеты по результатам этого запуска')
+    parser.add_argument('--text-backends', action='store_true',
+                        help='сравнить движки текста (text_backends.py): время анализа и совпадение метрик с layout')
+    args = parser.parse_args(argv)
+
+    # Повторы должны каждый раз разбирать PDF, а не брать страницы из кэша
+    os.environ['ANALYSIS_PAGE_CACHE_PATH'] = ''
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    files = args.files or [os.path.join(root, name) for name in SAMPLE_REPORTS]
+    missing = [path for path in files if not os.path.exists(path)]
+    if missing:
+        print(f"Файлы не найдены: {', '.join(missing)}")
+        return 2
+
+    if args.text_backends:
+        results = run_backend_comparison(files, args.repeat)
+        print_backend_report(results)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            print(f"Результаты сохранены в {args.output}")
+        return 0
+
+    results = run_benchmark(files, args.repeat, args.warmup, not args.no_memory)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+    print_report(results, previous)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+
+    if args.save_budgets:
+        with open(args.save_budgets, 'w', encoding='utf-8') as f:
+            json.dump(budgets_from(results), f, ensure_ascii=False, indent=2)
+        print(f"Бюджеты записаны в {args.save_budgets}")
+
+    if args.budgets:
+        with open(args.budgets, encoding='utf-8') as f:
+            budgets = json.load(f)
+        recorded_files = budgets.get('recorded', {}).get('files')
+        if recorded_files and recorded_files != results['meta']['files']:
+            print(f"Внимание: бюджеты записаны на других файлах ({', '.join(recorded_files)})")
+        violations = check_budgets(results, budgets, args.margin, args.min_delta_ms)
+        if violations:
+            print("Превышены бюджеты:")
+            for violation in violations:
+                print(f"  ✗ {violation}")
+            return 1
+        print(f"Бюджеты соблюдены (допуск +{args.margin:.0%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ОЧЕРЕДЬ ЗАДАЧ АНАЛИЗА
+Асинхронный приём отчётов: задача ставится в ограниченную очередь в SQLite, там же хранятся статус и результат
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import tempfile
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_JOBS_PATH = os.path.join(tempfile.gettempdir(), 'khc_analysis_jobs.sqlite3')
+DEFAULT_RESULT_TTL = 3600  # секунд
+DEFAULT_POLL_INTERVAL = 1.0  # секунд между проверками общей очереди
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+class QueueFullError(Exception):
+    """Очередь задач заполнена"""
+    pass
+
+
+class JobStore:
+    """Задачи, их статусы и результаты в SQLite, общем для всех воркеров gunicorn
+
+    Запрос статуса может попасть в другой воркер, чем тот, что принял файл, а ждущую задачу
+    может взять любой воркер, поэтому состояние задачи не хранится в памяти процесса.
+    Выполняемая задача помечена pid воркера: если процесс завершился, задача считается упавшей.
+    Записи старше result_ttl секунд удаляются.
+    """
+
+    # Колонки, добавленные после первой версии таблицы (ALTER TABLE для существующих файлов)
+    COLUMNS = {'filepath': 'TEXT', 'digest': 'TEXT', 'options': 'TEXT', 'owner': 'INTEGER'}
+
+    def __init__(self, path: str = DEFAULT_JOBS_PATH, result_ttl: float = DEFAULT_RESULT_TTL):
+        self.path = path
+        self.result_ttl = result_ttl
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                '  id TEXT PRIMARY KEY,'
+                '  filename TEXT NOT NULL,'
+                '  status TEXT NOT NULL,'
+                '  result TEXT,'
+                '  created REAL NOT NULL,'
+                '  updated REAL NOT NULL)'
+            )
+            existing = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+            for column, column_type in self.COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {column_type}')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs(updated)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created)')
+        conn.close()
+
+    def _execute(self, sql: str, params=()):
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def create(self, job_id: str, filename: str, status: str = STATUS_QUEUED, result: Dict = None):
+        """Запись завершённой задачи (например, результат из кэша)"""
+        now = time.time()
+        self._execute('DELETE FROM jobs WHERE updated < ?', (now - self.result_ttl,))
+        self._execute(
+            'INSERT INTO jobs (id, filename, status, result, created, updated) VALUES (?, ?, ?, ?, ?, ?)',
+            (job_id, filename, status, self._dump(result), now, now)
+        )
+
+    def enqueue(self, job_id: str, filename: str, filepath: str, digest: str, options: Dict, maxsize: int):
+        """Ставит задачу в общую очередь; QueueFullError, если ждут уже maxsize задач"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE: подсчёт и вставка под одной блокировкой записи
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM jobs WHERE updated < ?', (now - self.result_ttl,))
+                queued = conn.execute('SELECT COUNT(*) FROM jobs WHERE status = ?', (STATUS_QUEUED,)).fetchone()[0]
+                if queued >= maxsize:
+                    raise QueueFullError(f"job queue is full ({maxsize})")
+                conn.execute(
+                    'INSERT INTO jobs (id, filename, status, created, updated, filepath, digest, options)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (job_id, filename, STATUS_QUEUED, now, now, filepath, digest, json.dumps(options))
+                )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+    def claim(self) -> Optional[Tuple]:
+        """Забирает самую старую ждущую задачу для этого процесса: (id, filepath, filename, digest, options) или None"""
+        self.reap()
+        rows = self._execute(
+            'UPDATE jobs SET status = ?, owner = ?, updated = ?'
+            ' WHERE id = (SELECT id FROM jobs WHERE status = ? AND updated >= ? ORDER BY created LIMIT 1)'
+            ' RETURNING id, filepath, filename, digest, options',
+            (STATUS_RUNNING, os.getpid(), time.time(), STATUS_QUEUED, time.time() - self.result_ttl)
+        )
+        if not rows:
+            return None
+        job_id, filepath, filename, digest, options = rows[0]
+        return job_id, filepath, filename, digest, json.loads(options or '{}')
+
+    def reap(self):
+        """Помечает упавшими выполняемые задачи завершившихся процессов"""
+        rows = self._execute('SELECT id, owner, filepath FROM jobs WHERE status = ?', (STATUS_RUNNING,))
+        for job_id, owner, filepath in rows:
+            if owner is None or _process_alive(owner):
+                continue
+            self._execute(
+                'UPDATE jobs SET status = ?, result = ?, updated = ? WHERE id = ? AND status = ? AND owner = ?',
+                (STATUS_FAILED, self._dump({'error': f'worker process {owner} exited during analysis'}),
+                 time.time(), job_id, STATUS_RUNNING, owner)
+            )
+            _remove(filepath)
+
+    def update(self, job_id: str, status: str, result: Dict = None):
+        self._execute(
+            'UPDATE jobs SET status = ?, result = ?, updated = ? WHERE id = ?',
+            (status, self._dump(result), time.time(), job_id)
+        )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Запись задачи или None, если задача неизвестна или её срок хранения истёк"""
+        self.reap()
+        rows = self._execute(
+            'SELECT id, filename, status, result, created, updated FROM jobs WHERE id = ? AND updated >= ?',
+            (job_id, time.time() - self.result_ttl)
+        )
+        if not rows:
+            return None
+        job_id, filename, status, result, created, updated = rows[0]
+        return {
+            'jobId': job_id,
+            'filename': filename,
+            'status': status,
+            'result': json.loads(result) if result else None,
+            'created': created,
+            'updated': updated,
+        }
+
+    def depth(self) -> int:
+        """Число незавершённых задач во всех воркерах"""
+        rows = self._execute(
+            'SELECT COUNT(*) FROM jobs WHERE status IN (?, ?) AND updated >= ?',
+            (STATUS_QUEUED, STATUS_RUNNING, time.time() - self.result_ttl)
+        )
+        return rows[0][0]
+
+    def count(self, status: str) -> int:
+        """Число задач с данным статусом во всех воркерах"""
+        rows = self._execute(
+            'SELECT COUNT(*) FROM jobs WHERE status = ? AND updated >= ?',
+            (status, time.time() - self.result_ttl)
+        )
+        return rows[0][0]
+
+    @staticmethod
+    def _dump(result: Optional[Dict]) -> Optional[str]:
+        return json.dumps(result, ensure_ascii=False) if result is not None else None
+
+
+def _process_alive(pid: int) -> bool:
+    """Жив ли процесс с данным pid на этой машине"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _remove(filepath: Optional[str]):
+    if filepath and os.path.exists(filepath):
+        try:
+            os.remove(filepath)
+        except OSError:
+            pass
+
+
+class JobQueue:
+    """Потоки процесса, забирающие задачи из общей очереди в JobStore и передающие их обработчику
+
+    handler(filepath, filename, digest, **options) возвращает готовый ответ API; временный файл
+    удаляется после обработки. Ждущие задачи лежат в SQLite, поэтому задачи перезапущенного
+    воркера выполнит любой другой. Если ждут уже maxsize задач, submit() бросает QueueFullError.
+    """
+
+    def __init__(self, store: JobStore, handler: Callable[[str, str, str], Dict],
+                 maxsize: int = 100, workers: int = 2, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.store = store
+        self.handler = handler
+        self.maxsize = maxsize
+        self.poll_interval = poll_interval
+        self.pid = os.getpid()
+        # Будит потоки сразу после submit() в этом процессе; задачи других воркеров находятся опросом
+        self._wakeup = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._loop, name=f'analysis-job-{i}', daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def submit(self, job_id: str, filepath: str, filename: str, digest: str, **options):
+        """Создаёт задачу в хранилище и ставит её в общую очередь
+
+        options передаются обработчику как именованные аргументы (например, text_backend).
+        """
+        self.store.enqueue(job_id, filename, filepath, digest, options, self.maxsize)
+        self._wakeup.set()
+
+    def _loop(self):
+        while True:
+            try:
+                job = self.store.claim()
+            except sqlite3.Error as e:
+                print(f"Не удалось взять задачу из очереди: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            job_id, filepath, filename, digest, options = job
+            try:
+                result = self.handler(filepath, filename, digest, **options)
+                self.store.update(job_id, STATUS_DONE, result)
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                try:
+                    self.store.update(job_id, STATUS_FAILED, {'error': str(e)})
+                except sqlite3.Error:
+                    pass
+            finally:
+                _remove(filepath)
+
+
+_jobs: Optional[JobQueue] = None
+_store: Optional[JobStore] = None
+_jobs_lock = threading.Lock()
+
+
+def job_store_from_env() -> JobStore:
+    """Хранилище задач по переменным окружения, без очереди и её потоков (создаётся при первом вызове)"""
+    global _store
+    with _jobs_lock:
+        if _store is None:
+            _store = JobStore(
+                os.environ.get('ANALYSIS_JOBS_PATH', DEFAULT_JOBS_PATH),
+                result_ttl=float(os.environ.get('ANALYSIS_JOB_TTL', DEFAULT_RESULT_TTL)),
+            )
+        return _store
+
+
+def jobs_from_env(handler: Callable[[str, str, str], Dict]) -> JobQueue:
+    """Очередь текущего процесса, настроенная переменными окружения (создаётся после fork)"""
+    global _jobs
+    store = job_store_from_env()
+    with _jobs_lock:
+        if _jobs is None or _jobs.pid != os.getpid():
+            _jobs = JobQueue(
+                store,
+                handler,
+                maxsize=int(os.environ.get('ANALYSIS_QUEUE_SIZE', 100)),
+                # Потоки только ждут пул процессов, поэтому по умолчанию их столько же, сколько анализаторов
+                workers=int(os.environ.get('ANALYSIS_POOL_SIZE', 0)) or os.cpu_count() or 1,
+            )
+        return _jobs
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+НАГРУЗОЧНЫЙ ТЕСТ API АНАЛИЗА
+Отправка образцов PDF в /api/analyze-report с заданной параллельностью или частотой и кривая насыщения
+
+Примеры:
+    python loadtest.py --url http://127.0.0.1:5003 --concurrency 1,2,4,8 --duration 60
+    python loadtest.py --url http://127.0.0.1:5002 --rate 0.5,1,2 --duration 60 --unique
+    python loadtest.py --start "gunicorn -w 4 --threads 2 -b 127.0.0.1:5003 api_fast:app" \\
+        --url http://127.0.0.1:5003 --concurrency 1,4,8,16 --output gunicorn-w4t2.json
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shlex
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from benchmark import SAMPLE_REPORTS, percentile
+
+ENDPOINT = '/api/analyze-report'
+SATURATION_GAIN = 0.05  # прирост пропускной способности меньше 5% — сервер насыщен
+SATURATION_LATENCY = 2.0  # или p95 вырос вдвое относительно первого уровня
+
+
+def encode_multipart(filename: str, data: bytes) -> Tuple[bytes, str]:
+    """Тело multipart/form-data с одним полем file"""
+    boundary = uuid.uuid4().hex
+    head = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        'Content-Type: application/pdf\r\n\r\n'
+    ).encode('utf-8')
+    tail = f'\r\n--{boundary}--\r\n'.encode('ascii')
+    return head + data + tail, f'multipart/form-data; boundary={boundary}'
+
+
+def post_file(url: str, filename: str, data: bytes, timeout: float) -> Dict:
+    """Один запрос: статус, признак fallback-ответа и ошибка (если была)"""
+    body, content_type = encode_multipart(filename, data)
+    request = urllib.request.Request(url, data=body, method='POST', headers={'Content-Type': content_type})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            payload = json.loads(response.read().decode('utf-8'))
+            fallback = 'fallback_mode' in payload.get('triggered_conditions', [])
+            return {'status': response.status, 'fallback': fallback, 'error': None}
+    except urllib.error.HTTPError as e:
+        return {'status': e.code, 'fallback': False, 'error': f'HTTP {e.code}'}
+    except Exception as e:
+        return {'status': None, 'fallback': False, 'error': type(e).__name__}
+
+
+class Payloads:
+    """PDF файлы по кругу; с unique=True к каждому добавляется уникальный комментарий,
+    чтобы запросы не попадали в кэш результатов по хешу содержимого"""
+
+    def __init__(self, files: List[str], unique: bool):
+        self.items = []
+        for path in files:
+            with open(path, 'rb') as f:
+                self.items.append((os.path.basename(path), f.read()))
+        self.unique = unique
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def next(self) -> Tuple[str, bytes]:
+        with self._lock:
+            filename, data = self.items[self._next % len(self.items)]
+            self._next += 1
+        if self.unique:
+            # Комментарий после %%EOF не меняет содержимое документа
+            data = data + f'\n%loadtest {uuid.uuid4().hex}\n'.encode('ascii')
+        return filename, data
+
+
+def run_closed(url: str, payloads: Payloads, concurrency: int, duration: float,
+               max_requests: Optional[int], timeout: float) -> List[Dict]:
+    """Замкнутая нагрузка: concurrency клиентов, каждый отправляет следующий файл сразу после ответа"""
+    results: List[Dict] = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            with lock:
+                if max_requests is not None and len(results) >= max_requests:
+                    return
+            filename, data = payloads.next()
+            started = time.perf_counter()
+            outcome = post_file(url, filename, data, timeout)
+            outcome['latency'] = time.perf_counter() - started
+            outcome['finished'] = time.perf_counter()
+            with lock:
+                results.append(outcome)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def run_open(url: str, payloads: Payloads, rate: float, duration: float, max_inflight: int,
+             timeout: float, poisson: bool) -> List[Dict]:
+    """Открытая нагрузка: запросы приходят с частотой rate в секунду независимо от ответов
+
+    Задержка считается от запланированного момента отправки, поэтому ожидание
+    свободного клиента (сервер не успевает) входит в неё.
+    """
+    results: List[Dict] = []
+    lock = threading.Lock()
+
+    def fire(scheduled: float):
+        filename, data = payloads.next()
+        outcome = post_file(url, filename, data, timeout)
+        outcome['latency'] = time.perf_counter() - scheduled
+        outcome['finished'] = time.perf_counter()
+        with lock:
+            results.append(outcome)
+
+    with ThreadPoolExecutor(max_workers=max_inflight) as executor:
+        started = time.perf_counter()
+        scheduled = started
+        while scheduled < started + duration:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(fire, scheduled)
+            scheduled += random.expovariate(rate) if poisson else 1.0 / rate
+    return results
+
+
+def summarize_level(results: List[Dict], elapsed: float) -> Dict:
+    latencies = [r['latency'] * 1000 for r in results if r['error'] is None]
+    total = len(results)
+    errors = sum(1 for r in results if r['error'] is not None)
+    fallbacks = sum(1 for r in results if r['fallback'])
+    return {
+        'requests': total,
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round((total - errors) / elapsed, 3) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p95_ms': round(percentile(latencies, 95), 1),
+        'p99_ms': round(percentile(latencies, 99), 1),
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'fallback_rate': round(fallbacks / total, 4) if total else 0.0,
+        'errors': sorted({r['error'] for r in results if r['error']}),
+    }
+
+
+def mark_saturation(levels: List[Dict]) -> Optional[float]:
+    """Первый уровень нагрузки, после которого рост пропускной способности прекращается или задержка резко растёт"""
+    if not levels:
+        return None
+    base_p95 = levels[0]['p95_ms'] or None
+    for previous, current in zip(levels, levels[1:]):
+        no_gain = current['throughput_rps'] < previous['throughput_rps'] * (1 + SATURATION_GAIN)
+        slow = base_p95 is not None and current['p95_ms'] > base_p95 * SATURATION_LATENCY
+        if no_gain or slow or current['error_rate'] > 0:
+            return previous['level']
+    return None
+
+
+def wait_healthy(base_url: str, timeout: float) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + '/api/health', timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except Exception:
+            time.sleep(0.5)
+    return False
+
+
+def print_curve(mode: str, levels: List[Dict], saturation: Optional[float]):
+    unit = 'клиентов' if mode == 'concurrency' else 'запр/с'
+    header = f"{unit:>10}{'запросов':>10}{'RPS':>9}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'ошибки':>9}{'fallback':>10}"
+    print(header)
+    print('-' * len(header))
+    for level in levels:
+        marker = '  ← насыщение' if saturation is not None and level['level'] == saturation else ''
+        print(f"{level['level']:>10g}{level['requests']:>10}{level['throughput_rps']:>9.2f}{level['p50_ms']:>10.0f}"
+              f"{level['p95_ms']:>10.0f}{level['p99_ms']:>10.0f}{level['error_rate']:>9.1%}{level['fallback_rate']:>10.1%}"
+              f"{marker}")
+
+
+def parse_levels(value: str) -> List[float]:
+    return [float(part) for part in value.split(',') if part.strip()]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Нагрузочный тест /api/analyze-report')
+    parser.add_argument('files', nargs='*', help='PDF файлы (по умолчанию образцы из корня репозитория)')
+    parser.add_argument('--url', default='http://127.0.0.1:5003', help='адрес сервера (api.py — 5002, api_fast.py — 5003)')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--concurrency', type=parse_levels, help='уровни одновременных клиентов, например 1,2,4,8')
+    mode.add_argument('--rate', type=parse_levels, help='уровни частоты запросов в секунду, например 0.5,1,2')
+    parser.add_argument('--duration', type=float, default=30, help='секунд на каждый уровень (по умолчанию 30)')
+    parser.add_argument('--requests', type=int, help='не больше стольких запросов на уровень (только --concurrency)')
+    parser.add_argument('--arrival', choices=('poisson', 'uniform'), default='poisson', help='распределение прихода для --rate')
+    parser.add_argument('--max-inflight', type=int, default=64, help='максимум одновременных запросов для --rate')
+    parser.add_argument('--timeout', type=float, default=300, help='таймаут одного запроса, с')
+    parser.add_argument('--unique', action='store_true', help='делать каждую загрузку уникальной (обход кэша результатов)')
+    parser.add_argument('--start', help='команда запуска сервера; сервер останавливается после теста')
+    parser.add_argument('--output', help='сохранить кривую насыщения в JSON')
+    args = parser.parse_args(argv)
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    files = args.files or [os.path.join(root, name) for name in SAMPLE_REPORTS]
+    payloads = Payloads(files, args.unique)
+    url = args.url.rstrip('/') + ENDPOINT
+    mode_name = 'rate' if args.rate else 'concurrency'
+    values = args.rate or args.concurrency or [1, 2, 4, 8]
+
+    server = None
+    if args.start:
+        server = subprocess.Popen(shlex.split(args.start), cwd=root)
+    try:
+        if not wait_healthy(args.url.rstrip('/'), 60):
+            print(f"Сервер {args.url} не отвечает на /api/health")
+            return 2
+
+        levels = []
+        for value in values:
+            print(f"→ {mode_name} = {value:g}", flush=True)
+            started = time.perf_counter()
+            if args.rate:
+                results = run_open(url, payloads, value, args.duration, args.max_inflight, args.timeout,
+                                   args.arrival == 'poisson')
+            else:
+                results = run_closed(url, payloads, int(value), args.duration, args.requests, args.timeout)
+            elapsed = max((r['finished'] for r in results), default=time.perf_counter()) - started
+            levels.append({'level': value, **summarize_level(results, elapsed)})
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    saturation = mark_saturation(levels)
+    print_curve(mode_name, levels, saturation)
+
+    if args.output:
+        report = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'url': args.url,
+                'server_command': args.start,
+                'mode': mode_name,
+                'arrival': args.arrival if args.rate else None,
+                'duration_s': args.duration,
+                'unique_uploads': args.unique,
+                'files': [name for name, _ in payloads.items],
+            },
+            'levels': levels,
+            'saturation_level': saturation,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Кривая сохранена в {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
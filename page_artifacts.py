@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ПОСТРАНИЧНЫЕ ДАННЫЕ ОТЧЁТОВ
+Текст страниц (и использованные слова и таблицы) по хешу содержимого PDF для повторного анализа без разбора PDF
+
+Разбор pdfplumber — почти всё время анализа. Снимок ParsedDocument сохраняется при каждом
+анализе, и после изменения паттернов reanalyze.py пересчитывает метрики по снимкам за секунды.
+"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import tempfile
+from typing import Dict, Iterator, Optional, Tuple
+from pdf_document import ARTIFACT_VERSION
+from result_cache import content_hash
+
+DEFAULT_ARTIFACTS_PATH = os.path.join(tempfile.gettempdir(), 'khc_page_artifacts.sqlite3')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB сжатых снимков
+
+
+def source_digest(source) -> str:
+    """SHA-256 содержимого PDF (bytes или путь) — тот же ключ, что у кэша результатов"""
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return content_hash(f.read())
+    return content_hash(bytes(source))
+
+
+def merge_snapshots(old: Dict, new: Dict) -> Dict:
+    """Объединяет снимки одного PDF: разные анализаторы извлекают разные страницы и виды данных"""
+    merged = {'version': new['version'], 'page_count': new['page_count']}
+    for kind in ('text', 'words', 'tables'):
+        merged[kind] = {**old.get(kind, {}), **new.get(kind, {})}
+    below = {(page_num, top): tables for page_num, top, tables in old.get('tables_below', [])}
+    for page_num, top, tables in new.get('tables_below', []):
+        # Таблицы под заголовком извлекаются по одной: оставляем более полный список
+        if len(tables) >= len(below.get((page_num, top), [])):
+            below[(page_num, top)] = tables
+    merged['tables_below'] = [[page_num, top, tables] for (page_num, top), tables in below.items()]
+    return merged
+
+
+class ArtifactStore:
+    """Снимки постраничных данных в SQLite, ключ — хеш содержимого PDF и ARTIFACT_VERSION
+
+    Снимки сжимаются zlib; при смене версии извлечения старые записи не читаются.
+    Размер ограничен max_bytes: вытесняются снимки, которые дольше всего не обновлялись.
+    """
+
+    def __init__(self, path: str = DEFAULT_ARTIFACTS_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS artifacts ('
+                '  digest TEXT NOT NULL,'
+                '  version TEXT NOT NULL,'
+                '  filename TEXT,'
+                '  data BLOB NOT NULL,'
+                '  size INTEGER NOT NULL,'
+                '  created REAL NOT NULL,'
+                '  PRIMARY KEY (digest, version))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_artifacts_created ON artifacts(created)')
+        conn.close()
+
+    def get(self, digest: str) -> Optional[Dict]:
+        """Снимок текущей версии или None"""
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute('SELECT data FROM artifacts WHERE digest = ? AND version = ?',
+                                   (digest, ARTIFACT_VERSION)).fetchone()
+            finally:
+                conn.close()
+            return json.loads(zlib.decompress(row[0])) if row else None
+        except (sqlite3.Error, zlib.error, ValueError) as e:
+            print(f"Ошибка чтения постраничных данных: {e}")
+            return None
+
+    def put(self, digest: str, filename: str, snapshot: Dict):
+        """Сохраняет снимок, дополняя уже сохранённый для того же PDF, и вытесняет давно не обновлявшиеся"""
+        if snapshot.get('version') != ARTIFACT_VERSION:
+            return
+        try:
+            conn = self._connect()
+            try:
+                # BEGIN IMMEDIATE: чтение, объединение и запись под одной блокировкой записи,
+                # иначе параллельные анализы одного PDF затирают страницы друг друга
+                conn.isolation_level = None
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    row = conn.execute('SELECT data FROM artifacts WHERE digest = ? AND version = ?',
+                                       (digest, ARTIFACT_VERSION)).fetchone()
+                    if row is not None:
+                        snapshot = merge_snapshots(json.loads(zlib.decompress(row[0])), snapshot)
+                    data = zlib.compress(json.dumps(snapshot, ensure_ascii=False).encode('utf-8'))
+                    conn.execute(
+                        'INSERT OR REPLACE INTO artifacts (digest, version, filename, data, size, created)'
+                        ' VALUES (?, ?, ?, ?, ?, ?)',
+                        (digest, ARTIFACT_VERSION, filename, data, len(data), time.time())
+                    )
+                    # LRU: удаляем самые старые записи, выходящие за лимит размера
+                    conn.execute(
+                        'DELETE FROM artifacts WHERE rowid IN ('
+                        '  SELECT rowid FROM ('
+                        '    SELECT rowid, SUM(size) OVER (ORDER BY created DESC) AS running'
+                        '    FROM artifacts'
+                        '  ) WHERE running > ?)',
+                        (self.max_bytes,)
+                    )
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+            finally:
+                conn.close()
+        except (sqlite3.Error, zlib.error, TypeError, ValueError) as e:
+            print(f"Ошибка записи постраничных данных: {e}")
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """(хеш, имя файла) всех снимков текущей версии"""
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT digest, filename FROM artifacts WHERE version = ? ORDER BY created',
+                                (ARTIFACT_VERSION,)).fetchall()
+        finally:
+            conn.close()
+        yield from rows
+
+
+def artifacts_from_env() -> Optional[ArtifactStore]:
+    """Создаёт хранилище по переменным окружения (ANALYSIS_ARTIFACTS_PATH='' отключает его)"""
+    path = os.environ.get('ANALYSIS_ARTIFACTS_PATH', DEFAULT_ARTIFACTS_PATH)
+    if not path:
+        return None
+    max_mb = int(os.environ.get('ANALYSIS_ARTIFACTS_MAX_MB', DEFAULT_MAX_BYTES // (1024 * 1024)))
+    try:
+        return ArtifactStore(path, max_bytes=max_mb * 1024 * 1024)
+    except sqlite3.Error as e:
+        print(f"Постраничные данные не сохраняются: {e}")
+        return None
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+КЭШ СТРАНИЦ PDF
+Текст, слова и таблицы страницы по хешу её потока содержимого и ресурсов, общий для всех документов
+
+Одинаковые страницы разных файлов (повторная загрузка с изменёнными метаданными, страницы,
+вставленные из другого отчёта) разбираются один раз. Отпечаток страницы считается по сырым
+(не распакованным) потокам без анализа раскладки.
+"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import tempfile
+from typing import Dict, Iterable, Optional
+from pdfminer.pdftypes import PDFObjRef, PDFStream
+from pdfminer.psparser import PSLiteral
+
+DEFAULT_PAGE_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'khc_page_cache.sqlite3')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+
+
+def _feed(digest, obj, seen: Dict[int, int]):
+    """Добавляет в хеш объект PDF со всеми вложенными объектами (ссылки разворачиваются один раз)
+
+    seen — номер объекта → порядковый номер первого обхода.
+    """
+    if isinstance(obj, PDFObjRef):
+        if obj.objid in seen:
+            # Номера объектов в разных файлах разные — хешируется порядковый номер первого обхода,
+            # чтобы ссылки на разные общие объекты давали разные отпечатки
+            digest.update(b'R%d' % seen[obj.objid])
+            return
+        seen[obj.objid] = len(seen)
+        obj = obj.resolve()
+    if isinstance(obj, PDFStream):
+        digest.update(b'S')
+        _feed(digest, obj.attrs, seen)
+        # Пиксели изображений не влияют на текст и таблицы: хватает размеров и формата
+        if getattr(obj.attrs.get('Subtype'), 'name', None) != 'Image':
+            digest.update(obj.get_rawdata() or b'')
+    elif isinstance(obj, dict):
+        digest.update(b'{')
+        for key in sorted(obj):
+            digest.update(str(key).encode('utf-8', 'replace'))
+            _feed(digest, obj[key], seen)
+        digest.update(b'}')
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b'[')
+        for item in obj:
+            _feed(digest, item, seen)
+        digest.update(b']')
+    elif isinstance(obj, PSLiteral):
+        digest.update(b'/' + str(obj.name).encode('utf-8', 'replace'))
+    else:
+        digest.update(repr(obj).encode('utf-8', 'replace'))
+
+
+def page_fingerprint(page) -> str:
+    """Отпечаток страницы pdfplumber: потоки содержимого, ресурсы (шрифты, формы) и геометрия"""
+    page_obj = page.page_obj
+    digest = hashlib.sha256()
+    seen = {}
+    _feed(digest, page_obj.attrs.get('Contents'), seen)
+    _feed(digest, page_obj.resources, seen)
+    _feed(digest, [list(page.mediabox), page.bbox, page.rotation], seen)
+    return digest.hexdigest()
+
+
+class PageCache:
+    """Постраничные результаты извлечения в SQLite, ограниченные по размеру (LRU)
+
+    Ключ — версия извлечения, вид данных (text, words, tables) и отпечаток страницы.
+    """
+
+    def __init__(self, path: str = DEFAULT_PAGE_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS pages ('
+                '  key TEXT PRIMARY KEY,'
+                '  value BLOB NOT NULL,'
+                '  size INTEGER NOT NULL,'
+                '  last_access REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_pages_access ON pages(last_access)')
+        conn.close()
+
+    @staticmethod
+    def make_key(version: str, kind: str, fingerprint: str) -> str:
+        return f"{version}:{kind}:{fingerprint}"
+
+    def get_many(self, version: str, kind: str, fingerprints: Iterable[str]) -> Dict[str, object]:
+        """Найденные в кэше значения по отпечаткам страниц"""
+        keys = {self.make_key(version, kind, fingerprint): fingerprint for fingerprint in set(fingerprints)}
+        if not keys:
+            return {}
+        found = {}
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    placeholders = ','.join('?' * len(keys))
+                    rows = conn.execute(f'SELECT key, value FROM pages WHERE key IN ({placeholders})',
+                                        list(keys)).fetchall()
+                    if rows:
+                        conn.execute(f'UPDATE pages SET last_access = ? WHERE key IN ({",".join("?" * len(rows))})',
+                                     [time.time()] + [key for key, _ in rows])
+            finally:
+                conn.close()
+            for key, value in rows:
+                found[keys[key]] = json.loads(zlib.decompress(value))
+        except (sqlite3.Error, zlib.error, ValueError) as e:
+            print(f"Ошибка чтения кэша страниц: {e}")
+        return found
+
+    def put_many(self, version: str, kind: str, values: Dict[str, object]):
+        """Сохраняет значения по отпечаткам страниц и вытесняет давно не использованные"""
+        if not values:
+            return
+        now = time.time()
+        rows = []
+        for fingerprint, value in values.items():
+            data = zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+            rows.append((self.make_key(version, kind, fingerprint), data, len(data), now))
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO pages (key, value, size, last_access) VALUES (?, ?, ?, ?)', rows
+                    )
+                    conn.execute(
+                        'DELETE FROM pages WHERE key IN ('
+                        '  SELECT key FROM ('
+                        '    SELECT key, SUM(size) OVER (ORDER BY last_access DESC) AS running'
+                        '    FROM pages'
+                        '  ) WHERE running > ?)',
+                        (self.max_bytes,)
+                    )
+            finally:
+                conn.close()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"Ошибка записи в кэш страниц: {e}")
+
+
+_shared = None
+_shared_loaded = False
+
+
+def shared_page_cache() -> Optional[PageCache]:
+    """Кэш страниц процесса по переменным окружения (ANALYSIS_PAGE_CACHE_PATH='' отключает его)"""
+    global _shared, _shared_loaded
+    if not _shared_loaded:
+        _shared_loaded = True
+        path = os.environ.get('ANALYSIS_PAGE_CACHE_PATH', DEFAULT_PAGE_CACHE_PATH)
+        if path:
+            max_mb = int(os.environ.get('ANALYSIS_PAGE_CACHE_MAX_MB', DEFAULT_MAX_BYTES // (1024 * 1024)))
+            try:
+                _shared = PageCache(path, max_bytes=max_mb * 1024 * 1024)
+            except sqlite3.Error as e:
+                print(f"Кэш страниц отключён: {e}")
+    return _shared
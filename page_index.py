@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+КЛЮЧЕВОЙ ИНДЕКС СТРАНИЦ
+Один проход по всем страницам находит, на каких страницах встречаются ключевые основы слов
+"""
+
+import re
+from typing import Dict, Iterable, List, Set
+
+
+class PageKeywordIndex:
+    """Индекс: ключевая основа -> страницы, на которых она встречается
+
+    Все основы объединены в одно выражение с опережающей проверкой, поэтому
+    каждая страница сканируется один раз, а пересекающиеся вхождения не теряются.
+    Основы (в нижнем регистре: поиск идёт по тексту, приведённому к нижнему регистру) берутся
+    из набора паттернов — PatternRegistry.keywords, — поэтому входят в его версию.
+    """
+
+    def __init__(self, pages: List[Dict], keywords: Iterable[str]):
+        self.pages = pages
+        self.keywords = list(keywords)
+        alternation = "|".join(re.escape(k) for k in sorted(self.keywords, key=len, reverse=True))
+        self._scanner = re.compile(f"(?=({alternation}))")
+        # В одной позиции совпадает самая длинная основа; более короткие основы-префиксы добавляем сами
+        self._covers = {k: [p for p in self.keywords if k.startswith(p)] for k in self.keywords}
+        self._index: Dict[str, Set[int]] = {k: set() for k in self.keywords}
+        self._build()
+
+    def _build(self):
+        for pos, page in enumerate(self.pages):
+            for match in self._scanner.finditer(page["text"].lower()):
+                for keyword in self._covers[match.group(1)]:
+                    self._index[keyword].add(pos)
+
+    def pages_for(self, keywords: Iterable[str]) -> List[Dict]:
+        """Страницы (в исходном порядке), содержащие хотя бы одну из основ"""
+        positions: Set[int] = set()
+        for keyword in keywords:
+            if keyword not in self._index:
+                # Неизвестная основа — не можем сузить поиск
+                return self.pages
+            positions |= self._index[keyword]
+        return [self.pages[pos] for pos in sorted(positions)]
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+БЫСТРАЯ РАЗМЕТКА СТРАНИЦ PDF
+По ресурсам и операторам потока содержимого, без анализа раскладки pdfminer
+
+Страница без операторов вывода текста не даёт ни текста, ни слов; страница без
+операторов построения контуров не даёт таблиц (pdfplumber ищет таблицы по линиям);
+страница без изображений не даёт объектов image. Поэтому пропуск таких страниц
+не меняет результатов извлечения. Ложные срабатывания (оператор внутри строки или
+встроенного изображения) только отменяют пропуск.
+
+page_images — опись изображений страницы (размещение и размер в пикселях) по тем же
+потокам: матрица преобразования отслеживается по операторам q/Q/cm до вызова Do.
+"""
+
+import re
+from typing import Dict, List, NamedTuple, Tuple
+from pdfminer.pdftypes import PDFStream, resolve1
+
+LABEL_IMAGE = 'image'  # без текста: фотографии или пустая страница
+LABEL_TEXT = 'text'    # текст без линий — таблиц нет
+LABEL_TABLE = 'table'  # текст и линии — возможны таблицы
+
+_DELIMITED = rb'(?<![A-Za-z0-9*])(?:%s)(?![A-Za-z0-9*])'
+TEXT_OPERATORS = re.compile(_DELIMITED % rb"Tj|TJ|'|\"")
+PATH_OPERATORS = re.compile(_DELIMITED % rb're|l|c|v|y')
+INLINE_IMAGE = re.compile(_DELIMITED % rb'BI')
+XOBJECT_CALL = re.compile(rb'/([^\s/\[\]()<>{}%]+)\s*Do(?![A-Za-z0-9*])')
+MAX_FORM_DEPTH = 8
+
+# Лексемы потока содержимого; строки и комментарии распознаются целиком, чтобы их содержимое не приняли за операторы
+CONTENT_TOKEN = re.compile(
+    rb"\((?:\\.|[^\\)])*\)|<<|>>|<[0-9A-Fa-f\s]*>|%[^\r\n]*|/[^\s/\[\]()<>{}%]*"
+    rb"|[+-]?(?:\d+\.?\d*|\.\d+)|[A-Za-z'\"*]+|[\[\]{}]",
+    re.S
+)
+INLINE_IMAGE_END = re.compile(rb'\sEI(?=\s|$)')
+OPERAND_START = b'0123456789+-./([]<>{}'
+NAME_ESCAPE = re.compile(rb'#([0-9A-Fa-f]{2})')
+
+
+class PageScan(NamedTuple):
+    label: str
+    has_text: bool
+    has_paths: bool
+    images: int  # изображений, выводимых на странице (XObject и встроенных)
+
+
+# Разметка, при которой ничего не пропускается (поток не удалось прочитать)
+UNKNOWN = PageScan(LABEL_TABLE, True, True, 1)
+
+
+def _xobject(xobjects, raw: bytes):
+    """Имя и объект XObject по имени из потока (без '/')
+
+    Коды #xx раскрываются, имя декодируется как ключи словарей pdfminer (utf-8, иначе байты).
+    Имя, которого нет в ресурсах, — KeyError: без него разметка и опись были бы неполными.
+    """
+    raw = NAME_ESCAPE.sub(lambda match: bytes((int(match.group(1), 16),)), raw)
+    try:
+        name = raw.decode('utf-8')
+    except UnicodeDecodeError:
+        name = raw
+    if name not in xobjects:
+        raise KeyError(f"XObject /{name} не найден в ресурсах")
+    return name, resolve1(xobjects[name])
+
+
+def _scan_stream(data: bytes, resources, depth: int, seen: set) -> tuple:
+    has_text = TEXT_OPERATORS.search(data) is not None
+    has_paths = PATH_OPERATORS.search(data) is not None
+    images = len(INLINE_IMAGE.findall(data))
+    xobjects = resolve1((resolve1(resources) or {}).get('XObject')) or {}
+    for match in XOBJECT_CALL.finditer(data):
+        _, xobject = _xobject(xobjects, match.group(1))
+        if not isinstance(xobject, PDFStream):
+            continue
+        subtype = getattr(xobject.attrs.get('Subtype'), 'name', None)
+        if subtype == 'Image':
+            images += 1
+        elif subtype == 'Form' and depth < MAX_FORM_DEPTH and id(xobject) not in seen:
+            # Форма может содержать текст и линии — разбираем её поток с её ресурсами
+            seen.add(id(xobject))
+            text, paths, form_images = _scan_stream(xobject.get_data(), xobject.attrs.get('Resources') or resources,
+                                                    depth + 1, seen)
+            has_text, has_paths, images = has_text or text, has_paths or paths, images + form_images
+    return has_text, has_paths, images
+
+
+def scan_page(page) -> PageScan:
+    """Разметка страницы pdfplumber: image, text или table, и число изображений"""
+    try:
+        page_obj = page.page_obj
+        data = b'\n'.join(resolve1(stream).get_data() for stream in page_obj.contents or [])
+        has_text, has_paths, images = _scan_stream(data, page_obj.resources, 0, set())
+    except Exception as e:
+        print(f"Не удалось разметить страницу {page.page_number}: {e}")
+        return UNKNOWN
+    if not has_text:
+        label = LABEL_IMAGE
+    elif has_paths:
+        label = LABEL_TABLE
+    else:
+        label = LABEL_TEXT
+    return PageScan(label, has_text, has_paths, images)
+
+
+Matrix = Tuple[float, float, float, float, float, float]
+
+
+def _multiply(a: Matrix, b: Matrix) -> Matrix:
+    return (a[0] * b[0] + a[1] * b[2], a[0] * b[1] + a[1] * b[3],
+            a[2] * b[0] + a[3] * b[2], a[2] * b[1] + a[3] * b[3],
+            a[4] * b[0] + a[5] * b[2] + b[4], a[4] * b[1] + a[5] * b[3] + b[5])
+
+
+def _initial_ctm(page_obj) -> Matrix:
+    """Начальная матрица страницы — как в pdfminer (учитывает /Rotate и начало MediaBox)"""
+    x0, y0, x1, y1 = page_obj.mediabox
+    rotate = page_obj.rotate
+    if rotate == 90:
+        return (0, -1, 1, 0, -y0, x1)
+    if rotate == 180:
+        return (-1, 0, 0, -1, x1, y1)
+    if rotate == 270:
+        return (0, 1, -1, 0, y1, -x0)
+    return (1, 0, 0, 1, -x0, -y0)
+
+
+def _walk_images(data: bytes, resources, ctm: Matrix, found: List, depth: int):
+    """Находит вызовы Do изображений и текущую матрицу преобразования (q/Q/cm) в момент вызова"""
+    xobjects = resolve1((resolve1(resources) or {}).get('XObject')) or {}
+    saved = []
+    operands = []
+    skip_until = -1
+    for match in CONTENT_TOKEN.finditer(data):
+        if match.start() < skip_until:
+            continue
+        token = match.group()
+        if token[:1] in OPERAND_START or token[:1] == b'%':
+            if token[:1] != b'%':
+                operands.append(token)
+            continue
+        if token == b'q':
+            saved.append(ctm)
+        elif token == b'Q':
+            ctm = saved.pop() if saved else ctm
+        elif token == b'cm' and len(operands) >= 6:
+            try:
+                ctm = _multiply(tuple(float(value) for value in operands[-6:]), ctm)
+            except ValueError:
+                pass
+        elif token == b'Do' and operands and operands[-1][:1] == b'/':
+            name, xobject = _xobject(xobjects, operands[-1][1:])
+            if isinstance(xobject, PDFStream):
+                subtype = getattr(xobject.attrs.get('Subtype'), 'name', None)
+                if subtype == 'Image':
+                    # Поток изображения не читается: размеры берутся из словаря
+                    found.append((name, ctm, resolve1(xobject.attrs.get('Width')), resolve1(xobject.attrs.get('Height'))))
+                elif subtype == 'Form' and depth < MAX_FORM_DEPTH:
+                    matrix = tuple(resolve1(xobject.attrs.get('Matrix')) or (1, 0, 0, 1, 0, 0))
+                    _walk_images(xobject.get_data(), xobject.attrs.get('Resources') or resources,
+                                 _multiply(matrix, ctm), found, depth + 1)
+        elif token == b'ID':
+            # Данные встроенного изображения пропускаются до EI
+            end = INLINE_IMAGE_END.search(data, match.end())
+            skip_until = end.end() if end else len(data)
+        operands = []
+
+
+def page_images(page) -> List[Dict]:
+    """Изображения страницы pdfplumber по вызовам Do: размещение и размер в пикселях
+
+    Координаты те же, что у page.objects['image'] (x0, top, x1, bottom, width, height, srcsize),
+    но без анализа раскладки и без распаковки потоков изображений. Встроенные изображения (BI/ID/EI)
+    в опись не входят. Вызов Do с именем, которого нет в ресурсах, — KeyError.
+    """
+    page_obj = page.page_obj
+    data = b'\n'.join(resolve1(stream).get_data() for stream in page_obj.contents or [])
+    found = []
+    _walk_images(data, page_obj.resources, _initial_ctm(page_obj), found, 0)
+    images = []
+    for name, ctm, pixel_width, pixel_height in found:
+        # Единичный квадрат изображения в координатах страницы
+        xs = (ctm[4], ctm[0] + ctm[4], ctm[2] + ctm[4], ctm[0] + ctm[2] + ctm[4])
+        ys = (ctm[5], ctm[1] + ctm[5], ctm[3] + ctm[5], ctm[1] + ctm[3] + ctm[5])
+        x0, x1, y0, y1 = min(xs), max(xs), min(ys), max(ys)
+        images.append({
+            'name': name,
+            'x0': x0,
+            'x1': x1,
+            'top': page.height - y1,
+            'bottom': page.height - y0,
+            'width': x1 - x0,
+            'height': y1 - y0,
+            'srcsize': (pixel_width, pixel_height),
+        })
+    return images
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+РЕЕСТР ПАТТЕРНОВ МЕТРИК
+Все паттерны компилируются один раз при импорте; альтернативы каждой метрики
+объединены в одно выражение с именованными группами
+"""
+
+import os
+import re
+import time
+import signal
+import hashlib
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse
+
+_LITERAL = sre_parse.LITERAL
+_IN = sre_parse.IN
+_RANGE = sre_parse.RANGE
+_CATEGORY = sre_parse.CATEGORY
+_SUBPATTERN = sre_parse.SUBPATTERN
+_REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+_BRANCH = sre_parse.BRANCH
+_CATEGORY_CLASSES = {
+    sre_parse.CATEGORY_DIGIT: r"\d",
+    sre_parse.CATEGORY_WORD: r"\w",
+    sre_parse.CATEGORY_SPACE: r"\s",
+}
+
+
+# Бюджет CPU (секунды) на поиск одной метрики; 0 отключает ограничение
+DEFAULT_CPU_BUDGET = float(os.environ.get('REGEX_CPU_BUDGET', '2.0'))
+
+# Чем может быть заполнен ограниченный промежуток между ключевым словом и числом
+SPAN_SCOPES = {
+    "chars": r"(?s:.)",                   # любые символы, включая перевод строки
+    "line": r"[^\n]",                     # в пределах строки
+    "sentence": r"(?:[^.!?]|\.(?=\d))",    # в пределах предложения (десятичная точка не конец)
+}
+
+_LAZY_ANY = re.compile(r'(?<!\\)\.\*\?')
+
+
+class Span(NamedTuple):
+    """Паттерн, в котором каждое .*? ограничено max_chars символами области scope"""
+    pattern: str
+    max_chars: int = 200
+    scope: str = "sentence"
+
+
+def bound_span(pattern: str, max_chars: int, scope: str) -> str:
+    """Заменяет неограниченные .*? на промежуток не длиннее max_chars"""
+    gap = SPAN_SCOPES[scope]
+    return _LAZY_ANY.sub(lambda _: f"{gap}{{0,{max_chars}}}?", pattern)
+
+
+class RegexBudgetExceeded(Exception):
+    """Поиск паттернов метрики превысил бюджет CPU"""
+    pass
+
+
+_deadline = contextvars.ContextVar('regex_deadline', default=None)
+
+
+def _check_deadline():
+    deadline = _deadline.get()
+    if deadline is not None and time.thread_time() > deadline:
+        raise RegexBudgetExceeded("regex CPU budget exceeded")
+
+
+def _raise_budget_exceeded(signum, frame):
+    raise RegexBudgetExceeded("regex CPU budget exceeded")
+
+
+@contextmanager
+def cpu_budget(seconds: float):
+    """Ограничивает процессорное время блока
+
+    В главном потоке (воркер gunicorn sync) используется таймер ITIMER_VIRTUAL:
+    сигнал прерывает даже выполняющийся re.search. В остальных потоках сигналы
+    недоступны, поэтому срок проверяется между страницами и совпадениями.
+    """
+    if not seconds or seconds <= 0 or _deadline.get() is not None:
+        yield
+        return
+    token = _deadline.set(time.thread_time() + seconds)
+    use_timer = hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+    previous = None
+    if use_timer:
+        previous = signal.signal(signal.SIGVTALRM, _raise_budget_exceeded)
+        signal.setitimer(signal.ITIMER_VIRTUAL, seconds)
+    try:
+        yield
+    finally:
+        if use_timer:
+            signal.setitimer(signal.ITIMER_VIRTUAL, 0)
+            signal.signal(signal.SIGVTALRM, previous)
+        _deadline.reset(token)
+
+
+class PatternMatch(NamedTuple):
+    """Совпадение одной из альтернатив метрики"""
+    alternative: int  # индекс альтернативы (приоритет, 0 — самый высокий)
+    text_index: int   # индекс текста (страницы) в переданной последовательности
+    start: int
+    end: int
+    value: Optional[str]  # group(1) альтернативы или всё совпадение, если групп нет
+    matched: str          # всё совпадение альтернативы (group(0))
+    pattern: str
+
+
+def _first_chars(items) -> Optional[set]:
+    """Элементы класса символов, с которых может начинаться совпадение, или None если его не определить
+
+    Регистр не раскрывается: проверка компилируется с теми же флагами, что и паттерн.
+    """
+    if not items:
+        return None
+    op, av = items[0]
+    if op is _LITERAL:
+        chars = {re.escape(chr(av))}
+    elif op is _IN:
+        chars = set()
+        for item_op, item_av in av:
+            if item_op is _LITERAL:
+                chars.add(re.escape(chr(item_av)))
+            elif item_op is _RANGE:
+                chars.add(re.escape(chr(item_av[0])) + "-" + re.escape(chr(item_av[1])))
+            elif item_op is _CATEGORY and item_av in _CATEGORY_CLASSES:
+                chars.add(_CATEGORY_CLASSES[item_av])
+            else:
+                return None  # отрицание и прочие конструкции
+    elif op is _SUBPATTERN:
+        return _first_chars(list(av[-1]))
+    elif op in _REPEATS and av[0] >= 1:
+        return _first_chars(list(av[2]))
+    elif op is _BRANCH:
+        chars = set()
+        for branch in av[1]:
+            branch_chars = _first_chars(list(branch))
+            if branch_chars is None:
+                return None
+            chars |= branch_chars
+    else:
+        return None
+    return chars
+
+
+def _gate(patterns: Sequence[str], flags: int) -> str:
+    """Опережающая проверка первого символа: отсекает позиции, где не начинается ни одна альтернатива"""
+    chars = set()
+    for pattern in patterns:
+        pattern_chars = _first_chars(list(sre_parse.parse(pattern, flags)))
+        if pattern_chars is None:
+            return ""
+        chars |= pattern_chars
+    return "(?=[" + "".join(sorted(chars)) + "])"
+
+
+class MetricPatterns:
+    """Альтернативные паттерны одной метрики в порядке приоритета
+
+    search() возвращает то же совпадение, что и последовательный перебор
+    «для каждого паттерна: для каждого текста: re.search». Альтернатива 0 обычно
+    и находится, поэтому она ищется отдельно: её выражение сохраняет быстрый поиск
+    по префиксу. Остальные альтернативы объединены в одно выражение, и каждый текст
+    сканируется им один раз; после совпадения альтернативы k дальнейший поиск ведётся
+    только по альтернативам с более высоким приоритетом.
+    """
+
+    def __init__(self, name: str, alternatives: Sequence[Union[str, Span]],
+                 flags: int = re.IGNORECASE | re.DOTALL, keywords: Sequence[str] = None,
+                 budget: float = None):
+        self.name = name
+        # Паттерны в исходном виде (для доказательств) и в том виде, в котором они компилируются
+        self.sources = [a.pattern if isinstance(a, Span) else a for a in alternatives]
+        self.alternatives = [
+            bound_span(a.pattern, a.max_chars, a.scope) if isinstance(a, Span) else a
+            for a in alternatives
+        ]
+        self.flags = flags
+        self.budget = DEFAULT_CPU_BUDGET if budget is None else budget
+        # Основы слов для ключевого индекса страниц (см. page_index.py)
+        self.keywords = list(keywords) if keywords else None
+        self.compiled = [re.compile(p, flags) for p in self.alternatives]
+        # _narrowed[k] — объединение альтернатив 1..k-1 (для k >= 2);
+        # одна оставшаяся альтернатива ищется своим выражением без объединения
+        self._narrowed: Dict[int, re.Pattern] = {}
+        self._value_groups: Dict[int, List[Tuple[int, object, Optional[int]]]] = {}
+        if len(self.alternatives) >= 2:
+            self._narrowed[2] = self.compiled[1]
+            self._value_groups[2] = [(1, 0, 1 if self.compiled[1].groups else None)]
+        for k in range(3, len(self.alternatives) + 1):
+            parts = [f"(?P<{name}_{i}>{self.alternatives[i]})" for i in range(1, k)]
+            combined = re.compile(_gate(self.alternatives[1:k], flags) + "(?:" + "|".join(parts) + ")", flags)
+            groups = []
+            for i in range(1, k):
+                outer = combined.groupindex[f"{name}_{i}"]
+                groups.append((i, f"{name}_{i}", outer + 1 if self.compiled[i].groups else None))
+            self._narrowed[k] = combined
+            self._value_groups[k] = groups
+
+    def _resolve(self, match: re.Match, k: int, text_index: int) -> PatternMatch:
+        for i, outer, inner in self._value_groups[k]:
+            if match.start(outer) != -1:
+                return PatternMatch(
+                    alternative=i,
+                    text_index=text_index,
+                    start=match.start(outer),
+                    end=match.end(outer),
+                    value=match.group(inner) if inner is not None else match.group(outer),
+                    matched=match.group(outer),
+                    pattern=self.sources[i],
+                )
+        raise AssertionError("no alternative matched")  # pragma: no cover
+
+    def search(self, texts: Sequence[str]) -> Optional[PatternMatch]:
+        """Первое совпадение по приоритету альтернатив, затем по порядку текстов и позиции
+
+        При превышении бюджета CPU метрика считается не найденной.
+        """
+        try:
+            with cpu_budget(self.budget):
+                return self._search(texts)
+        except RegexBudgetExceeded:
+            print(f"Паттерны '{self.name}': превышен бюджет CPU {self.budget} с, метрика пропущена")
+            return None
+
+    def _search(self, texts: Sequence[str]) -> Optional[PatternMatch]:
+        best = self._search_from(texts, first=0, last=1)
+        if best is not None:
+            return best
+        k = len(self.alternatives)
+        for text_index, text in enumerate(texts):
+            pos = 0
+            while k > 1:
+                _check_deadline()
+                match = self._narrowed[k].search(text, pos)
+                if match is None:
+                    break
+                best = self._resolve(match, k, text_index)
+                k = best.alternative
+                pos = best.start + 1
+            if k == 1:
+                break
+        return best
+
+    def iter_search(self, texts: Sequence[str]) -> Iterator[PatternMatch]:
+        """Совпадения по приоритету: search(), а при продолжении итерации — следующие альтернативы
+
+        Эквивалентно циклу «для каждого паттерна: если нашёлся — проверить значение,
+        иначе continue», но в обычном случае (значение подходит) текст сканируется один раз.
+        """
+        best = self.search(texts)
+        while best is not None:
+            yield best
+            try:
+                with cpu_budget(self.budget):
+                    best = self._search_from(texts, first=best.alternative + 1)
+            except RegexBudgetExceeded:
+                print(f"Паттерны '{self.name}': превышен бюджет CPU {self.budget} с, метрика пропущена")
+                return
+
+    def _search_from(self, texts: Sequence[str], first: int, last: int = None) -> Optional[PatternMatch]:
+        """Первое совпадение альтернатив first..last-1, перебирая их по очереди"""
+        for i in range(first, len(self.compiled) if last is None else last):
+            pattern = self.compiled[i]
+            for text_index, text in enumerate(texts):
+                _check_deadline()
+                match = pattern.search(text)
+                if match:
+                    return PatternMatch(
+                        alternative=i,
+                        text_index=text_index,
+                        start=match.start(),
+                        end=match.end(),
+                        value=match.group(1) if pattern.groups else match.group(0),
+                        matched=match.group(0),
+                        pattern=self.sources[i],
+                    )
+        return None
+
+
+class PatternRegistry:
+    """Набор метрик одного анализатора"""
+
+    def __init__(self, metrics: Sequence[MetricPatterns]):
+        self.metrics: Dict[str, MetricPatterns] = {m.name: m for m in metrics}
+
+    def __getitem__(self, name: str) -> MetricPatterns:
+        return self.metrics[name]
+
+    @property
+    def keywords(self) -> List[str]:
+        """Основы слов всех метрик для ключевого индекса страниц, без повторов"""
+        return list(dict.fromkeys(k for metric in self.metrics.values() for k in metric.keywords or []))
+
+    @property
+    def version(self) -> str:
+        """Отпечаток всех паттернов: меняется при любом изменении паттерна, флагов или ключевых основ
+
+        Основы решают, на каких страницах идёт поиск, поэтому тоже влияют на результат.
+        """
+        digest = hashlib.sha256()
+        for metric in self.metrics.values():
+            digest.update(f"{metric.name}:{metric.flags}:{','.join(metric.keywords or [])}\n".encode("utf-8"))
+            for pattern in metric.alternatives:
+                digest.update(pattern.encode("utf-8") + b"\n")
+        return digest.hexdigest()[:12]
+
+
+# Паттерны AdvancedReportAnalyzer (поиск по страницам, IGNORECASE | DOTALL).
+# Промежуток между ключевым словом и числом ограничен предложением: без ограничения
+# DOTALL-паттерн на странице без близкого совпадения перебирает весь оставшийся текст.
+ADVANCED_PATTERNS = PatternRegistry([
+    MetricPatterns("smr", [
+        Span(r'Фактическое выполнение СМР.*?составляет\s*[–-]?\s*(\d+[.,]\d+)\s*%', 200, "sentence"),
+        r'СМР\s*выполнен[оа]?\s*:?\s*(\d+[.,]?\d*)\s*%',
+        r'СМР\s*освоен[оа]?\s*(?:на)?\s*(\d+[.,]?\d*)\s*(?:процент|%)',
+        r'[Вв]ыполнение\s*(?:строительно[- ]?монтажных\s*работ|СМР)\s*:?\s*(\d+[.,]?\d*)\s*%',
+    ], keywords=["смр", "выполнение"]),
+    MetricPatterns("gpr_delay", [
+        Span(r'[Оо]тставание.*?(\d+)\s*дн', 200, "sentence"),
+        r'[Оо]тставани[яе]\s+от\s+[Гг][Пп][Рр]\s*[–-]?\s*(\d+)\s*дн',
+        Span(r'[Оо]тставание\s+от\s+графика.*?(\d+)\s*дн', 200, "sentence"),
+        r'[Зз]адержка\s*(?:работ)?\s*[–-]?\s*(\d+)\s*дн',
+    ], keywords=["отставани", "задержк"]),
+    MetricPatterns("norm_period", [
+        Span(r'[Нн]ормативный\s*срок.*?(\d+)\s*месяц', 200, "sentence"),
+        r'[Сс]рок\s*строительства\s*:?\s*(\d+)\s*(?:мес|месяц)',
+    ], keywords=["нормативн", "срок"]),
+    MetricPatterns("ddu", [
+        Span(r'([0-9]+[.,][0-9]+)\s*%\s*от\s*общего\s*поступления.*?средства\s*дольщиков', 200, "sentence"),
+        Span(r'[Сс]редства\s*дольщиков.*?(\d+[.,]?\d*)\s*%', 200, "sentence"),
+        Span(r'[Пп]оступления\s*(?:от|по)?\s*дольщиков.*?(\d+[.,]?\d*)\s*%', 200, "sentence"),
+        r'ДДУ\s*поступления\s*:?\s*(\d+[.,]?\d*)\s*%',
+    ], keywords=["дольщик", "дду"]),
+    MetricPatterns("guarantee", [
+        r'гарантийного\s*случа[яй]',
+        r'[Гг]арантийный\s*случай',
+        r'наступлени[еи]\s*гарантийного\s*случая',
+    ], keywords=["гарантийн"]),
+])
+
+
+# Паттерны api_fast (поиск по полному тексту, IGNORECASE): промежутки в пределах строки
+FAST_PATTERNS = PatternRegistry([
+    MetricPatterns("smr", [
+        Span(r'СМР.*?(\d+[.,]\d+)\s*%', 200, "line"),
+        Span(r'выполнение\s+СМР.*?(\d+[.,]\d+)', 200, "line"),
+        Span(r'строительно\D+монтажные.*?(\d+[.,]\d+)', 200, "line"),
+    ], flags=re.IGNORECASE),
+    MetricPatterns("gpr", [
+        Span(r'отставани[еюя].*?(\d+[.,]\d+)\s*%', 200, "line"),
+        Span(r'ГПР.*?(\d+[.,]\d+)', 200, "line"),
+        Span(r'от графика.*?(\d+[.,]\d+)', 200, "line"),
+    ], flags=re.IGNORECASE),
+    MetricPatterns("gpr_days", [
+        r'отставани[еюя]\s+(\d+)\s+д[нн]',
+        Span(r'(\d+)\s+д[нн].*?отставани', 200, "line"),
+        Span(r'дней.*?отставани|отставани.*?(\d+)\s+дней', 200, "line"),
+    ], flags=re.IGNORECASE),
+    MetricPatterns("ddu", [
+        Span(r'ДДУ.*?(\d+[.,]\d+)\s*%', 200, "line"),
+        Span(r'платежи.*?(\d+[.,]\d+)', 200, "line"),
+        Span(r'поступлени[еяю].*?денежных.*?(\d+[.,]\d+)', 200, "line"),
+    ], flags=re.IGNORECASE),
+    MetricPatterns("guarantee", [
+        r'гарантийн\w+\s+случа\w*',
+    ], flags=re.IGNORECASE),
+    MetricPatterns("builder_delay", [
+        Span(r'просрочк[аи].*?(\d+)\s+д[нн]', 200, "line"),
+        Span(r'(\d+)\s+д[нн].*?просрочк', 200, "line"),
+    ], flags=re.IGNORECASE),
+    MetricPatterns("complaints", [
+        Span(r'обращени[еям].*?(\d+)', 200, "line"),
+        Span(r'жалоб.*?(\d+)', 200, "line"),
+    ], flags=re.IGNORECASE),
+    MetricPatterns("rating", [
+        Span(r'рейтинг.*?(?:на|снижение).*?(\d+)', 200, "line"),
+        Span(r'снижение.*?рейтинг.*?(\d+)', 200, "line"),
+    ], flags=re.IGNORECASE),
+    MetricPatterns("debt", [
+        Span(r'(?:долг|заемн\w+).*?(?:капитал|собственн\w+).*?(\d+[.,]\d+)', 200, "line"),
+        Span(r'соотношени[еям].*?(?:долг|заемн\w+).*?(\d+[.,]\d+)', 200, "line"),
+    ], flags=re.IGNORECASE),
+    MetricPatterns("code", [
+        r'ДПГ[\s-]?\d+[\s-]?\d+[\s-]?\d+',
+        r'Код[:\s]+([А-Яа-я\d\s-]+)',
+    ], flags=0),
+    MetricPatterns("name", [
+        # Попытка найти название в кавычках после "Отчет инжиниринговой..."
+        Span(r'Отчет\s+инжиниринговой.*?\n\s*([^\n]+)', 300, "chars"),
+        # Или название в кавычках как ЖК "..."
+        r'ЖК\s+"([^"]+)"',
+        # Или после слова "объект"
+        r'объект[:\s]+([^\n]+)',
+        # Или в строке "Наименование"
+        r'Наименовани[еюя][:\s]+([^\n]+)',
+    ]),
+    MetricPatterns("period", [
+        r'(\d{4})\s+(января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)',
+        r'период[:\s]+([^\n]+)',
+    ], flags=re.IGNORECASE),
+    MetricPatterns("location", [
+        r'город\s+([^\n,]+)',
+        r'расположен[иия][:\s]+([^\n]+)',
+    ], flags=re.IGNORECASE),
+    MetricPatterns("customer", [
+        r'Заказчик[:\s]+([^\n]+)',
+        r'(ООО|АО|ИП)[^:\n]*',
+    ], flags=re.IGNORECASE),
+])
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+РАЗОБРАННЫЙ PDF ДОКУМЕНТ
+Открывает PDF один раз и кэширует текст, слова, таблицы и изображения по страницам
+"""
+
+import io
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import pdfplumber
+from word_index import PageWordIndex
+from page_cache import page_fingerprint, shared_page_cache
+from page_scan import PageScan, page_images, scan_page
+from text_backends import TEXT_BACKEND_LAYOUT, TEXT_BACKENDS, text_backend_name
+
+# Виды постраничных данных, которые можно извлекать в отдельных процессах
+PAGE_KINDS = ('text', 'words', 'tables')
+DEFAULT_PAGES_PER_WORKER = 50
+
+# Версия сохранённых постраничных данных: увеличьте при изменении параметров извлечения
+ARTIFACT_VERSION = f"pdfplumber-{pdfplumber.__version__}-a1"
+
+# Извлечение слов и таблиц со страницы pdfplumber (текст извлекает движок из text_backends)
+PAGE_EXTRACTORS = {
+    'words': lambda page: page.extract_words(),
+    'tables': lambda page: page.extract_tables() or [],
+}
+
+# Какой признак разметки нужен виду данных: без него страница не разбирается
+SCAN_REQUIRES = {'text': 'has_text', 'words': 'has_text', 'tables': 'has_paths'}
+
+
+def as_pdf_source(source):
+    """Путь или file-like объект для pdfplumber.open (bytes оборачиваются в BytesIO)"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+
+class ParsedDocument:
+    """PDF, который разбирается один раз и переиспользуется всеми экстракторами
+
+    Каждый вид данных (текст, слова, таблицы, изображения) вычисляется при первом
+    обращении к странице и сохраняется. pdfplumber кэширует объекты страницы,
+    поэтому анализ раскладки pdfminer выполняется не более одного раза на страницу.
+    Текст, слова и таблицы страниц, уже встречавшихся в других PDF, берутся из кэша страниц.
+    Страницы, где по разметке page_scan нечего извлекать (фото без текста, текст без линий
+    для таблиц), не разбираются вовсе. Текст извлекает движок text_backend (layout или fast).
+    """
+
+    def __init__(self, source, use_page_cache: bool = True, text_backend: str = None):
+        self.source = source  # путь к файлу, bytes или file-like объект
+        self.page_cache = shared_page_cache() if use_page_cache else None
+        self.text_backend = TEXT_BACKENDS[text_backend_name(text_backend)](self)
+        self._pdf = None
+        self._fingerprints: Dict[int, str] = {}
+        self._scans: Dict[int, PageScan] = {}
+        self._text: Dict[int, str] = {}
+        self._words: Dict[int, List[Dict]] = {}
+        self._tables: Dict[int, List[List]] = {}
+        self._images: Dict[int, List[Dict]] = {}
+        self._image_inventory: Dict[int, List[Dict]] = {}
+        self._word_index: Dict[int, PageWordIndex] = {}
+        self._tables_below: Dict[Tuple[int, float], List[List]] = {}
+
+    def _open(self):
+        if self._pdf is None:
+            self._pdf = pdfplumber.open(as_pdf_source(self.source))
+        return self._pdf
+
+    @property
+    def page_count(self) -> int:
+        return len(self._open().pages)
+
+    def page_numbers(self) -> range:
+        """Номера страниц (с 1)"""
+        return range(1, self.page_count + 1)
+
+    def page(self, page_num: int):
+        """Возвращает страницу pdfplumber по номеру (с 1)"""
+        return self._open().pages[page_num - 1]
+
+    def fingerprint(self, page_num: int) -> str:
+        """Отпечаток содержимого страницы для кэша страниц"""
+        if page_num not in self._fingerprints:
+            self._fingerprints[page_num] = page_fingerprint(self.page(page_num))
+        return self._fingerprints[page_num]
+
+    def scan(self, page_num: int) -> PageScan:
+        """Быстрая разметка страницы по операторам потока содержимого (без анализа раскладки)"""
+        if page_num not in self._scans:
+            self._scans[page_num] = scan_page(self.page(page_num))
+        return self._scans[page_num]
+
+    def page_kind(self, page_num: int) -> str:
+        """image, text или table"""
+        return self.scan(page_num).label
+
+    @property
+    def text_version(self) -> str:
+        """Версия текста страниц: ARTIFACT_VERSION у layout, с версией движка у остальных"""
+        if self.text_backend.name == TEXT_BACKEND_LAYOUT:
+            return ARTIFACT_VERSION
+        return f"{ARTIFACT_VERSION}+{self.text_backend.version}"
+
+    def _version(self, kind: str) -> str:
+        # Текст разных движков хранится в кэше страниц под разными ключами
+        return self.text_version if kind == 'text' else ARTIFACT_VERSION
+
+    def _skipped(self, kind: str, page_num: int) -> bool:
+        return not getattr(self.scan(page_num), SCAN_REQUIRES[kind])
+
+    def _run_extractor(self, kind: str, page_num: int):
+        if kind == 'text':
+            return self.text_backend.page_text(page_num)
+        return PAGE_EXTRACTORS[kind](self.page(page_num))
+
+    def _extract(self, kind: str, page_num: int):
+        """Данные страницы из кэша страниц или извлечённые движком текста и pdfplumber"""
+        if self._skipped(kind, page_num):
+            return "" if kind == 'text' else []
+        if self.page_cache is None:
+            return self._run_extractor(kind, page_num)
+        fingerprint = self.fingerprint(page_num)
+        found = self.page_cache.get_many(self._version(kind), kind, [fingerprint])
+        if fingerprint in found:
+            return found[fingerprint]
+        value = self._run_extractor(kind, page_num)
+        self.page_cache.put_many(self._version(kind), kind, {fingerprint: value})
+        return value
+
+    def text(self, page_num: int) -> str:
+        """Текст страницы"""
+        if page_num not in self._text:
+            self._text[page_num] = self._extract('text', page_num)
+        return self._text[page_num]
+
+    def words(self, page_num: int) -> List[Dict]:
+        """Слова страницы с координатами"""
+        if page_num not in self._words:
+            self._words[page_num] = self._extract('words', page_num)
+        return self._words[page_num]
+
+    def word_index(self, page_num: int) -> PageWordIndex:
+        """Пространственный индекс слов страницы"""
+        if page_num not in self._word_index:
+            self._word_index[page_num] = PageWordIndex(self.words(page_num))
+        return self._word_index[page_num]
+
+    def tables(self, page_num: int) -> List[List]:
+        """Таблицы страницы"""
+        if page_num not in self._tables:
+            self._tables[page_num] = self._extract('tables', page_num)
+        return self._tables[page_num]
+
+    def prefetch(self, kinds: Iterable[str] = ('text',)):
+        """Извлекает данные всех страниц заранее; большие документы — параллельно по частям
+
+        Страницы, найденные в кэше страниц, не разбираются; остальные после разбора добавляются в кэш.
+        """
+        kinds = tuple(kinds)
+        pages = list(self.page_numbers())
+        if self.page_cache is not None:
+            fingerprints = {page_num: self.fingerprint(page_num) for page_num in pages}
+            for kind in kinds:
+                found = self.page_cache.get_many(self._version(kind), kind, fingerprints.values())
+                cached = getattr(self, f'_{kind}')
+                for page_num, fingerprint in fingerprints.items():
+                    if fingerprint in found:
+                        cached.setdefault(page_num, found[fingerprint])
+        missing = [page_num for page_num in pages
+                   if any(page_num not in getattr(self, f'_{kind}') for kind in kinds)]
+        for page_num in missing:
+            for kind in kinds:
+                if self._skipped(kind, page_num):
+                    getattr(self, f'_{kind}').setdefault(page_num, "" if kind == 'text' else [])
+        missing = [page_num for page_num in missing
+                   if any(page_num not in getattr(self, f'_{kind}') for kind in kinds)]
+        if not missing:
+            return
+        workers = parallel_workers(len(missing))
+        extracted = False
+        # В процессы передаётся путь или bytes; поток открыт только здесь
+        if workers > 1 and isinstance(self.source, (str, bytes, bytearray)):
+            try:
+                self._prefetch_parallel(kinds, missing, workers)
+                extracted = True
+            except Exception as e:
+                print(f"Параллельное извлечение не удалось, продолжаем последовательно: {e}")
+        if not extracted:
+            for page_num in missing:
+                for kind in kinds:
+                    cached = getattr(self, f'_{kind}')
+                    if page_num not in cached:
+                        cached[page_num] = self._run_extractor(kind, page_num)
+        if self.page_cache is not None:
+            for kind in kinds:
+                cached = getattr(self, f'_{kind}')
+                self.page_cache.put_many(self._version(kind), kind, {
+                    self.fingerprint(page_num): cached[page_num] for page_num in missing if page_num in cached
+                })
+
+    def _prefetch_parallel(self, kinds, pages: List[int], workers: int):
+        # Вдвое больше частей, чем процессов: страницы с таблицами разбираются дольше фото
+        chunks = workers * 2
+        size = -(-len(pages) // chunks)
+        parts = [pages[start:start + size] for start in range(0, len(pages), size)]
+        executor = _page_executor()
+        try:
+            futures = [executor.submit(_extract_pages, self.source, part, kinds, self.text_backend.name)
+                       for part in parts]
+            results = [future.result() for future in futures]
+        except Exception:
+            _reset_page_executor()
+            raise
+        # Собираем результаты в порядке страниц
+        for chunk in results:
+            for page_num, data in chunk.items():
+                for kind, value in data.items():
+                    getattr(self, f'_{kind}').setdefault(page_num, value)
+
+    def tables_below(self, page_num: int, top: float) -> Iterator[List]:
+        """Таблицы страницы ниже координаты top, по одной (поиск таблиц только в обрезанной области)"""
+        page = self.page(page_num)
+        # Рамка страницы может начинаться не с (0, 0): crop за её пределами бросает ValueError
+        x0, y0, x1, y1 = page.bbox
+        if top >= y1 or not self.scan(page_num).has_paths:
+            return
+        region = page.crop((x0, max(top, y0), x1, y1))
+        # Извлечённые таблицы запоминаются для snapshot(), лишние не извлекаются
+        found = self._tables_below.setdefault((page_num, top), [])
+        for index, table in enumerate(region.find_tables()):
+            if index == len(found):
+                found.append(table.extract())
+            yield found[index]
+
+    def images(self, page_num: int) -> List[Dict]:
+        """Объекты изображений страницы"""
+        if page_num not in self._images:
+            # Страницы без изображений по разметке не разбираются
+            self._images[page_num] = self.page(page_num).objects.get('image', []) if self.scan(page_num).images else []
+        return self._images[page_num]
+
+    def image_inventory(self, page_num: int) -> List[Dict]:
+        """Изображения страницы по вызовам Do: размещение и размер в пикселях, без анализа раскладки"""
+        if page_num not in self._image_inventory:
+            if not self.scan(page_num).images:
+                self._image_inventory[page_num] = []
+            else:
+                try:
+                    self._image_inventory[page_num] = page_images(self.page(page_num))
+                except Exception as e:
+                    # Опись неполна — берём объекты image pdfplumber
+                    print(f"Не удалось составить опись изображений страницы {page_num}: {e}")
+                    self._image_inventory[page_num] = self.images(page_num)
+        return self._image_inventory[page_num]
+
+    def snapshot(self) -> Dict:
+        """Уже извлечённые данные в JSON-совместимом виде (для StoredDocument)
+
+        Текст обычно есть для всех страниц, слова и таблицы — только для страниц,
+        к которым обращались экстракторы. Снимок с текстом движка fast имеет другую версию.
+        """
+        return {
+            'version': self.text_version,
+            'page_count': self.page_count,
+            'text': {str(page_num): text for page_num, text in self._text.items()},
+            'words': {str(page_num): words for page_num, words in self._words.items()},
+            'tables': {str(page_num): tables for page_num, tables in self._tables.items()},
+            'tables_below': [[page_num, top, tables] for (page_num, top), tables in self._tables_below.items()],
+        }
+
+    def close(self):
+        """Закрывает файл PDF (кэшированные результаты остаются доступны)"""
+        self.text_backend.close()
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class StoredDocument:
+    """Документ из сохранённых постраничных данных (snapshot) без исходного PDF
+
+    Интерфейс тот же, что у ParsedDocument; данных, которых нет в снимке, нет и здесь:
+    пустой текст, пустые списки слов и таблиц.
+    """
+
+    def __init__(self, artifact: Dict):
+        self.page_count = artifact['page_count']
+        self._text = {int(page_num): text for page_num, text in artifact.get('text', {}).items()}
+        self._words = {int(page_num): words for page_num, words in artifact.get('words', {}).items()}
+        self._tables = {int(page_num): tables for page_num, tables in artifact.get('tables', {}).items()}
+        self._tables_below = {(page_num, top): tables for page_num, top, tables in artifact.get('tables_below', [])}
+        self._word_index: Dict[int, PageWordIndex] = {}
+
+    def page_numbers(self) -> range:
+        return range(1, self.page_count + 1)
+
+    def text(self, page_num: int) -> str:
+        return self._text.get(page_num, "")
+
+    def words(self, page_num: int) -> List[Dict]:
+        return self._words.get(page_num, [])
+
+    def word_index(self, page_num: int) -> PageWordIndex:
+        if page_num not in self._word_index:
+            self._word_index[page_num] = PageWordIndex(self.words(page_num))
+        return self._word_index[page_num]
+
+    def tables(self, page_num: int) -> List[List]:
+        return self._tables.get(page_num, [])
+
+    def tables_below(self, page_num: int, top: float) -> Iterator[List]:
+        yield from self._tables_below.get((page_num, top), [])
+
+    def images(self, page_num: int) -> List[Dict]:
+        return []
+
+    def image_inventory(self, page_num: int) -> List[Dict]:
+        return []
+
+    def prefetch(self, kinds: Iterable[str] = ('text',)):
+        pass
+
+    # Поля те же, что у ParsedDocument; сохраняются только снимки с текстом layout
+    text_version = ARTIFACT_VERSION
+    snapshot = ParsedDocument.snapshot
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def image_inventory(source) -> List[Dict]:
+    """Опись изображений PDF без анализатора: страница, размещение и размер в пикселях
+
+    Текст не извлекается, раскладка страниц не анализируется, потоки изображений не распаковываются.
+    """
+    with ParsedDocument(source, use_page_cache=False) as document:
+        return [
+            {'page': page_num, 'x0': image['x0'], 'top': image['top'], 'width': image['width'],
+             'height': image['height'], 'pixel_width': image['srcsize'][0], 'pixel_height': image['srcsize'][1]}
+            for page_num in document.page_numbers()
+            for image in document.image_inventory(page_num)
+        ]
+
+
+def parallel_workers(page_count: int) -> int:
+    """Сколько процессов использовать для документа (1 — извлекать в текущем процессе)
+
+    На каждый процесс должно приходиться не меньше PDF_PAGES_PER_WORKER страниц:
+    у небольших документов запуск процессов дороже выигрыша.
+    """
+    max_workers = int(os.environ.get('PDF_PARALLEL_WORKERS', 0)) or os.cpu_count() or 1
+    pages_per_worker = int(os.environ.get('PDF_PAGES_PER_WORKER', DEFAULT_PAGES_PER_WORKER)) or 1
+    if multiprocessing.current_process().daemon:
+        # Процессы пула анализа не могут порождать дочерние; ядра и так заняты другими файлами
+        return 1
+    return max(1, min(max_workers, page_count // pages_per_worker))
+
+
+def _extract_pages(source, pages: List[int], kinds, text_backend: str) -> Dict[int, Dict[str, Any]]:
+    """Выполняется в дочернем процессе: открывает документ сам и извлекает страницы pages"""
+    # Кэш страниц читает и пополняет родительский процесс
+    document = ParsedDocument(source, use_page_cache=False, text_backend=text_backend)
+    try:
+        return {
+            page_num: {kind: getattr(document, kind)(page_num) for kind in kinds}
+            for page_num in pages
+        }
+    finally:
+        document.close()
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _page_executor() -> ProcessPoolExecutor:
+    """Общий пул процессов для постраничного извлечения (создаётся при первом большом документе)"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            max_workers = int(os.environ.get('PDF_PARALLEL_WORKERS', 0)) or os.cpu_count() or 1
+            _executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _reset_page_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
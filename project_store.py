@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ХРАНИЛИЩЕ РЕЗУЛЬТАТОВ ПО ПРОЕКТАМ
+Каждый анализ сохраняется в SQLite по projectId и нормализованному отчётному периоду
+
+Повторный отчёт за тот же период заменяет прежний. Таблица projects хранит последний
+период и статус каждого проекта, поэтому выборка проектов по статусу не просматривает историю.
+Таблица ddu_points — ДДУ каждого месяца проекта для условия b6 без повторного разбора старых PDF.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import tempfile
+from typing import Dict, List, Optional
+
+DEFAULT_STORE_PATH = os.path.join(tempfile.gettempdir(), 'khc_projects.sqlite3')
+WINDOW_MONTHS = 3  # условие b6 смотрит на три последовательных месяца
+
+# Основы названий месяцев (покрывают «декабрь», «декабря», «Декабре»); у мая формы перечислены
+# полностью, чтобы «ма» не совпадало с «марта», «масштаб» и т.п.
+MONTH_STEMS = ['январ', 'феврал', 'март', 'апрел', 'ма[йяе](?![а-я])', 'июн', 'июл', 'август', 'сентябр', 'октябр',
+               'ноябр', 'декабр']
+MONTH_RE = '|'.join(MONTH_STEMS)
+
+
+def report_period_key(period: str):
+    """Номер месяца отчёта (год * 12 + месяц - 1) для сортировки или None
+
+    Понимает «202512», «12.2025», «2025 декабря» и «декабрь 2025».
+    """
+    if not period:
+        return None
+    text = period.lower()
+    match = re.search(r'(?<!\d)(20\d{2})(0[1-9]|1[0-2])(?!\d)', text)
+    if match:
+        return int(match.group(1)) * 12 + int(match.group(2)) - 1
+    match = re.search(r'(?<!\d)(0?[1-9]|1[0-2])[./](20\d{2})(?!\d)', text)
+    if match:
+        return int(match.group(2)) * 12 + int(match.group(1)) - 1
+    match = re.search(rf'(20\d{{2}})\D{{0,3}}({MONTH_RE})|({MONTH_RE})[а-я]*\s+(20\d{{2}})', text)
+    if match:
+        year = match.group(1) or match.group(4)
+        stem = match.group(2) or match.group(3)
+        month = next(index for index, pattern in enumerate(MONTH_STEMS) if re.match(pattern, stem))
+        return int(year) * 12 + month
+    return None
+
+
+def period_label(key: int) -> str:
+    """Нормализованный период «ГГГГ-ММ» по номеру месяца"""
+    return f"{key // 12:04d}-{key % 12 + 1:02d}"
+
+
+def report_ddu_value(metrics: Dict) -> Optional[float]:
+    """ДДУ отчёта за его собственный месяц (первое найденное значение) или None"""
+    ddu_list = metrics.get('DDU_payments_percent')
+    # [0] — значение extract_metrics по умолчанию: ДДУ в отчёте не найден
+    if not isinstance(ddu_list, list) or not ddu_list or ddu_list == [0]:
+        return None
+    return ddu_list[0]
+
+
+class ProjectStore:
+    """История анализов по проектам в SQLite, общем для всех воркеров gunicorn
+
+    Первичный ключ (project_id, period_key) служит индексом для «последних N периодов проекта»,
+    индекс по projects(status) — для «всех проектов с данным статусом».
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS analyses ('
+                '  project_id TEXT NOT NULL,'
+                '  period_key INTEGER NOT NULL,'
+                '  report_period TEXT,'
+                '  status TEXT,'
+                '  source TEXT NOT NULL,'
+                '  digest TEXT,'
+                '  filename TEXT,'
+                '  result TEXT NOT NULL,'
+                '  analyzed_at REAL NOT NULL,'
+                '  PRIMARY KEY (project_id, period_key))'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS projects ('
+                '  project_id TEXT PRIMARY KEY,'
+                '  name TEXT,'
+                '  code TEXT,'
+                '  period_key INTEGER NOT NULL,'
+                '  status TEXT,'
+                '  updated_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_projects_status ON projects(status, period_key)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS ddu_points ('
+                '  project_id TEXT NOT NULL,'
+                '  period_key INTEGER NOT NULL,'
+                '  value REAL NOT NULL,'
+                '  PRIMARY KEY (project_id, period_key))'
+            )
+        conn.close()
+
+    def _execute(self, sql: str, params=()):
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def save(self, response: Dict, source: str, digest: str = None, filename: str = None) -> bool:
+        """Сохраняет ответ /api/analyze-report; False, если его нельзя привязать к проекту и периоду
+
+        Fallback-ответы не сохраняются: их значения не извлечены из отчёта.
+        """
+        project_id = response.get('projectId')
+        info = response.get('project_info') or {}
+        period_key = report_period_key(info.get('report_period'))
+        if not project_id or period_key is None or 'fallback_mode' in response.get('triggered_conditions', []):
+            return False
+        # Замеры этапов относятся к запросу, а не к отчёту
+        result = {key: value for key, value in response.items() if key != 'timings'}
+        status = response.get('project_status')
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO analyses (project_id, period_key, report_period, status, source,'
+                        '  digest, filename, result, analyzed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (project_id, period_key, info.get('report_period'), status, source, digest, filename,
+                         json.dumps(result, ensure_ascii=False), now)
+                    )
+                    # Статус проекта — по самому позднему периоду; архивный отчёт его не меняет
+                    conn.execute(
+                        'INSERT INTO projects (project_id, name, code, period_key, status, updated_at)'
+                        ' VALUES (?, ?, ?, ?, ?, ?)'
+                        ' ON CONFLICT(project_id) DO UPDATE SET name = excluded.name, code = excluded.code,'
+                        '  period_key = excluded.period_key, status = excluded.status, updated_at = excluded.updated_at'
+                        ' WHERE excluded.period_key >= projects.period_key',
+                        (project_id, info.get('full_name'), info.get('code'), period_key, status, now)
+                    )
+                    # ДДУ за месяц заменяется вместе с анализом; отчёт без ДДУ убирает прежнее значение
+                    value = report_ddu_value(response.get('metrics') or {})
+                    if value is None:
+                        conn.execute('DELETE FROM ddu_points WHERE project_id = ? AND period_key = ?',
+                                     (project_id, period_key))
+                    else:
+                        conn.execute('INSERT OR REPLACE INTO ddu_points (project_id, period_key, value)'
+                                     ' VALUES (?, ?, ?)', (project_id, period_key, value))
+            finally:
+                conn.close()
+            return True
+        except sqlite3.Error as e:
+            print(f"Ошибка записи в хранилище проектов: {e}")
+            return False
+
+    @staticmethod
+    def _record(row) -> Dict:
+        project_id, period_key, report_period, status, source, digest, filename, result, analyzed_at = row
+        return {
+            'projectId': project_id,
+            'period': period_label(period_key),
+            'report_period': report_period,
+            'project_status': status,
+            'source': source,
+            'sha256': digest,
+            'filename': filename,
+            'analyzed_at': analyzed_at,
+            'result': json.loads(result),
+        }
+
+    def latest(self, project_id: str, limit: int = 3) -> List[Dict]:
+        """Последние limit периодов проекта, от нового к старому"""
+        rows = self._execute(
+            'SELECT project_id, period_key, report_period, status, source, digest, filename, result, analyzed_at'
+            ' FROM analyses WHERE project_id = ? ORDER BY period_key DESC LIMIT ?',
+            (project_id, limit)
+        )
+        return [self._record(row) for row in rows]
+
+    def get(self, project_id: str, period: str) -> Optional[Dict]:
+        """Анализ проекта за период («202512», «2025-12», «декабрь 2025» и т.п.)"""
+        period_key = report_period_key(period.replace('-', '')) if period else None
+        if period_key is None:
+            return None
+        rows = self._execute(
+            'SELECT project_id, period_key, report_period, status, source, digest, filename, result, analyzed_at'
+            ' FROM analyses WHERE project_id = ? AND period_key = ?',
+            (project_id, period_key)
+        )
+        return self._record(rows[0]) if rows else None
+
+    def ddu_values(self, project_id: str, first_key: int, last_key: int) -> Dict[int, float]:
+        """ДДУ проекта за месяцы first_key..last_key: {period_key: значение}, месяцы без ДДУ пропущены"""
+        try:
+            rows = self._execute(
+                'SELECT period_key, value FROM ddu_points WHERE project_id = ? AND period_key BETWEEN ? AND ?',
+                (project_id, first_key, last_key)
+            )
+        except sqlite3.Error as e:
+            print(f"Ошибка чтения хранилища проектов: {e}")
+            return {}
+        return dict(rows)
+
+    def projects_by_status(self, status: str, limit: int = 100) -> List[Dict]:
+        """Проекты, у которых в последнем периоде данный статус, начиная с самых свежих"""
+        rows = self._execute(
+            'SELECT project_id, name, code, period_key, status, updated_at FROM projects'
+            ' WHERE status = ? ORDER BY period_key DESC LIMIT ?',
+            (status, limit)
+        )
+        return [
+            {'projectId': project_id, 'name': name, 'code': code, 'period': period_label(period_key),
+             'project_status': status, 'updated_at': updated_at}
+            for project_id, name, code, period_key, status, updated_at in rows
+        ]
+
+
+def store_from_env() -> Optional[ProjectStore]:
+    """Создаёт хранилище по переменной окружения (ANALYSIS_STORE_PATH='' отключает его)"""
+    path = os.environ.get('ANALYSIS_STORE_PATH', DEFAULT_STORE_PATH)
+    if not path:
+        return None
+    try:
+        return ProjectStore(path)
+    except sqlite3.Error as e:
+        print(f"Хранилище проектов отключено: {e}")
+        return None
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ПОВТОРНЫЙ АНАЛИЗ ПО СОХРАНЁННЫМ ДАННЫМ
+Пересчёт метрик и статусов всех сохранённых отчётов после изменения паттернов, без разбора PDF
+
+Постраничные данные (page_artifacts.py) сохраняются при каждом анализе в api.py, api_fast.py
+и batch_analyze.py. Здесь выполняются только экстракторы по тексту и классификация.
+
+Примеры:
+    python reanalyze.py --output rescored.jsonl
+    python reanalyze.py --analyzer fast --output rescored-fast.jsonl
+    python reanalyze.py --output rescored.jsonl --compare history.jsonl   # что изменилось
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from typing import Dict, List
+
+from batch_analyze import STATUS_ERROR, STATUS_OK
+
+COMPARED_METRICS = ('SMR_completion', 'GPR_delay_days', 'DDU_payments_percent', 'DDU_monthly_values',
+                    'guarantee_extension')
+
+
+def rescore_advanced(artifact: Dict, filename: str) -> tuple:
+    """Ответ в формате /api/analyze-report из api.py по снимку документа"""
+    from advanced_analyzer import AdvancedReportAnalyzer
+    from api import build_response
+    result = AdvancedReportAnalyzer.from_artifact(artifact).analyze()
+    return build_response(result), result['timings']
+
+
+def rescore_fast(artifact: Dict, filename: str) -> tuple:
+    """Ответ в формате /api/analyze-report из api_fast.py по снимку документа"""
+    from api_fast import analyze_texts, document_texts
+    from pdf_document import StoredDocument
+    from timings import StageTimer
+    timer = StageTimer()
+    response, _ = analyze_texts(document_texts(StoredDocument(artifact)), filename, timer)
+    return response, timer.as_dict()
+
+
+RESCORERS = {'advanced': (rescore_advanced, 'api'), 'fast': (rescore_fast, 'api_fast')}
+
+
+def load_previous(path: str) -> Dict[str, Dict]:
+    """Прежние ответы по sha256 из JSONL batch_analyze.py или reanalyze.py"""
+    previous = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('status') == STATUS_OK and record.get('sha256'):
+                previous[record['sha256']] = record['result']
+    return previous
+
+
+def differences(old: Dict, new: Dict) -> List[str]:
+    """Изменившиеся статус и метрики: «поле: было → стало»"""
+    changes = []
+    if old.get('project_status') != new.get('project_status'):
+        changes.append(f"статус: {old.get('project_status')} → {new.get('project_status')}")
+    for name in COMPARED_METRICS:
+        before, after = old.get('metrics', {}).get(name), new.get('metrics', {}).get(name)
+        if before != after:
+            changes.append(f"{name}: {before} → {after}")
+    return changes
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Повторный анализ сохранённых постраничных данных')
+    parser.add_argument('--output', '-o', required=True, help='JSONL с новыми результатами (перезаписывается)')
+    parser.add_argument('--analyzer', choices=sorted(RESCORERS), default='advanced',
+                        help='advanced — как api.py, fast — как api_fast.py (по умолчанию advanced)')
+    parser.add_argument('--artifacts', help='файл хранилища (по умолчанию ANALYSIS_ARTIFACTS_PATH)')
+    parser.add_argument('--compare', help='JSONL прежнего прогона: вывести отчёты, у которых изменились статус или метрики')
+    parser.add_argument('--no-store', action='store_true', help='не записывать результаты в хранилище проектов (ANALYSIS_STORE_PATH)')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('ANALYSIS_METRICS_PATH', '')
+    if args.artifacts:
+        os.environ['ANALYSIS_ARTIFACTS_PATH'] = args.artifacts
+    from page_artifacts import artifacts_from_env
+    artifacts = artifacts_from_env()
+    if artifacts is None:
+        print("Хранилище постраничных данных отключено (ANALYSIS_ARTIFACTS_PATH='')")
+        return 2
+    store = None
+    if not args.no_store:
+        from project_store import store_from_env
+        store = store_from_env()
+    previous = load_previous(args.compare) if args.compare else {}
+    rescore, source = RESCORERS[args.analyzer]
+
+    started = time.perf_counter()
+    counts = {STATUS_OK: 0, STATUS_ERROR: 0}
+    compared = changed = 0
+    with open(args.output, 'w', encoding='utf-8') as out:
+        for digest, filename in artifacts.items():
+            item_started = time.perf_counter()
+            record = {'sha256': digest, 'filename': filename, 'analyzer': args.analyzer, 'status': STATUS_OK,
+                      'result': None, 'timings': None, 'error': None}
+            try:
+                record['result'], record['timings'] = rescore(artifacts.get(digest), filename)
+            except Exception as e:
+                record.update(status=STATUS_ERROR, error=f'{type(e).__name__}: {e}')
+            record['elapsed_ms'] = round((time.perf_counter() - item_started) * 1000, 2)
+            record['analyzed_at'] = datetime.now().isoformat(timespec='seconds')
+            counts[record['status']] += 1
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+            if record['status'] != STATUS_OK:
+                print(f"error  {filename}  ({record['error']})")
+                continue
+            if store is not None:
+                store.save(record['result'], source, digest, filename)
+            if digest in previous:
+                compared += 1
+                changes = differences(previous[digest], record['result'])
+                if changes:
+                    changed += 1
+                    print(f"{filename} ({digest[:12]}): " + '; '.join(changes))
+
+    summary = f"Готово за {time.perf_counter() - started:.2f} с: ok {counts[STATUS_OK]}, error {counts[STATUS_ERROR]}"
+    if args.compare:
+        summary += f", изменилось {changed} из {compared}"
+    print(summary)
+    return 1 if counts[STATUS_ERROR] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+КЭШ РЕЗУЛЬТАТОВ АНАЛИЗА
+Результаты хранятся по хешу содержимого PDF в SQLite, общем для всех процессов gunicorn
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+from typing import Dict, Optional
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'khc_analysis_cache.sqlite3')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 содержимого файла"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class AnalysisCache:
+    """Постоянный LRU кэш результатов анализа, ограниченный по размеру
+
+    Ключ записи — хеш содержимого PDF плюс версия анализатора и паттернов,
+    поэтому изменение логики извлечения автоматически делает старые записи недоступными.
+    SQLite в режиме WAL позволяет нескольким процессам читать и писать одновременно.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Новое соединение на каждую операцию: безопасно при fork и в потоках Flask
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                '  key TEXT PRIMARY KEY,'
+                '  value TEXT NOT NULL,'
+                '  size INTEGER NOT NULL,'
+                '  last_access REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_results_access ON results(last_access)')
+        conn.close()
+
+    @staticmethod
+    def make_key(digest: str, version: str) -> str:
+        return f"{version}:{digest}"
+
+    def get(self, digest: str, version: str) -> Optional[Dict]:
+        """Возвращает закэшированный результат или None"""
+        key = self.make_key(digest, version)
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    row = conn.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+                    if row is None:
+                        return None
+                    conn.execute('UPDATE results SET last_access = ? WHERE key = ?', (time.time(), key))
+            finally:
+                conn.close()
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Ошибка чтения кэша: {e}")
+            return None
+
+    def put(self, digest: str, version: str, result: Dict):
+        """Сохраняет результат и вытесняет давно не использованные записи"""
+        key = self.make_key(digest, version)
+        value = json.dumps(result, ensure_ascii=False)
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO results (key, value, size, last_access) VALUES (?, ?, ?, ?)',
+                        (key, value, size, time.time())
+                    )
+                    # LRU: удаляем самые старые записи, выходящие за лимит размера
+                    conn.execute(
+                        'DELETE FROM results WHERE key IN ('
+                        '  SELECT key FROM ('
+                        '    SELECT key, SUM(size) OVER (ORDER BY last_access DESC) AS running'
+                        '    FROM results'
+                        '  ) WHERE running > ?)',
+                        (self.max_bytes,)
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Ошибка записи в кэш: {e}")
+
+
+def cache_from_env() -> Optional[AnalysisCache]:
+    """Создаёт кэш по переменным окружения (ANALYSIS_CACHE_PATH='' отключает кэш)"""
+    path = os.environ.get('ANALYSIS_CACHE_PATH', DEFAULT_CACHE_PATH)
+    if not path:
+        return None
+    max_mb = int(os.environ.get('ANALYSIS_CACHE_MAX_MB', DEFAULT_MAX_BYTES // (1024 * 1024)))
+    try:
+        return AnalysisCache(path, max_bytes=max_mb * 1024 * 1024)
+    except sqlite3.Error as e:
+        print(f"Кэш анализа отключён: {e}")
+        return None
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ГЕНЕРАТОР СИНТЕТИЧЕСКИХ ОТЧЁТОВ МОНИТОРИНГА
+PDF в формате отчётов инжиниринговой компании с заданными числом страниц, фото, таблиц и положением метрик
+
+Рядом с каждым PDF сохраняется манифест (.json) с заложенными значениями СМР, ГПР и ДДУ
+и номерами страниц, на которых они размещены.
+
+Примеры:
+    python synthetic_reports.py --pages 300 --ddu-page 250 --output synth_300.pdf --check
+    python synthetic_reports.py --sweep 50,100,200,400 --outdir synthetic/
+    python benchmark.py synthetic/*.pdf --output scaling.json
+"""
+
+import io
+import os
+import sys
+import json
+import random
+import argparse
+from typing import Dict, List, Tuple
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader, simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 2 * cm
+FONT = 'SyntheticSans'
+FONT_BOLD = 'SyntheticSans-Bold'
+
+# Шрифты с кириллицей: встроенные шрифты reportlab её не содержат
+FONT_CANDIDATES = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/TTF/DejaVuSans.ttf',
+    '/Library/Fonts/Arial Unicode.ttf',
+    '/System/Library/Fonts/Supplemental/Arial.ttf',
+    'C:/Windows/Fonts/arial.ttf',
+]
+
+# Фоновый текст без ключевых слов метрик (СМР, отставание, ДДУ, проценты, «дн» после чисел)
+FILLER_SENTENCES = [
+    'Ведутся работы по устройству монолитного каркаса секции {n}.',
+    'На строительной площадке задействовано {n} рабочих и {m} единиц техники.',
+    'Выполнена кладка наружных стен с {a}-го по {b}-й этаж блока {letter}.',
+    'Технический надзор осуществляется в соответствии с проектной документацией.',
+    'Замечаний по качеству выполненных работ не выявлено.',
+    'Складирование материалов организовано согласно стройгенплану.',
+    'Ведётся монтаж систем отопления и вентиляции в блоке {letter}.',
+    'Выполнены работы по благоустройству прилегающей территории.',
+    'Проведено освидетельствование скрытых работ, составлены акты № {n} и № {m}.',
+    'Фасадные работы выполняются с применением фиброцементных панелей.',
+    'Высота жилых этажей принята {a},0 м, высота подвала {b},5 м.',
+    'Количество квартир в блоке {letter} составляет {n} квартир.',
+    'Исполнительная документация ведётся в полном объёме.',
+    'Входной контроль строительных материалов проводится регулярно.',
+    'Устройство кровли блока {letter} выполнено на отметке {n},{m} м.',
+]
+SECTIONS = [
+    'Конструкции железобетонные', 'Архитектурно-строительные решения', 'Отопление и вентиляция',
+    'Водопровод и канализация', 'Электрооборудование, слабые токи', 'Лифты', 'Паркинг',
+    'Благоустройство', 'Газификация',
+]
+MONTHS = {
+    '01': 'января', '02': 'февраля', '03': 'марта', '04': 'апреля', '05': 'мая', '06': 'июня',
+    '07': 'июля', '08': 'августа', '09': 'сентября', '10': 'октября', '11': 'ноября', '12': 'декабря',
+}
+
+
+def register_fonts(path: str = None):
+    """Регистрирует TTF с кириллицей (--font, SYNTHETIC_FONT или системный DejaVu/Arial)"""
+    if FONT in pdfmetrics.getRegisteredFontNames():
+        return
+    candidates = [path] if path else [os.environ.get('SYNTHETIC_FONT')] + FONT_CANDIDATES
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            pdfmetrics.registerFont(TTFont(FONT, candidate))
+            bold = candidate.replace('DejaVuSans.ttf', 'DejaVuSans-Bold.ttf')
+            pdfmetrics.registerFont(TTFont(FONT_BOLD, bold if bold != candidate and os.path.exists(bold) else candidate))
+            return
+    raise FileNotFoundError('Не найден TTF шрифт с кириллицей: укажите --font или SYNTHETIC_FONT')
+
+
+def format_amount(value: float) -> str:
+    """Сумма в формате отчётов: «1 147 450 008.75»"""
+    return f'{value:,.2f}'.replace(',', ' ')
+
+
+def decimal_comma(value: float) -> str:
+    """Десятичная запятая, как в тексте отчётов: «27,12»"""
+    return f'{value:.2f}'.replace('.', ',')
+
+
+def make_photo(rng: random.Random, width: int = 640, height: int = 480) -> bytes:
+    """JPEG «фотографии»: градиент с шумом (сжимается примерно как снимок стройплощадки)"""
+    from PIL import Image, ImageDraw, ImageFilter
+    base = tuple(rng.randint(60, 200) for _ in range(3))
+    image = Image.new('RGB', (width, height), base)
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x0, y0 = rng.randint(0, width), rng.randint(0, height)
+        x1, y1 = x0 + rng.randint(20, 240), y0 + rng.randint(20, 180)
+        draw.rectangle((x0, y0, x1, y1), fill=tuple(rng.randint(0, 255) for _ in range(3)))
+    noise = Image.frombytes('L', (width, height), rng.randbytes(width * height)).convert('RGB')
+    image = Image.blend(image.filter(ImageFilter.GaussianBlur(2)), noise, 0.25)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=70)
+    return buffer.getvalue()
+
+
+class ReportWriter:
+    """Постраничная запись отчёта на canvas reportlab"""
+
+    def __init__(self, path: str, total_pages: int):
+        # invariant: без даты создания, чтобы одинаковое зерно давало одинаковый файл
+        self.canvas = canvas.Canvas(path, pagesize=A4, invariant=1)
+        self.total_pages = total_pages
+        self.page = 0
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def new_page(self):
+        if self.page:
+            self.canvas.showPage()
+        self.page += 1
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def footer(self):
+        self.canvas.setFont(FONT, 8)
+        self.canvas.drawRightString(PAGE_WIDTH - MARGIN, MARGIN / 2, f'Страница {self.page} из {self.total_pages}')
+
+    def paragraph(self, text: str, size: float = 10, bold: bool = False, gap: float = 4):
+        font = FONT_BOLD if bold else FONT
+        self.canvas.setFont(font, size)
+        for line in simpleSplit(text, font, size, PAGE_WIDTH - 2 * MARGIN):
+            if self.y < MARGIN + size:
+                return
+            self.canvas.drawString(MARGIN, self.y, line)
+            self.y -= size * 1.3
+        self.y -= gap
+
+    def table(self, rows: List[List[str]], col_widths: List[float] = None, size: float = 8):
+        """Таблица с линиями сетки (pdfplumber находит такие таблицы по линиям)"""
+        table = Table(rows, colWidths=col_widths)
+        table.setStyle(TableStyle([
+            ('FONT', (0, 0), (-1, -1), FONT, size),
+            ('FONT', (0, 0), (-1, 0), FONT_BOLD, size),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]))
+        _, height = table.wrapOn(self.canvas, PAGE_WIDTH - 2 * MARGIN, self.y - MARGIN)
+        table.drawOn(self.canvas, MARGIN, self.y - height)
+        self.y -= height + 12
+
+    def photos(self, images: List[bytes], captions: List[str]):
+        """Сетка 2 × 2 фотографий с подписями, как на фотостраницах реальных отчётов"""
+        cell_w = (PAGE_WIDTH - 2 * MARGIN - cm) / 2
+        cell_h = cell_w * 0.75
+        for i, (data, caption) in enumerate(zip(images, captions)):
+            col, row = i % 2, i // 2
+            x = MARGIN + col * (cell_w + cm)
+            y = PAGE_HEIGHT - MARGIN - (row + 1) * (cell_h + 1.2 * cm)
+            self.canvas.drawImage(ImageReader(io.BytesIO(data)), x, y, cell_w, cell_h)
+            self.canvas.setFont(FONT, 8)
+            self.canvas.drawString(x, y - 10, caption)
+
+    def save(self):
+        self.canvas.showPage()
+        self.canvas.save()
+
+
+def ddu_table_rows(rng: random.Random) -> Tuple[List[List[str]], List[float]]:
+    """Таблица «Приложение 2 к Таблице 7»: 7 строк × 6 колонок, как в реальных отчётах
+
+    Возвращает строки таблицы и суммы (стоимость и оплата, включая «Всего») в порядке следования.
+    """
+    kinds = [('Квартиры', 58, 3392.34), ('Коммерческие помещения', 5, 562.40), ('Паркинг', 0, 0.0),
+             ('Кладовое помещение', 0, 0.0)]
+    rows = [['№', 'Данные по ДДУ', 'Количество', 'Площадь, м2', 'Стоимость ДДУ, тенге', 'Оплачено, тенге'],
+            ['1', '2', '3', '4', '5', '6']]
+    totals = [0, 0.0, 0.0, 0.0]
+    amounts = []
+    for i, (kind, count, area) in enumerate(kinds, start=1):
+        count = rng.randint(count // 2, count * 2) if count else 0
+        area = round(area * rng.uniform(0.5, 2.0), 2) if area else 0.0
+        cost = round(area * rng.uniform(250000, 400000), 2)
+        paid = round(cost * rng.uniform(0.1, 0.9), 2)
+        rows.append([str(i), kind, str(count), format_amount(area), format_amount(cost), format_amount(paid)])
+        amounts += [cost, paid]
+        for j, value in enumerate((count, area, cost, paid)):
+            totals[j] += value
+    rows.append(['', 'Всего', str(totals[0]), format_amount(totals[1]), format_amount(totals[2]), format_amount(totals[3])])
+    amounts += [round(totals[2], 2), round(totals[3], 2)]
+    return rows, amounts
+
+
+def section_table_rows(rng: random.Random, number: int) -> List[List[str]]:
+    """Таблица выполнения по разделам проекта (числа без знака процента)"""
+    rows = [['№', f'Таблица {number}. Разделы проекта', 'План', 'Факт', 'Отклонение (+/-)']]
+    for i, section in enumerate(SECTIONS, start=1):
+        plan = round(rng.uniform(0, 40), 2)
+        fact = round(plan * rng.uniform(0.3, 1.0), 2)
+        rows.append([str(i), section, f'{plan:.2f}', f'{fact:.2f}', f'{fact - plan:.2f}'])
+    return rows
+
+
+def filler(rng: random.Random, count: int) -> List[str]:
+    return [
+        rng.choice(FILLER_SENTENCES).format(
+            n=rng.randint(2, 90), m=rng.randint(2, 40), a=rng.randint(1, 5), b=rng.randint(6, 12),
+            letter=rng.choice('АБВГ'))
+        for _ in range(count)
+    ]
+
+
+def plan_pages(rng: random.Random, pages: int, photo_density: float, tables: int,
+               smr_page: int, ddu_page: int) -> Dict[int, str]:
+    """Тип каждой страницы: title, smr, ddu, table, photo или text"""
+    kinds = {1: 'title', smr_page: 'smr', ddu_page: 'ddu'}
+    free = [page for page in range(2, pages + 1) if page not in kinds]
+    for page in rng.sample(free, min(len(free), round(len(free) * photo_density))):
+        kinds[page] = 'photo'
+    text_pages = [page for page in free if page not in kinds]
+    if tables and text_pages:
+        step = max(1, len(text_pages) // tables)
+        for page in text_pages[::step][:tables]:
+            kinds[page] = 'table'
+    for page in range(1, pages + 1):
+        kinds.setdefault(page, 'text')
+    return kinds
+
+
+def generate_report(path: str, pages: int = 60, photo_density: float = 0.3, tables: int = 6,
+                    smr_page: int = None, ddu_page: int = None, smr: float = 27.12,
+                    delay_days: int = 421, norm_months: int = 19, ddu_percent: float = 97.76,
+                    guarantee: bool = False, period: str = '202510', seed: int = 0,
+                    image_pool: int = 12) -> Dict:
+    """Создаёт PDF отчёта и возвращает манифест с заложенными значениями и их страницами
+
+    image_pool — сколько разных фотографий используется (одинаковые изображения reportlab
+    встраивает один раз; 0 — все фотографии разные, размер файла как у реальных отчётов).
+    """
+    if pages < 3:
+        raise ValueError('pages must be at least 3')
+    rng = random.Random(seed)
+    smr_page = smr_page or max(2, pages // 4)
+    ddu_page = ddu_page or max(3, pages // 2)
+    if ddu_page == smr_page:
+        ddu_page = smr_page + 1 if smr_page < pages else smr_page - 1
+    if not (2 <= smr_page <= pages and 2 <= ddu_page <= pages):
+        raise ValueError('smr_page and ddu_page must be within 2..pages')
+    kinds = plan_pages(rng, pages, photo_density, tables, smr_page, ddu_page)
+    register_fonts()
+
+    delay_percent = delay_days / (norm_months * 30) * 100
+    cert = rng.randint(100, 999)
+    code = f'ДПГ-{period[2:4]}-{rng.randint(10, 99)}-{rng.randint(100, 999)}/{rng.randint(100, 999)}'
+    name = f'Многоквартирный жилой комплекс «Синтетика-{seed}» со встроенными помещениями'
+    pool = [make_photo(rng) for _ in range(image_pool)] if image_pool else []
+    ddu_rows, ddu_amounts = ddu_table_rows(rng)
+    photo_count = 0
+    table_number = 0
+
+    writer = ReportWriter(path, pages)
+    for page in range(1, pages + 1):
+        writer.new_page()
+        kind = kinds[page]
+        if kind == 'title':
+            writer.paragraph('Отчет инжиниринговой компании в сфере долевого участия в жилищном строительстве '
+                             'о результатах мониторинга за ходом строительства жилого дома (жилого здания) '
+                             f'"{name}". Первая очередь строительства.', size=12, bold=True, gap=12)
+            writer.paragraph(f'Код: (номер сертификата {cert}) {code}')
+            writer.paragraph(f'Отчетный период: {period}')
+            writer.paragraph('Заказчик: ТОО «Синтетик Строй»')
+            writer.paragraph(f'Объект расположен по адресу: город Шымкент, Каратауский район, улица Синтетическая, {seed + 1}')
+            writer.paragraph(f'Нормативный срок строительства {norm_months} месяцев.')
+        elif kind == 'smr':
+            writer.paragraph('8. О ходе выполнения строительно-монтажных работ', bold=True)
+            for sentence in filler(rng, 4):
+                writer.paragraph(sentence)
+            writer.paragraph('2) Выполнение строительно-монтажных работ на соответствие плановым и фактическим '
+                             'показателям по разделам проекта:')
+            writer.paragraph('*С нарастающим итогом план по СМР на конец отчётного периода составляет – 100 %.')
+            writer.paragraph(f'Фактическое выполнение СМР на конец отчётного периода составляет –{decimal_comma(smr)}%.')
+            writer.paragraph(f'3) Соблюдение графика производства работ: Отставание {delay_days} дней.')
+            writer.paragraph(f'Отставание от графика составляет {decimal_comma(delay_percent)}%.')
+            if guarantee:
+                writer.paragraph('Зафиксировано наступление гарантийного случая.')
+            table_number += 1
+            writer.table(section_table_rows(rng, table_number), col_widths=[1 * cm, 7 * cm, 2.5 * cm, 2.5 * cm, 3.5 * cm])
+        elif kind == 'ddu':
+            writer.paragraph('Приложение 2 к Таблице 7', bold=True)
+            writer.table(ddu_rows, col_widths=[0.8 * cm, 4.2 * cm, 2 * cm, 2.4 * cm, 3.6 * cm, 3.6 * cm])
+            writer.paragraph(f'Поступления по ДДУ за отчетный период составили {decimal_comma(ddu_percent)}% от плана.')
+            writer.paragraph(f'Вывод: {decimal_comma(ddu_percent)}% от общего поступления денежных средств, '
+                             'средства дольщиков.')
+        elif kind == 'photo':
+            images = [pool[rng.randrange(len(pool))] if pool else make_photo(rng) for _ in range(4)]
+            captions = [f'Фото {photo_count + i + 1}. Ход работ, блок {rng.choice("АБВГ")}' for i in range(4)]
+            photo_count += 4
+            writer.photos(images, captions)
+        elif kind == 'table':
+            table_number += 1
+            writer.paragraph(f'Таблица {table_number}', bold=True)
+            writer.table(section_table_rows(rng, table_number), col_widths=[1 * cm, 7 * cm, 2.5 * cm, 2.5 * cm, 3.5 * cm])
+            for sentence in filler(rng, 6):
+                writer.paragraph(sentence)
+        else:
+            for sentence in filler(rng, 28):
+                writer.paragraph(sentence)
+        writer.footer()
+    writer.save()
+
+    manifest = {
+        'file': os.path.basename(path),
+        'pages': pages,
+        'seed': seed,
+        'photo_density': photo_density,
+        'photos': photo_count,
+        'tables': table_number + 1,  # вместе с таблицей ДДУ
+        'placement': {
+            'smr_page': smr_page,
+            'ddu_page': ddu_page,
+            'photo_pages': sorted(p for p, k in kinds.items() if k == 'photo'),
+            'table_pages': sorted(p for p, k in kinds.items() if k in ('table', 'smr', 'ddu')),
+        },
+        'expected': {
+            'full_name': name,
+            'code': f'Сертификат №{cert}, {code}',
+            'report_period': f'{period[:4]}г {MONTHS[period[4:6]]}',
+            'SMR_completion': round(smr, 2),
+            'GPR_delay_days': delay_days,
+            'GPR_delay_percent': round(delay_percent, 2),
+            'DDU_payments_percent': round(ddu_percent, 2),
+            # Последние три ненулевые суммы таблицы ДДУ по данным генератора (площади и количества меньше 100 000)
+            'DDU_monthly_values': [amount for amount in ddu_amounts if amount][-3:],
+            'guarantee_extension': guarantee,
+        },
+    }
+    with open(os.path.splitext(path)[0] + '.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def check_report(path: str, manifest: Dict) -> List[str]:
+    """Сравнивает результат AdvancedReportAnalyzer и api_fast с заложенными значениями"""
+    from advanced_analyzer import AdvancedReportAnalyzer
+    import api_fast
+
+    expected = manifest['expected']
+    with AdvancedReportAnalyzer(pdf_path=path) as analyzer:
+        result = analyzer.analyze()
+    metrics = result['metrics']
+    texts = api_fast.extract_text_from_pdf(path)
+    fast = api_fast.extract_metrics(texts['full'])
+
+    checks = [
+        ('advanced.full_name', result['project_info'].get('full_name'), expected['full_name']),
+        ('advanced.code', result['project_info'].get('code'), expected['code']),
+        ('advanced.report_period', result['project_info'].get('report_period'), expected['report_period']),
+        ('advanced.SMR_completion', metrics.get('SMR_completion'), expected['SMR_completion']),
+        ('advanced.GPR_delay_days', metrics.get('GPR_delay_days'), expected['GPR_delay_days']),
+        ('advanced.DDU_monthly_values', metrics.get('DDU_monthly_values'), expected['DDU_monthly_values']),
+        ('advanced.guarantee_extension', metrics.get('guarantee_extension'), expected['guarantee_extension']),
+        ('fast.SMR_completion', fast['SMR_completion'], expected['SMR_completion']),
+        ('fast.GPR_delay_percent', fast['GPR_delay_percent'], expected['GPR_delay_percent']),
+        ('fast.GPR_delay_days', fast['GPR_delay_days'], expected['GPR_delay_days']),
+        ('fast.DDU_payments_percent', fast['DDU_payments_percent'], [expected['DDU_payments_percent']]),
+        ('fast.guarantee_extension', fast['guarantee_extension'], expected['guarantee_extension']),
+    ]
+    return [f'{name}: {actual!r} != {wanted!r}' for name, actual, wanted in checks if actual != wanted]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Синтетические отчёты мониторинга для тестов масштабирования')
+    parser.add_argument('--pages', type=int, default=60, help='число страниц (по умолчанию 60)')
+    parser.add_argument('--sweep', help='несколько отчётов с разным числом страниц, например 50,100,200,400')
+    parser.add_argument('--photo-density', type=float, default=0.3, help='доля фотостраниц (по умолчанию 0.3)')
+    parser.add_argument('--tables', type=int, default=6, help='число таблиц по разделам проекта')
+    parser.add_argument('--smr-page', type=int, help='страница с СМР и отставанием (по умолчанию четверть документа)')
+    parser.add_argument('--ddu-page', type=int, help='страница с таблицей ДДУ (по умолчанию середина документа)')
+    parser.add_argument('--ddu-position', type=float,
+                        help='положение таблицы ДДУ как доля документа (0.8 — на 80%% страниц); для --sweep')
+    parser.add_argument('--smr', type=float, default=27.12, help='фактическое выполнение СМР, %%')
+    parser.add_argument('--delay-days', type=int, default=421, help='отставание от графика, дней')
+    parser.add_argument('--norm-months', type=int, default=19, help='нормативный срок строительства, месяцев')
+    parser.add_argument('--ddu', type=float, default=97.76, help='поступления ДДУ, %%')
+    parser.add_argument('--guarantee', action='store_true', help='добавить гарантийный случай')
+    parser.add_argument('--period', default='202510', help='отчётный период ГГГГММ')
+    parser.add_argument('--seed', type=int, default=0, help='зерно генератора (одинаковое зерно — одинаковый PDF)')
+    parser.add_argument('--image-pool', type=int, default=12, help='разных фотографий в документе, 0 — все разные')
+    parser.add_argument('--font', help='TTF шрифт с кириллицей')
+    parser.add_argument('--output', default='synthetic_report.pdf', help='файл PDF (без --sweep)')
+    parser.add_argument('--outdir', default='.', help='папка для --sweep')
+    parser.add_argument('--check', action='store_true', help='проанализировать созданные файлы и сверить значения')
+    args = parser.parse_args(argv)
+
+    register_fonts(args.font)
+    if args.sweep:
+        os.makedirs(args.outdir, exist_ok=True)
+        targets = [(int(n), os.path.join(args.outdir, f'synthetic_{int(n):04d}p.pdf')) for n in args.sweep.split(',')]
+    else:
+        targets = [(args.pages, args.output)]
+
+    failed = False
+    for pages, path in targets:
+        ddu_page = args.ddu_page
+        if args.ddu_position is not None:
+            ddu_page = max(3, min(pages, round(pages * args.ddu_position)))
+        manifest = generate_report(
+            path, pages=pages, photo_density=args.photo_density, tables=args.tables,
+            smr_page=args.smr_page if args.smr_page and args.smr_page <= pages else None, ddu_page=ddu_page,
+            smr=args.smr, delay_days=args.delay_days, norm_months=args.norm_months, ddu_percent=args.ddu,
+            guarantee=args.guarantee, period=args.period, seed=args.seed, image_pool=args.image_pool)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"{path}: {pages} стр., {manifest['photos']} фото, {manifest['tables']} таблиц, {size_mb:.1f} MB, "
+              f"СМР на стр. {manifest['placement']['smr_page']}, ДДУ на стр. {manifest['placement']['ddu_page']}")
+        if args.check:
+            mismatches = check_report(path, manifest)
+            for mismatch in mismatches:
+                print(f"  ✗ {mismatch}")
+            if not mismatches:
+                print("  ✓ значения извлечены верно")
+            failed = failed or bool(mismatches)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
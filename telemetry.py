@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ТЕЛЕМЕТРИЯ СЕРВЕРОВ АНАЛИЗА
+Счётчики, гистограммы и датчики в SQLite, общем для всех воркеров gunicorn; вывод в формате Prometheus
+"""
+
+import os
+import re
+import time
+import sqlite3
+import tempfile
+import multiprocessing
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_METRICS_PATH = os.path.join(tempfile.gettempdir(), 'khc_metrics.sqlite3')
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+PAGE_BUCKETS = (10, 50, 100, 200)
+
+# Имя -> (тип, описание). Датчики из SUMMED_GAUGES складываются по процессам,
+# остальные выводятся с меткой pid.
+METRICS = {
+    'analysis_request_duration_seconds': ('histogram', 'Время обработки запроса анализа по исходу'),
+    'analysis_duration_seconds': ('histogram', 'Время анализа PDF по числу страниц'),
+    'analysis_cache_requests_total': ('counter', 'Обращения к кэшу результатов (hit/miss)'),
+    'analysis_fallback_responses_total': ('counter', 'Ответы create_fallback_response'),
+    'analysis_in_flight': ('gauge', 'Анализы, выполняющиеся сейчас'),
+    'analysis_jobs_queued': ('gauge', 'Задачи /api/jobs, ожидающие в очереди (все воркеры)'),
+    'analysis_cache_hit_ratio': ('gauge', 'Доля попаданий в кэш результатов'),
+    'process_resident_memory_bytes': ('gauge', 'RSS процесса (воркер gunicorn или процесс пула анализа)'),
+}
+SUMMED_GAUGES = {'analysis_in_flight'}
+
+LABEL = re.compile(r'(?:^|,)(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def page_bucket(pages: Optional[int]) -> str:
+    """Метка диапазона страниц: «1-10», «11-50», ..., «201+»"""
+    if not pages:
+        return 'unknown'
+    lower = 1
+    for upper in PAGE_BUCKETS:
+        if pages <= upper:
+            return f"{lower}-{upper}"
+        lower = upper + 1
+    return f"{lower}+"
+
+
+def resident_memory_bytes() -> int:
+    """Текущий RSS процесса (на Linux из /proc, иначе пиковый из getrusage)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _labels(labels: Dict[str, object]) -> str:
+    """Метки в каноническом виде Prometheus: отсортированы, значения экранированы"""
+    parts = []
+    for key in sorted(labels):
+        value = str(labels[key]).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return ','.join(parts)
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsStore:
+    """Метрики всех процессов в одном файле SQLite
+
+    Счётчики и корзины гистограмм увеличиваются атомарным UPSERT, поэтому значения
+    из разных воркеров складываются. Датчики хранятся по pid; при выводе записи
+    завершившихся процессов удаляются.
+    """
+
+    def __init__(self, path: str = DEFAULT_METRICS_PATH):
+        self.path = path
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS counters ('
+                '  name TEXT NOT NULL,'
+                '  labels TEXT NOT NULL,'
+                '  value REAL NOT NULL,'
+                '  PRIMARY KEY (name, labels))'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS gauges ('
+                '  name TEXT NOT NULL,'
+                '  labels TEXT NOT NULL,'
+                '  pid INTEGER NOT NULL,'
+                '  value REAL NOT NULL,'
+                '  PRIMARY KEY (name, labels, pid))'
+            )
+        conn.close()
+
+    def _write(self, statements: Iterable[Tuple[str, tuple]]):
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    for sql, params in statements:
+                        conn.execute(sql, params)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Ошибка записи метрик: {e}")
+
+    @staticmethod
+    def _inc_statement(name: str, labels: str, value: float) -> Tuple[str, tuple]:
+        return (
+            'INSERT INTO counters (name, labels, value) VALUES (?, ?, ?) '
+            'ON CONFLICT(name, labels) DO UPDATE SET value = value + excluded.value',
+            (name, labels, value)
+        )
+
+    def inc(self, name: str, labels: Dict[str, object] = None, value: float = 1):
+        self._write([self._inc_statement(name, _labels(labels or {}), value)])
+
+    def observe(self, name: str, value: float, labels: Dict[str, object] = None,
+                buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """Добавляет наблюдение в гистограмму (корзины накопительные, как в Prometheus)"""
+        labels = dict(labels or {})
+        statements = []
+        for le in list(buckets) + ['+Inf']:
+            hit = 1 if le == '+Inf' or value <= le else 0
+            statements.append(self._inc_statement(f'{name}_bucket', _labels({**labels, 'le': le}), hit))
+        statements.append(self._inc_statement(f'{name}_sum', _labels(labels), value))
+        statements.append(self._inc_statement(f'{name}_count', _labels(labels), 1))
+        self._write(statements)
+
+    def set_gauge(self, name: str, value: float, labels: Dict[str, object] = None):
+        """Значение датчика для текущего процесса"""
+        self._write([(
+            'INSERT OR REPLACE INTO gauges (name, labels, pid, value) VALUES (?, ?, ?, ?)',
+            (name, _labels(labels or {}), os.getpid(), value)
+        )])
+
+    def add_gauge(self, name: str, delta: float, labels: Dict[str, object] = None):
+        self._write([(
+            'INSERT INTO gauges (name, labels, pid, value) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(name, labels, pid) DO UPDATE SET value = value + excluded.value',
+            (name, _labels(labels or {}), os.getpid(), delta)
+        )])
+
+    def _read(self) -> Tuple[List[tuple], List[tuple]]:
+        conn = self._connect()
+        try:
+            with conn:
+                pids = [row[0] for row in conn.execute('SELECT DISTINCT pid FROM gauges')]
+                dead = [pid for pid in pids if not _pid_alive(pid)]
+                if dead:
+                    conn.executemany('DELETE FROM gauges WHERE pid = ?', [(pid,) for pid in dead])
+                counters = conn.execute('SELECT name, labels, value FROM counters').fetchall()
+                gauges = conn.execute('SELECT name, labels, pid, value FROM gauges').fetchall()
+        finally:
+            conn.close()
+        return counters, gauges
+
+    def render(self, extra: Dict[str, float] = None) -> str:
+        """Все метрики в текстовом формате Prometheus 0.0.4; extra — датчики, посчитанные при запросе"""
+        counters, gauges = self._read()
+        series: Dict[str, List[Tuple[str, str, float]]] = {}
+        for name, value in (extra or {}).items():
+            series.setdefault(name, []).append((name, '', value))
+
+        for name, labels, value in counters:
+            base = name
+            for suffix in ('_bucket', '_sum', '_count'):
+                if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+                    base = name[:-len(suffix)]
+            series.setdefault(base, []).append((name, labels, value))
+
+        summed: Dict[Tuple[str, str], float] = {}
+        for name, labels, pid, value in gauges:
+            if name in SUMMED_GAUGES:
+                summed[(name, labels)] = summed.get((name, labels), 0) + value
+            else:
+                pid_labels = ','.join(filter(None, [labels, f'pid="{pid}"']))
+                series.setdefault(name, []).append((name, pid_labels, value))
+        for (name, labels), value in summed.items():
+            series.setdefault(name, []).append((name, labels, value))
+
+        # Доля попаданий в кэш по каждому серверу
+        hits: Dict[str, List[float]] = {}
+        for name, labels, value in series.get('analysis_cache_requests_total', []):
+            parsed = dict(LABEL.findall(labels))
+            totals = hits.setdefault(parsed.get('server', ''), [0.0, 0.0])
+            totals[1] += value
+            if parsed.get('result') == 'hit':
+                totals[0] += value
+        for server, (hit, total) in hits.items():
+            if total:
+                series.setdefault('analysis_cache_hit_ratio', []).append(
+                    ('analysis_cache_hit_ratio', _labels({'server': server}), hit / total))
+
+        lines = []
+        for base in sorted(series):
+            kind, help_text = METRICS.get(base, ('untyped', ''))
+            lines.append(f'# HELP {base} {help_text}')
+            lines.append(f'# TYPE {base} {kind}')
+            for name, labels, value in sorted(series[base], key=self._sort_key):
+                lines.append(f'{name}{{{labels}}} {_format_value(value)}' if labels else f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _sort_key(row: Tuple[str, str, float]):
+        name, labels, _ = row
+        # Корзины одной серии идут подряд по возрастанию le, +Inf последней
+        parsed = LABEL.findall(labels)
+        le_text = dict(parsed).get('le', '+Inf')
+        le = float('inf') if le_text == '+Inf' else float(le_text)
+        rest = [pair for pair in parsed if pair[0] != 'le']
+        order = {'_bucket': 0, '_sum': 1, '_count': 2}
+        suffix = next((s for s in order if name.endswith(s)), '')
+        return rest, order.get(suffix, 0), le
+
+
+_store: Optional[MetricsStore] = None
+_store_checked = False
+
+
+def metrics_from_env() -> Optional[MetricsStore]:
+    """Хранилище метрик по ANALYSIS_METRICS_PATH ('' отключает метрики)"""
+    global _store, _store_checked
+    if not _store_checked:
+        _store_checked = True
+        path = os.environ.get('ANALYSIS_METRICS_PATH', DEFAULT_METRICS_PATH)
+        if path:
+            try:
+                _store = MetricsStore(path)
+            except sqlite3.Error as e:
+                print(f"Метрики отключены: {e}")
+    return _store
+
+
+def render_metrics(extra: Dict[str, float] = None) -> str:
+    store = metrics_from_env()
+    return store.render(extra) if store is not None else ''
+
+
+@contextmanager
+def timed_request(server: str):
+    """Замеряет запрос анализа; исход задаётся через outcome['value'] внутри блока"""
+    outcome = {'value': 'error'}
+    started = time.perf_counter()
+    try:
+        yield outcome
+    finally:
+        store = metrics_from_env()
+        if store is not None:
+            store.observe('analysis_request_duration_seconds', time.perf_counter() - started,
+                          {'server': server, 'outcome': outcome['value']})
+            record_rss(server)
+
+
+@contextmanager
+def in_flight(server: str):
+    """Учитывает выполняющийся анализ в датчике analysis_in_flight"""
+    store = metrics_from_env()
+    if store is None:
+        yield
+        return
+    store.add_gauge('analysis_in_flight', 1, {'server': server})
+    try:
+        yield
+    finally:
+        store.add_gauge('analysis_in_flight', -1, {'server': server})
+
+
+def record_analysis(server: str, seconds: float, pages: Optional[int]):
+    store = metrics_from_env()
+    if store is not None:
+        store.observe('analysis_duration_seconds', seconds, {'server': server, 'pages': page_bucket(pages)})
+
+
+def record_cache(server: str, hit: bool):
+    store = metrics_from_env()
+    if store is not None:
+        store.inc('analysis_cache_requests_total', {'server': server, 'result': 'hit' if hit else 'miss'})
+
+
+def record_fallback(server: str):
+    store = metrics_from_env()
+    if store is not None:
+        store.inc('analysis_fallback_responses_total', {'server': server})
+
+
+def record_rss(server: str):
+    """RSS текущего процесса: role='analysis' в процессе пула (daemon), иначе 'http' — воркер gunicorn"""
+    store = metrics_from_env()
+    if store is not None:
+        role = 'analysis' if multiprocessing.current_process().daemon else 'http'
+        store.set_gauge('process_resident_memory_bytes', resident_memory_bytes(), {'server': server, 'role': role})
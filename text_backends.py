@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ДВИЖКИ ИЗВЛЕЧЕНИЯ ТЕКСТА СТРАНИЦ
+layout — pdfplumber extract_text (кластеризация символов), fast — текстовый слой pdfium
+
+Большинство метрик ищется регулярными выражениями по тексту и не зависит от точной
+раскладки. Движок fast (pypdfium2, зависимость pdfplumber) примерно в 20 раз быстрее;
+слова, таблицы и изображения всегда извлекает pdfplumber. Сравнение скорости и совпадения
+метрик на образцах: python benchmark.py --text-backends
+"""
+
+import os
+import threading
+from importlib.metadata import version
+from typing import Optional
+
+TEXT_BACKEND_LAYOUT = 'layout'
+TEXT_BACKEND_FAST = 'fast'
+DEFAULT_TEXT_BACKEND = TEXT_BACKEND_LAYOUT
+
+# pdfium не потокобезопасен: все вызовы в процессе идут по очереди
+_pdfium_lock = threading.Lock()
+
+
+class LayoutTextBackend:
+    """Текст pdfplumber: символы группируются в строки и слова по координатам"""
+
+    name = TEXT_BACKEND_LAYOUT
+
+    def __init__(self, document):
+        self.document = document  # ParsedDocument
+
+    def page_text(self, page_num: int) -> str:
+        return self.document.page(page_num).extract_text() or ""
+
+    def close(self):
+        pass
+
+
+class FastTextBackend:
+    """Текст pdfium в порядке потока содержимого, с переносами строк как в PDF"""
+
+    name = TEXT_BACKEND_FAST
+    version = f"pdfium-{version('pypdfium2')}"
+
+    def __init__(self, document):
+        self.document = document
+        self._pdf = None
+
+    def _open(self):
+        if self._pdf is None:
+            import pypdfium2
+            source = self.document.source
+            if not isinstance(source, (str, bytes, bytearray)):
+                # Поток читает и pdfminer: pdfium получает свою копию, позиция потока не меняется
+                position = source.tell()
+                source.seek(0)
+                data = source.read()
+                source.seek(position)
+                source = data
+            self._pdf = pypdfium2.PdfDocument(bytes(source) if isinstance(source, bytearray) else source)
+        return self._pdf
+
+    def page_text(self, page_num: int) -> str:
+        with _pdfium_lock:
+            page = self._open()[page_num - 1]
+            try:
+                textpage = page.get_textpage()
+                try:
+                    text = textpage.get_text_range()
+                finally:
+                    textpage.close()
+            finally:
+                page.close()
+        return normalize_text(text)
+
+    def close(self):
+        if self._pdf is not None:
+            with _pdfium_lock:
+                self._pdf.close()
+            self._pdf = None
+
+
+TEXT_BACKENDS = {backend.name: backend for backend in (LayoutTextBackend, FastTextBackend)}
+
+
+def normalize_text(text: str) -> str:
+    """Приводит текст pdfium к виду extract_text: переводы строк \\n, без пробелов в конце строк"""
+    text = text.replace('\r\n', '\n').replace('\r', '\n').replace('\x02', '-').replace('\ufffe', '-')
+    return '\n'.join(line.rstrip() for line in text.split('\n')).strip('\n')
+
+
+def text_backend_name(name: Optional[str] = None) -> str:
+    """Проверенное имя движка; без имени — ANALYSIS_TEXT_BACKEND или layout
+
+    Неизвестное имя — ValueError (в API это ответ 400).
+    """
+    name = name or os.environ.get('ANALYSIS_TEXT_BACKEND') or DEFAULT_TEXT_BACKEND
+    if name not in TEXT_BACKENDS:
+        raise ValueError(f"unknown text backend '{name}', expected one of: {', '.join(sorted(TEXT_BACKENDS))}")
+    return name
+
+
+def requested_text_backend(request) -> str:
+    """Движок из запроса: ?text_backend=..., поле формы text_backend или заголовок X-Text-Backend"""
+    return text_backend_name(request.args.get('text_backend') or request.form.get('text_backend')
+                             or request.headers.get('X-Text-Backend'))
+
+
+def backend_version(cache_version: str, text_backend: str) -> str:
+    """Версия кэша результатов для движка: ответы по тексту fast кэшируются отдельно от layout"""
+    return cache_version if text_backend == TEXT_BACKEND_LAYOUT else f"{cache_version}+{text_backend}"
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ЗАМЕРЫ ЭТАПОВ АНАЛИЗА
+Wall и CPU время каждого этапа, счётчики (страницы, байты) и структурированная строка лога
+"""
+
+import os
+import json
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class StageTimer:
+    """Накапливает время этапов анализа в порядке их первого запуска
+
+    Вложенные этапы называются через точку («project_info.name») и входят
+    во время родительского. CPU время считается по текущему потоку, поэтому
+    замеры не искажаются параллельными запросами в том же процессе.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, float] = {}
+        self._wall_started = time.perf_counter()
+        self._cpu_started = time.thread_time()
+
+    @contextmanager
+    def stage(self, name: str):
+        # Запись создаётся при входе, чтобы этапы шли в порядке запуска, а не завершения
+        stage = self.stages.setdefault(name, {'wall_ms': 0.0, 'cpu_ms': 0.0, 'calls': 0})
+        wall_started = time.perf_counter()
+        cpu_started = time.thread_time()
+        try:
+            yield
+        finally:
+            stage['wall_ms'] += (time.perf_counter() - wall_started) * 1000
+            stage['cpu_ms'] += (time.thread_time() - cpu_started) * 1000
+            stage['calls'] += 1
+
+    def count(self, name: str, value: float):
+        """Записывает счётчик (число страниц, байты, символы текста)"""
+        self.counters[name] = value
+
+    def as_dict(self) -> Dict:
+        return {
+            'total_wall_ms': round((time.perf_counter() - self._wall_started) * 1000, 2),
+            'total_cpu_ms': round((time.thread_time() - self._cpu_started) * 1000, 2),
+            'stages': {
+                name: {'wall_ms': round(s['wall_ms'], 2), 'cpu_ms': round(s['cpu_ms'], 2), 'calls': s['calls']}
+                for name, s in self.stages.items()
+            },
+            **self.counters,
+        }
+
+
+def source_size(source) -> Optional[int]:
+    """Размер PDF в байтах (bytes или путь), None для потоков"""
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    if isinstance(source, str) and os.path.exists(source):
+        return os.path.getsize(source)
+    return None
+
+
+def timings_requested(request) -> bool:
+    """Нужно ли вернуть замеры в ответе: заголовок X-Debug-Timings, ?debug=1 или ANALYSIS_DEBUG_TIMINGS=1"""
+    if os.environ.get('ANALYSIS_DEBUG_TIMINGS') == '1':
+        return True
+    flag = request.headers.get('X-Debug-Timings') or request.args.get('debug')
+    return flag in ('1', 'true', 'yes', 'timings')
+
+
+def log_timings(server: str, filename: str, timings: Optional[Dict], **fields):
+    """Одна строка JSON на анализ — по ней отслеживаются регрессии производительности"""
+    record = {'event': 'analysis_timings', 'server': server, 'file': filename, **fields}
+    if timings:
+        record.update(timings)
+    print(json.dumps(record, ensure_ascii=False), flush=True)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ПРИЁМ ЗАГРУЖЕННЫХ ФАЙЛОВ
+Небольшие загрузки держатся в памяти, крупные сбрасываются в файл с уникальным именем
+"""
+
+import os
+import hashlib
+import tempfile
+from typing import BinaryIO, Optional, Union
+
+DEFAULT_SPOOL_MAX_BYTES = 16 * 1024 * 1024  # 16 MB
+CHUNK_SIZE = 1024 * 1024
+
+
+def spool_max_bytes() -> int:
+    """Порог размера загрузки в памяти (UPLOAD_SPOOL_MAX_MB, 0 — всегда в файл)"""
+    max_mb = os.environ.get('UPLOAD_SPOOL_MAX_MB')
+    if max_mb is None:
+        return DEFAULT_SPOOL_MAX_BYTES
+    return int(float(max_mb) * 1024 * 1024)
+
+
+class SpooledUpload:
+    """Содержимое загруженного файла: bytes в памяти или путь к уникальному временному файлу
+
+    Хеш содержимого считается по ходу чтения. source() можно передать в ParsedDocument,
+    AdvancedReportAnalyzer или в процесс пула — и bytes, и путь сериализуются pickle.
+    """
+
+    def __init__(self, data: Optional[bytes], path: Optional[str], digest: str, size: int):
+        self.data = data
+        self.path = path
+        self.digest = digest
+        self.size = size
+
+    @classmethod
+    def from_stream(cls, stream: BinaryIO, max_memory: int = None, directory: str = None) -> "SpooledUpload":
+        max_memory = spool_max_bytes() if max_memory is None else max_memory
+        hasher = hashlib.sha256()
+        chunks = []
+        size = 0
+        spill = None
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                size += len(chunk)
+                if spill is None and size > max_memory:
+                    # Превысили порог — всё прочитанное и остаток пишем в файл
+                    spill = tempfile.NamedTemporaryFile(prefix='khc_upload_', suffix='.pdf', dir=directory, delete=False)
+                    for buffered in chunks:
+                        spill.write(buffered)
+                    chunks = []
+                if spill is not None:
+                    spill.write(chunk)
+                else:
+                    chunks.append(chunk)
+        except BaseException:
+            if spill is not None:
+                spill.close()
+                os.remove(spill.name)
+            raise
+        if spill is not None:
+            spill.close()
+            return cls(None, spill.name, hasher.hexdigest(), size)
+        return cls(b''.join(chunks), None, hasher.hexdigest(), size)
+
+    def source(self) -> Union[bytes, str]:
+        """Содержимое для анализатора: bytes или путь к файлу"""
+        return self.data if self.path is None else self.path
+
+    def save(self, path: str):
+        """Записывает содержимое в path; файл, сброшенный на диск, перемещается без копирования
+
+        Дальше файлом path владеет вызывающий: close() его не удаляет.
+        """
+        if self.path is None:
+            with open(path, 'wb') as f:
+                f.write(self.data)
+        else:
+            os.replace(self.path, path)
+            self.path = None
+
+    def close(self):
+        """Освобождает память и удаляет временный файл"""
+        self.data = None
+        if self.path is not None and os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
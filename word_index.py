@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ПРОСТРАНСТВЕННЫЙ ИНДЕКС СЛОВ СТРАНИЦЫ
+Сетка по координатам слов pdfplumber для поиска значений рядом с подписями и в колонках таблиц
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+# Числовой токен: «8,98%.», «-0.41», «(35», «–27,12%» (тире перед числом — знак препинания, не минус)
+NUMBER_TOKEN = re.compile(r'[(–—]?(-?\d+(?:[.,]\d+)?)(%?)[.,;:)]*')
+# Группы разрядов, которые pdfplumber выдаёт отдельными словами: «2 405 372 397.00»
+LEADING_GROUP = re.compile(r'\d{1,3}')
+THOUSANDS_GROUP = re.compile(r'\d{3}(?:[.,]\d+)?%?[.,;:)]*')
+PUNCTUATION = '.,;:()«»"\'–-—*'
+# Число, слитое с единицей: «35дн», «35дней»
+FUSED_UNIT = re.compile(r'(\d+(?:[.,]\d+)?)\s*(\D+)')
+
+Box = Tuple[float, float, float, float]  # x0, top, x1, bottom
+
+
+def _normalize(text: str) -> str:
+    return text.strip(PUNCTUATION).lower()
+
+
+class PageWordIndex:
+    """Индекс слов одной страницы по ячейкам сетки cell_size × cell_size пунктов
+
+    Соседние группы разрядов склеиваются в одно число. Запрос области проверяет только
+    слова из пересекающихся ячеек, поэтому поиск «справа от подписи» или «под заголовком»
+    не пересматривает всю страницу.
+    """
+
+    def __init__(self, words: List[Dict], cell_size: float = 50.0):
+        self.cell_size = cell_size
+        self.tokens = self._merge_number_groups(words)
+        # Границы занятой словами области: запросы «до края страницы» обрезаются по ним
+        self._max_x = max((t['x1'] for t in self.tokens), default=0.0)
+        self._max_y = max((t['bottom'] for t in self.tokens), default=0.0)
+        self._grid: Dict[Tuple[int, int], List[int]] = {}
+        for idx, token in enumerate(self.tokens):
+            token['norm'] = _normalize(token['text'])
+            token['value'], token['percent'] = self._parse_number(token['text'])
+            for cell in self._cells((token['x0'], token['top'], token['x1'], token['bottom'])):
+                self._grid.setdefault(cell, []).append(idx)
+
+    @staticmethod
+    def _merge_number_groups(words: List[Dict]) -> List[Dict]:
+        tokens: List[Dict] = []
+        for word in words:
+            token = {key: word[key] for key in ('text', 'x0', 'x1', 'top', 'bottom')}
+            if tokens:
+                prev = tokens[-1]
+                height = token['bottom'] - token['top']
+                same_line = abs(prev['top'] - token['top']) < height / 2
+                close = 0 <= token['x0'] - prev['x1'] < height / 2
+                if same_line and close and prev.get('digits') and THOUSANDS_GROUP.fullmatch(token['text']):
+                    prev['text'] += token['text']
+                    prev['x1'] = token['x1']
+                    prev['bottom'] = max(prev['bottom'], token['bottom'])
+                    prev['digits'] = bool(re.fullmatch(r'\d+', prev['text']))
+                    continue
+            token['digits'] = bool(LEADING_GROUP.fullmatch(token['text']))
+            tokens.append(token)
+        for token in tokens:
+            token.pop('digits', None)
+        return tokens
+
+    @staticmethod
+    def _parse_number(text: str) -> Tuple[Optional[float], bool]:
+        match = NUMBER_TOKEN.fullmatch(text)
+        if not match:
+            return None, False
+        return float(match.group(1).replace(',', '.')), bool(match.group(2))
+
+    def _cells(self, box: Box) -> Iterable[Tuple[int, int]]:
+        x0, top, x1, bottom = box
+        x1, bottom = min(x1, self._max_x), min(bottom, self._max_y)
+        size = self.cell_size
+        for gx in range(int(x0 // size), int(x1 // size) + 1):
+            for gy in range(int(top // size), int(bottom // size) + 1):
+                yield gx, gy
+
+    def query(self, box: Box) -> List[Dict]:
+        """Слова, пересекающиеся с областью, в порядке чтения"""
+        x0, top, x1, bottom = box
+        found = set()
+        for cell in self._cells(box):
+            for idx in self._grid.get(cell, ()):
+                token = self.tokens[idx]
+                if token['x1'] >= x0 and token['x0'] <= x1 and token['bottom'] >= top and token['top'] <= bottom:
+                    found.add(idx)
+        return [self.tokens[idx] for idx in sorted(found)]
+
+    def find_phrase(self, phrase: str) -> List[Box]:
+        """Рамки всех вхождений фразы (слова сравниваются по началу: «СМР» найдёт «СМР)»)"""
+        parts = [_normalize(part) for part in phrase.split()]
+        boxes = []
+        for start in range(len(self.tokens) - len(parts) + 1):
+            window = self.tokens[start:start + len(parts)]
+            if all(token['norm'].startswith(part) for token, part in zip(window, parts)):
+                boxes.append((
+                    min(t['x0'] for t in window), min(t['top'] for t in window),
+                    max(t['x1'] for t in window), max(t['bottom'] for t in window),
+                ))
+        return boxes
+
+    def right_of(self, box: Box, max_distance: float = None) -> List[Dict]:
+        """Слова той же строки правее рамки, слева направо"""
+        x0, top, x1, bottom = box
+        middle = (top + bottom) / 2
+        right = x1 + max_distance if max_distance is not None else float('inf')
+        tokens = [
+            t for t in self.query((x1, top, right, bottom))
+            if t['x0'] >= x1 and t['top'] <= middle <= t['bottom']
+        ]
+        return sorted(tokens, key=lambda t: t['x0'])
+
+    def below(self, box: Box, max_distance: float = None) -> List[Dict]:
+        """Слова под рамкой, центр которых попадает в её горизонтальный диапазон, сверху вниз"""
+        x0, top, x1, bottom = box
+        lower = bottom + max_distance if max_distance is not None else float('inf')
+        tokens = [
+            t for t in self.query((x0, bottom, x1, lower))
+            if t['top'] >= bottom and x0 <= (t['x0'] + t['x1']) / 2 <= x1
+        ]
+        return sorted(tokens, key=lambda t: (t['top'], t['x0']))
+
+    def number_right_of(self, label: str, percent: bool = False,
+                        unit: Pattern = None) -> Optional[Tuple[Dict, Box]]:
+        """Первое число справа от подписи на той же строке: (слово, рамка подписи)"""
+        return self._first_number(label, self.right_of, percent, unit)
+
+    def number_below(self, label: str, percent: bool = False, max_distance: float = 40.0,
+                     unit: Pattern = None) -> Optional[Tuple[Dict, Box]]:
+        """Ближайшее число под подписью: (слово, рамка подписи)"""
+        return self._first_number(label, lambda box: self.below(box, max_distance), percent, unit)
+
+    def unit_value(self, token: Dict, unit: Pattern) -> Optional[float]:
+        """Число слова, если сразу за ним (в том же слове или следующим словом строки) стоит единица unit"""
+        fused = FUSED_UNIT.fullmatch(token['norm'])
+        if fused and unit.fullmatch(fused.group(2).strip()):
+            return float(fused.group(1).replace(',', '.'))
+        if token['value'] is None:
+            return None
+        box = (token['x0'], token['top'], token['x1'], token['bottom'])
+        following = self.right_of(box, max_distance=(token['bottom'] - token['top']) * 2)
+        if following and unit.fullmatch(following[0]['norm']):
+            return token['value']
+        return None
+
+    def _first_number(self, label: str, neighbours, percent: bool,
+                      unit: Pattern = None) -> Optional[Tuple[Dict, Box]]:
+        for box in self.find_phrase(label):
+            for token in neighbours(box):
+                if unit is not None:
+                    # Число без единицы рядом с подписью (процент, год, номер строки) не подходит
+                    value = self.unit_value(token, unit)
+                    if value is not None:
+                        return {**token, 'value': value}, box
+                elif token['value'] is not None and (token['percent'] or not percent):
+                    return token, box
+        return None
+
+    def column_numbers(self, header: str, count: int = 3, minimum: float = None,
+                       top: float = 0.0) -> List[float]:
+        """Последние count чисел в колонке под заголовком header (заголовок ищется ниже top)"""
+        for box in self.find_phrase(header):
+            if box[1] < top:
+                continue
+            values = [
+                t['value'] for t in self.below(box)
+                if t['value'] is not None and (minimum is None or t['value'] > minimum)
+            ]
+            if values:
+                return values[-count:]
+        return []
+
+    def line_text(self, box: Box) -> str:
+        """Текст строки, на которой лежит рамка"""
+        middle = (box[1] + box[3]) / 2
+        tokens = [t for t in self.query((0, box[1], float('inf'), box[3])) if t['top'] <= middle <= t['bottom']]
+        return ' '.join(t['text'] for t in sorted(tokens, key=lambda t: t['x0']))